@@ -10,9 +10,26 @@ from unittest.mock import Mock, patch, mock_open, MagicMock, call
 from io import StringIO
 import json
 import tempfile
+import hashlib
+import random
+import datetime
+import io
+import base64
+import zlib
+import struct
+import threading
+import time
 from botocore.exceptions import NoCredentialsError, ClientError
+from botocore.response import StreamingBody
 
-from vib3_cli import VIB3CLI
+from vib3_cli import (VIB3CLI, UploadJournal, DownloadJournal, DedupIndex, composite_checksum,
+                      AdaptiveConcurrency)
+
+
+@pytest.fixture(autouse=True)
+def vib3_home(tmp_path, monkeypatch):
+    """Keep journals, indexes and caches in a temporary VIB3_HOME."""
+    monkeypatch.setattr('vib3_cli.VIB3_HOME', str(tmp_path / 'home'))
 
 
 class TestVIB3CLI:
@@ -588,5 +605,2573 @@ class TestDeployCommand:
             assert 'Please specify a deploy subcommand' in output
 
 
+class TestMultipartUpload:
+    """Test cases for the multipart upload engine."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _make_s3(self, received):
+        """Create a mock S3 client that records uploaded part bodies."""
+        mock_s3 = MagicMock()
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        
+        def upload_part(Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+            received[PartNumber] = Body.read()
+            return {'ETag': f'"etag-{PartNumber}"'}
+        
+        mock_s3.upload_part.side_effect = upload_part
+        return mock_s3
+    
+    def test_parse_size(self):
+        """Test human-readable size parsing."""
+        from vib3_cli import parse_size
+        assert parse_size('1024') == 1024
+        assert parse_size('64M') == 64 * 1024 * 1024
+        assert parse_size('1.5G') == int(1.5 * 1024 ** 3)
+        assert parse_size('512KiB') == 512 * 1024
+    
+    def test_choose_part_size(self):
+        """Test automatic and explicit part size selection."""
+        from vib3_cli import choose_part_size, MB, GB, MAX_PARTS
+        assert choose_part_size(100 * MB) == 8 * MB
+        assert choose_part_size(8 * GB) == 16 * MB
+        assert choose_part_size(100 * MB, 32 * MB) == 32 * MB
+        assert choose_part_size(1000 * GB) * MAX_PARTS >= 1000 * GB
+        with pytest.raises(ValueError):
+            choose_part_size(100 * MB, 1 * MB)
+    
+    @patch('boto3.client')
+    def test_multipart_upload(self, mock_boto_client, tmp_path, capsys):
+        """Test that a file is split into ordered parts and completed."""
+        data = os.urandom(11 * 1024 * 1024)
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(data)
+        
+        received = {}
+        mock_s3 = self._make_s3(received)
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket',
+                                  '--part-size', '5M', '--concurrency', '3'])
+        
+        assert exit_code == 0
+        assert sorted(received) == [1, 2, 3]
+        assert b''.join(received[n] for n in (1, 2, 3)) == data
+        mock_s3.upload_file.assert_not_called()
+        parts = mock_s3.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        assert [p['PartNumber'] for p in parts] == [1, 2, 3]
+        assert parts[0]['ETag'] == '"etag-1"'
+        
+        captured = capsys.readouterr()
+        assert 'Sent 3 parts of 5,242,880 bytes' in captured.out
+        assert 'MiB/s' in captured.out
+    
+    @patch('boto3.client')
+    def test_multipart_upload_aborts_on_failure(self, mock_boto_client, tmp_path, capsys):
+        """Test that a failed part aborts the multipart upload."""
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(b'x' * (6 * 1024 * 1024))
+        
+        mock_s3 = MagicMock()
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        error_response = {'Error': {'Code': 'AccessDenied'}}
+        mock_s3.upload_part.side_effect = ClientError(error_response, 'upload_part')
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--part-size', '5M'])
+        
+        assert exit_code == 1
+        mock_s3.abort_multipart_upload.assert_called_once_with(
+            Bucket='my-bucket', Key='video.mp4', UploadId='upload-1')
+        mock_s3.complete_multipart_upload.assert_not_called()
+        captured = capsys.readouterr()
+        assert "Error: Access denied to bucket 'my-bucket'" in captured.err
+    
+    def test_bandwidth_limiter(self):
+        """Test that the limiter spaces out consumption."""
+        from vib3_cli import BandwidthLimiter
+        limiter = BandwidthLimiter(1000)
+        with patch('time.sleep') as mock_sleep:
+            limiter.consume(1000)
+            limiter.consume(500)
+        assert mock_sleep.call_count == 1
+        assert mock_sleep.call_args[0][0] == pytest.approx(1.0, abs=0.05)
+
+
+class TestResumableUpload:
+    """Test cases for resumable multipart uploads."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _make_s3(self, received, fail_part=None):
+        """Create a mock S3 client that can fail on a given part."""
+        mock_s3 = MagicMock()
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        
+        def upload_part(Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+            if PartNumber == fail_part:
+                raise ClientError({'Error': {'Code': 'RequestTimeout'}}, 'upload_part')
+            data = Body.read()
+            received[PartNumber] = data
+            return {'ETag': '"%s"' % hashlib.md5(data).hexdigest()}
+        
+        mock_s3.upload_part.side_effect = upload_part
+        return mock_s3
+    
+    def _write_video(self, tmp_path):
+        data = os.urandom(11 * 1024 * 1024)
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(data)
+        return path, data
+    
+    @patch('boto3.client')
+    def test_interrupted_upload_keeps_journal(self, mock_boto_client, tmp_path):
+        """Test that a failed upload leaves a journal and an open upload."""
+        path, data = self._write_video(tmp_path)
+        received = {}
+        mock_s3 = self._make_s3(received, fail_part=3)
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--part-size', '5M',
+                                  '--concurrency', '1'])
+        
+        assert exit_code == 1
+        mock_s3.abort_multipart_upload.assert_not_called()
+        journal = UploadJournal.load(str(path))
+        assert journal.header['upload_id'] == 'upload-1'
+        assert sorted(journal.parts) == [1, 2]
+        journal.close()
+    
+    @patch('boto3.client')
+    def test_resume_sends_only_missing_parts(self, mock_boto_client, tmp_path, capsys):
+        """Test that --resume skips parts that S3 already has."""
+        path, data = self._write_video(tmp_path)
+        received = {}
+        mock_boto_client.return_value = self._make_s3(received, fail_part=3)
+        self.cli.run(['upload', str(path), 'my-bucket', '--part-size', '5M', '--concurrency', '1'])
+        
+        uploaded = {n: '"%s"' % hashlib.md5(received[n]).hexdigest() for n in received}
+        received.clear()
+        mock_s3 = self._make_s3(received)
+        mock_s3.get_paginator.return_value.paginate.return_value = [
+            {'Parts': [{'PartNumber': n, 'ETag': etag} for n, etag in uploaded.items()]}
+        ]
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--resume'])
+        
+        assert exit_code == 0
+        assert list(received) == [3]
+        mock_s3.create_multipart_upload.assert_not_called()
+        parts = mock_s3.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        assert [p['PartNumber'] for p in parts] == [1, 2, 3]
+        assert not os.path.exists(UploadJournal.path_for(str(path)))
+        captured = capsys.readouterr()
+        assert 'Resumed upload: 2 of 3 parts were already uploaded' in captured.out
+    
+    @patch('boto3.client')
+    def test_resume_accepts_unjournaled_part_with_matching_md5(self, mock_boto_client, tmp_path):
+        """Test that a part uploaded but not journaled is verified by MD5."""
+        path, data = self._write_video(tmp_path)
+        stat = os.stat(path)
+        journal = UploadJournal.create(str(path), {
+            'bucket': 'my-bucket', 'key': 'video.mp4', 'upload_id': 'upload-1',
+            'part_size': 5 * 1024 * 1024, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+        })
+        journal.close()
+        
+        received = {}
+        mock_s3 = self._make_s3(received)
+        part1 = data[:5 * 1024 * 1024]
+        mock_s3.get_paginator.return_value.paginate.return_value = [
+            {'Parts': [{'PartNumber': 1, 'ETag': '"%s"' % hashlib.md5(part1).hexdigest()},
+                       {'PartNumber': 2, 'ETag': '"stale"'}]}
+        ]
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--resume'])
+        
+        assert exit_code == 0
+        assert sorted(received) == [2, 3]
+    
+    @patch('boto3.client')
+    def test_resume_rejects_changed_file(self, mock_boto_client, tmp_path, capsys):
+        """Test that a journal for a different destination is not resumed."""
+        path, data = self._write_video(tmp_path)
+        stat = os.stat(path)
+        UploadJournal.create(str(path), {
+            'bucket': 'other-bucket', 'key': 'video.mp4', 'upload_id': 'upload-1',
+            'part_size': 5 * 1024 * 1024, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+        }).close()
+        mock_boto_client.return_value = MagicMock()
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--resume'])
+        
+        assert exit_code == 1
+        captured = capsys.readouterr()
+        assert 'does not match this file or destination' in captured.err
+    
+    def test_journal_ignores_torn_line(self, tmp_path):
+        """Test that a partially written final record is ignored."""
+        path = str(tmp_path / 'video.mp4')
+        journal = UploadJournal.create(path, {'upload_id': 'upload-1'})
+        journal.record_part(1, '"a"', 'a')
+        journal.close()
+        with open(UploadJournal.path_for(path), 'a') as f:
+            f.write('{"part": 2, "et')
+        
+        loaded = UploadJournal.load(path)
+        assert list(loaded.parts) == [1]
+        loaded.close()
+
+
+class TestRangedDownload:
+    """Test cases for parallel ranged downloads."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _make_s3(self, data, requested, etag='"v1"'):
+        """Create a mock S3 client that serves byte ranges of `data`."""
+        mock_s3 = MagicMock()
+        mock_s3.head_object.return_value = {'ContentLength': len(data), 'ETag': etag}
+        
+        def get_object(Bucket, Key, Range, IfMatch=None):
+            assert IfMatch == etag
+            start, end = (int(n) for n in Range[len('bytes='):].split('-'))
+            requested.append(start)
+            body = data[start:end + 1]
+            return {'Body': StreamingBody(io.BytesIO(body), len(body))}
+        
+        mock_s3.get_object.side_effect = get_object
+        return mock_s3
+    
+    @patch('boto3.client')
+    def test_ranged_download(self, mock_boto_client, tmp_path, capsys):
+        """Test that ranges are reassembled in place at their offsets."""
+        data = os.urandom(11 * 1024 * 1024)
+        output = tmp_path / 'video.mp4'
+        requested = []
+        mock_s3 = self._make_s3(data, requested)
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['download', 'my-bucket', 'video.mp4', '--output', str(output),
+                                  '--part-size', '5M', '--concurrency', '3'])
+        
+        assert exit_code == 0
+        assert output.read_bytes() == data
+        assert sorted(requested) == [0, 5 * 1024 * 1024, 10 * 1024 * 1024]
+        mock_s3.download_file.assert_not_called()
+        assert not os.path.exists(DownloadJournal.path_for(str(output)))
+        captured = capsys.readouterr()
+        assert 'Fetched 3 ranges of 5,242,880 bytes' in captured.out
+    
+    @patch('boto3.client')
+    def test_resume_fetches_only_missing_ranges(self, mock_boto_client, tmp_path, capsys):
+        """Test that --resume skips ranges recorded in the journal."""
+        data = os.urandom(11 * 1024 * 1024)
+        part = 5 * 1024 * 1024
+        output = tmp_path / 'video.mp4'
+        output.write_bytes(data[:part] + bytes(len(data) - part))
+        journal = DownloadJournal.create(str(output), {
+            'bucket': 'my-bucket', 'key': 'video.mp4', 'etag': '"v1"',
+            'size': len(data), 'part_size': part,
+        })
+        journal.record_part(1)
+        journal.close()
+        
+        requested = []
+        mock_boto_client.return_value = self._make_s3(data, requested)
+        
+        exit_code = self.cli.run(['download', 'my-bucket', 'video.mp4', '--output', str(output),
+                                  '--resume'])
+        
+        assert exit_code == 0
+        assert output.read_bytes() == data
+        assert sorted(requested) == [part, 2 * part]
+        captured = capsys.readouterr()
+        assert 'Resumed download: 1 of 3 ranges were already downloaded' in captured.out
+    
+    @patch('boto3.client')
+    def test_resume_restarts_when_object_changed(self, mock_boto_client, tmp_path):
+        """Test that a journal for an older object version is discarded."""
+        data = os.urandom(11 * 1024 * 1024)
+        part = 5 * 1024 * 1024
+        output = tmp_path / 'video.mp4'
+        output.write_bytes(bytes(len(data)))
+        journal = DownloadJournal.create(str(output), {
+            'bucket': 'my-bucket', 'key': 'video.mp4', 'etag': '"v0"',
+            'size': len(data), 'part_size': part,
+        })
+        journal.record_part(1)
+        journal.close()
+        
+        requested = []
+        mock_boto_client.return_value = self._make_s3(data, requested, etag='"v2"')
+        
+        exit_code = self.cli.run(['download', 'my-bucket', 'video.mp4', '--output', str(output),
+                                  '--part-size', '5M', '--resume'])
+        
+        assert exit_code == 0
+        assert output.read_bytes() == data
+        assert len(requested) == 3
+
+
+class TestSyncCommand:
+    """Test cases for the sync command."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _make_s3(self, objects):
+        """Create a mock S3 client backed by a dict of key -> bytes."""
+        mock_s3 = MagicMock()
+        
+        def paginate(Bucket, Prefix):
+            return [{'Contents': [
+                {'Key': key, 'Size': len(data), 'ETag': '"%s"' % hashlib.md5(data).hexdigest()}
+                for key, data in sorted(objects.items()) if key.startswith(Prefix)
+            ]}]
+        
+        def put_object(Bucket, Key, Body):
+            objects[Key] = Body.read()
+            return {'ETag': '"%s"' % hashlib.md5(objects[Key]).hexdigest()}
+        
+        def get_object(Bucket, Key):
+            data = objects[Key]
+            return {'Body': StreamingBody(io.BytesIO(data), len(data))}
+        
+        mock_s3.get_paginator.return_value.paginate.side_effect = paginate
+        mock_s3.put_object.side_effect = put_object
+        mock_s3.get_object.side_effect = get_object
+        return mock_s3
+    
+    @patch('boto3.client')
+    def test_sync_upload_then_noop(self, mock_boto_client, tmp_path, capsys):
+        """Test that a second sync of an unchanged tree transfers nothing."""
+        (tmp_path / 'clips').mkdir()
+        (tmp_path / 'a.mp4').write_bytes(b'aaa')
+        (tmp_path / 'clips' / 'b.mp4').write_bytes(b'bbb')
+        objects = {}
+        mock_s3 = self._make_s3(objects)
+        mock_boto_client.return_value = mock_s3
+        
+        assert self.cli.run(['sync', str(tmp_path), 's3://my-bucket/videos']) == 0
+        assert objects == {'videos/a.mp4': b'aaa', 'videos/clips/b.mp4': b'bbb'}
+        assert (tmp_path / '.vib3sync.json').exists()
+        
+        mock_s3.put_object.reset_mock()
+        assert self.cli.run(['sync', str(tmp_path), 's3://my-bucket/videos']) == 0
+        mock_s3.put_object.assert_not_called()
+        captured = capsys.readouterr()
+        assert 'Synced 0 files, deleted 0, 2 unchanged' in captured.out
+    
+    @patch('boto3.client')
+    def test_sync_upload_changed_file(self, mock_boto_client, tmp_path):
+        """Test that only a modified file is uploaded again."""
+        (tmp_path / 'a.mp4').write_bytes(b'aaa')
+        (tmp_path / 'b.mp4').write_bytes(b'bbb')
+        objects = {}
+        mock_s3 = self._make_s3(objects)
+        mock_boto_client.return_value = mock_s3
+        self.cli.run(['sync', str(tmp_path), 's3://my-bucket'])
+        
+        (tmp_path / 'b.mp4').write_bytes(b'bbbb')
+        mock_s3.put_object.reset_mock()
+        assert self.cli.run(['sync', str(tmp_path), 's3://my-bucket']) == 0
+        
+        assert mock_s3.put_object.call_count == 1
+        assert objects['b.mp4'] == b'bbbb'
+    
+    @patch('boto3.client')
+    def test_sync_resends_file_rewritten_during_upload(self, mock_boto_client, tmp_path):
+        """Test that the manifest records the uploaded state, not a later rewrite."""
+        path = tmp_path / 'a.mp4'
+        path.write_bytes(b'aaa')
+        objects = {}
+        mock_s3 = self._make_s3(objects)
+        upload = mock_s3.put_object.side_effect
+        
+        def put_object(Bucket, Key, Body):
+            result = upload(Bucket, Key, Body)
+            path.write_bytes(b'rewritten')
+            return result
+        
+        mock_s3.put_object.side_effect = put_object
+        mock_boto_client.return_value = mock_s3
+        assert self.cli.run(['sync', str(tmp_path), 's3://my-bucket']) == 0
+        
+        mock_s3.put_object.side_effect = upload
+        assert self.cli.run(['sync', str(tmp_path), 's3://my-bucket']) == 0
+        
+        assert objects['a.mp4'] == b'rewritten'
+    
+    @patch('boto3.client')
+    def test_sync_download_rejects_escaping_keys(self, mock_boto_client, tmp_path, capsys):
+        """Test that a key with '..' segments is reported instead of written outside the directory."""
+        target = tmp_path / 'target'
+        objects = {'videos/a.mp4': b'aaa', 'videos/../../escape.mp4': b'evil'}
+        mock_boto_client.return_value = self._make_s3(objects)
+        
+        exit_code = self.cli.run(['sync', 's3://my-bucket/videos/', str(target)])
+        
+        assert exit_code == 1
+        assert (target / 'a.mp4').read_bytes() == b'aaa'
+        assert not (tmp_path / 'escape.mp4').exists()
+        assert 'outside' in capsys.readouterr().err
+    
+    @patch('boto3.client')
+    def test_sync_download_with_delete(self, mock_boto_client, tmp_path):
+        """Test downloading a prefix and deleting local extras."""
+        (tmp_path / 'stale.mp4').write_bytes(b'old')
+        objects = {'videos/a.mp4': b'aaa', 'videos/clips/b.mp4': b'bbb', 'other/c.mp4': b'ccc'}
+        mock_boto_client.return_value = self._make_s3(objects)
+        
+        exit_code = self.cli.run(['sync', 's3://my-bucket/videos/', str(tmp_path), '--delete'])
+        
+        assert exit_code == 0
+        assert (tmp_path / 'a.mp4').read_bytes() == b'aaa'
+        assert (tmp_path / 'clips' / 'b.mp4').read_bytes() == b'bbb'
+        assert not (tmp_path / 'stale.mp4').exists()
+        assert not (tmp_path / 'c.mp4').exists()
+    
+    @patch('boto3.client')
+    def test_sync_upload_delete_batches(self, mock_boto_client, tmp_path):
+        """Test that remote extras are removed with DeleteObjects."""
+        (tmp_path / 'a.mp4').write_bytes(b'aaa')
+        objects = {'gone.mp4': b'x'}
+        mock_s3 = self._make_s3(objects)
+        mock_boto_client.return_value = mock_s3
+        
+        assert self.cli.run(['sync', str(tmp_path), 's3://my-bucket', '--delete']) == 0
+        
+        mock_s3.delete_objects.assert_called_once_with(
+            Bucket='my-bucket', Delete={'Objects': [{'Key': 'gone.mp4'}], 'Quiet': True})
+    
+    @patch('boto3.client')
+    def test_sync_dry_run(self, mock_boto_client, tmp_path, capsys):
+        """Test that --dry-run lists changes without transferring."""
+        (tmp_path / 'a.mp4').write_bytes(b'aaa')
+        mock_s3 = self._make_s3({})
+        mock_boto_client.return_value = mock_s3
+        
+        assert self.cli.run(['sync', str(tmp_path), 's3://my-bucket', '--dry-run']) == 0
+        
+        mock_s3.put_object.assert_not_called()
+        captured = capsys.readouterr()
+        assert '(dry run) upload: a.mp4' in captured.out
+    
+    def test_sync_requires_one_s3_side(self, tmp_path, capsys):
+        """Test that sync rejects two local paths."""
+        exit_code = self.cli.run(['sync', str(tmp_path), str(tmp_path)])
+        assert exit_code == 1
+        captured = capsys.readouterr()
+        assert 'one local directory and one s3:// URL' in captured.err
+
+
+class TestBatchTransfers:
+    """Test cases for batch uploads and downloads."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    @patch('boto3.client')
+    def test_batch_upload_shares_one_client(self, mock_boto_client, tmp_path, capsys):
+        """Test that positional and --from-file items use one client."""
+        for name in ('a.jpg', 'b.jpg', 'c.jpg'):
+            (tmp_path / name).write_bytes(name.encode())
+        listing = tmp_path / 'files.txt'
+        listing.write_text(str(tmp_path / 'b.jpg') + '\n' +
+                           json.dumps({'file': str(tmp_path / 'c.jpg'), 'key': 'thumbs/c.jpg'}) + '\n')
+        mock_s3 = MagicMock()
+        mock_s3.put_object.return_value = {'ETag': '"x"'}
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(tmp_path / 'a.jpg'), 'my-bucket',
+                                  '--from-file', str(listing), '--jobs', '2', '--pool-size', '4'])
+        
+        assert exit_code == 0
+        mock_boto_client.assert_called_once()
+        assert mock_boto_client.call_args.kwargs['config'].max_pool_connections == 4
+        keys = sorted(c.kwargs['Key'] for c in mock_s3.put_object.call_args_list)
+        assert keys == ['a.jpg', 'b.jpg', 'thumbs/c.jpg']
+        captured = capsys.readouterr()
+        assert 'Transferred 3 files (15 bytes)' in captured.out
+    
+    @patch('boto3.client')
+    def test_batch_upload_from_stdin(self, mock_boto_client, tmp_path):
+        """Test reading NDJSON items from stdin."""
+        (tmp_path / 'a.jpg').write_bytes(b'a')
+        mock_s3 = MagicMock()
+        mock_s3.put_object.return_value = {'ETag': '"x"'}
+        mock_boto_client.return_value = mock_s3
+        stdin = StringIO(json.dumps({'file': str(tmp_path / 'a.jpg'), 'key': 'k/a.jpg'}) + '\n')
+        
+        with patch('sys.stdin', stdin):
+            exit_code = self.cli.run(['upload', 'my-bucket', '--from-file', '-'])
+        
+        assert exit_code == 0
+        assert mock_s3.put_object.call_args.kwargs['Key'] == 'k/a.jpg'
+    
+    @patch('boto3.client')
+    def test_batch_upload_reports_failures(self, mock_boto_client, tmp_path, capsys):
+        """Test that failed items are reported and the exit code is non-zero."""
+        (tmp_path / 'a.jpg').write_bytes(b'a')
+        (tmp_path / 'b.jpg').write_bytes(b'b')
+        mock_s3 = MagicMock()
+        
+        def put_object(Bucket, Key, Body):
+            if Key == 'b.jpg':
+                raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'put_object')
+            return {'ETag': '"x"'}
+        
+        mock_s3.put_object.side_effect = put_object
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(tmp_path / 'a.jpg'), str(tmp_path / 'b.jpg'),
+                                  'my-bucket'])
+        
+        assert exit_code == 1
+        captured = capsys.readouterr()
+        assert "Access denied to bucket 'my-bucket'" in captured.err
+        assert '1 of 2 uploads failed' in captured.err
+    
+    def test_batch_upload_rejects_key(self, tmp_path, capsys):
+        """Test that --key is refused for several files."""
+        exit_code = self.cli.run(['upload', 'a.jpg', 'b.jpg', 'my-bucket', '--key', 'x'])
+        assert exit_code == 1
+        captured = capsys.readouterr()
+        assert '--key can only be used when uploading a single file' in captured.err
+    
+    @patch('boto3.client')
+    def test_batch_download(self, mock_boto_client, tmp_path, capsys):
+        """Test downloading several keys into a directory."""
+        objects = {'thumbs/a.jpg': b'aa', 'thumbs/b.jpg': b'bbb'}
+        (tmp_path / 'thumbs').mkdir()
+        (tmp_path / 'thumbs' / 'b.jpg').write_bytes(b'old')
+        mock_s3 = MagicMock()
+        mock_s3.head_object.side_effect = lambda Bucket, Key: {'ContentLength': len(objects[Key])}
+        mock_s3.get_object.side_effect = lambda Bucket, Key: {
+            'Body': StreamingBody(io.BytesIO(objects[Key]), len(objects[Key]))}
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['download', 'my-bucket', 'thumbs/a.jpg', 'thumbs/b.jpg',
+                                  '--output', str(tmp_path)])
+        
+        assert exit_code == 0
+        assert (tmp_path / 'thumbs' / 'a.jpg').read_bytes() == b'aa'
+        assert (tmp_path / 'thumbs' / 'b.jpg').read_bytes() == b'old'
+        captured = capsys.readouterr()
+        assert 'already exists; use --force to overwrite' in captured.out
+    
+    @patch('boto3.client')
+    def test_batch_download_rejects_escaping_keys(self, mock_boto_client, tmp_path, capsys):
+        """Test that keys with '..' segments fail instead of landing outside --output."""
+        objects = {'thumbs/a.jpg': b'aa', 'thumbs/../../escape.jpg': b'evil'}
+        mock_s3 = MagicMock()
+        mock_s3.head_object.side_effect = lambda Bucket, Key: {'ContentLength': len(objects[Key])}
+        mock_s3.get_object.side_effect = lambda Bucket, Key: {
+            'Body': StreamingBody(io.BytesIO(objects[Key]), len(objects[Key]))}
+        mock_boto_client.return_value = mock_s3
+        listing = tmp_path / 'keys.txt'
+        listing.write_text('thumbs/a.jpg\nthumbs/../../escape.jpg\n')
+        
+        exit_code = self.cli.run(['download', 'my-bucket', '--from-file', str(listing),
+                                  '--output', str(tmp_path / 'out')])
+        
+        assert exit_code == 1
+        assert (tmp_path / 'out' / 'thumbs' / 'a.jpg').read_bytes() == b'aa'
+        assert not (tmp_path / 'escape.jpg').exists()
+        assert 'outside' in capsys.readouterr().err
+
+
+class TestDedupUpload:
+    """Test cases for content-addressed dedup on upload."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _write_clip(self, tmp_path, data=b'clip-bytes'):
+        path = tmp_path / 'clip.mp4'
+        path.write_bytes(data)
+        return path, hashlib.sha256(data).hexdigest()
+    
+    @patch('boto3.client')
+    def test_dedup_uploads_new_content_with_digest(self, mock_boto_client, tmp_path):
+        """Test that new content is uploaded with its SHA-256 and indexed."""
+        path, digest = self._write_clip(tmp_path)
+        mock_s3 = MagicMock()
+        mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'head_object')
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--dedup'])
+        
+        assert exit_code == 0
+        assert mock_s3.upload_file.call_args.kwargs['ExtraArgs'] == {'Metadata': {'sha256': digest}}
+        index = DedupIndex()
+        assert index.lookup(digest) == [('my-bucket', 'clip.mp4')]
+        index.close()
+    
+    @patch('boto3.client')
+    def test_dedup_skips_identical_destination(self, mock_boto_client, tmp_path, capsys):
+        """Test that an upload is skipped when the key already has the content."""
+        path, digest = self._write_clip(tmp_path)
+        mock_s3 = MagicMock()
+        mock_s3.head_object.return_value = {'ContentLength': 10, 'Metadata': {'sha256': digest}}
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--dedup'])
+        
+        assert exit_code == 0
+        mock_s3.upload_file.assert_not_called()
+        captured = capsys.readouterr()
+        assert 'already has this content' in captured.out
+    
+    @patch('boto3.client')
+    def test_dedup_copies_from_indexed_object(self, mock_boto_client, tmp_path, capsys):
+        """Test that known content is copied server-side instead of uploaded."""
+        path, digest = self._write_clip(tmp_path)
+        index = DedupIndex()
+        index.add(digest, 'my-bucket', 'originals/clip.mp4')
+        index.close()
+        
+        mock_s3 = MagicMock()
+        
+        def head_object(Bucket, Key):
+            if Key == 'clip.mp4':
+                raise ClientError({'Error': {'Code': '404'}}, 'head_object')
+            return {'ContentLength': 10, 'Metadata': {'sha256': digest}}
+        
+        mock_s3.head_object.side_effect = head_object
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--dedup'])
+        
+        assert exit_code == 0
+        mock_s3.upload_file.assert_not_called()
+        mock_s3.copy_object.assert_called_once_with(
+            Bucket='my-bucket', Key='clip.mp4',
+            CopySource={'Bucket': 'my-bucket', 'Key': 'originals/clip.mp4'},
+            MetadataDirective='COPY')
+        captured = capsys.readouterr()
+        assert 'server-side (identical content)' in captured.out
+    
+    @patch('boto3.client')
+    def test_dedup_drops_stale_index_entry(self, mock_boto_client, tmp_path):
+        """Test that an index entry whose object changed is discarded."""
+        path, digest = self._write_clip(tmp_path)
+        index = DedupIndex()
+        index.add(digest, 'my-bucket', 'old.mp4')
+        index.close()
+        
+        mock_s3 = MagicMock()
+        
+        def head_object(Bucket, Key):
+            if Key == 'clip.mp4':
+                raise ClientError({'Error': {'Code': '404'}}, 'head_object')
+            return {'ContentLength': 10, 'Metadata': {'sha256': 'something-else'}}
+        
+        mock_s3.head_object.side_effect = head_object
+        mock_boto_client.return_value = mock_s3
+        
+        assert self.cli.run(['upload', str(path), 'my-bucket', '--dedup']) == 0
+        
+        mock_s3.copy_object.assert_not_called()
+        mock_s3.upload_file.assert_called_once()
+        index = DedupIndex()
+        assert index.lookup(digest) == [('my-bucket', 'clip.mp4')]
+        index.close()
+
+
+class TestStreaming:
+    """Test cases for stdin uploads and stdout downloads."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    @patch('boto3.client')
+    def test_upload_from_stdin_multipart(self, mock_boto_client):
+        """Test that a piped stream is uploaded as ordered parts."""
+        data = os.urandom(11 * 1024 * 1024)
+        received = {}
+        mock_s3 = MagicMock()
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        
+        def upload_part(Bucket, Key, UploadId, PartNumber, Body):
+            received[PartNumber] = Body.read()
+            return {'ETag': f'"etag-{PartNumber}"'}
+        
+        mock_s3.upload_part.side_effect = upload_part
+        mock_boto_client.return_value = mock_s3
+        
+        stdin = io.TextIOWrapper(io.BytesIO(data))
+        with patch('sys.stdin', stdin):
+            exit_code = self.cli.run(['upload', '-', 'my-bucket', '--key', 'live/stream.mp4',
+                                      '--part-size', '5M', '--concurrency', '2'])
+        
+        assert exit_code == 0
+        assert b''.join(received[n] for n in sorted(received)) == data
+        parts = mock_s3.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        assert [p['PartNumber'] for p in parts] == [1, 2, 3]
+    
+    @patch('boto3.client')
+    def test_upload_short_stdin_uses_single_put(self, mock_boto_client):
+        """Test that a stream shorter than one part is sent with PutObject."""
+        mock_s3 = MagicMock()
+        mock_s3.put_object.side_effect = lambda Bucket, Key, Body: {'ETag': Body.read() and '"x"'}
+        mock_boto_client.return_value = mock_s3
+        
+        with patch('sys.stdin', io.TextIOWrapper(io.BytesIO(b'tiny'))):
+            exit_code = self.cli.run(['upload', '-', 'my-bucket', '--key', 'tiny.bin'])
+        
+        assert exit_code == 0
+        mock_s3.create_multipart_upload.assert_not_called()
+        assert mock_s3.put_object.call_args.kwargs['Key'] == 'tiny.bin'
+    
+    @patch('boto3.client')
+    def test_failed_abort_keeps_upload_error(self, mock_boto_client, capsys):
+        """Test that an error from the cleanup abort does not mask the upload error."""
+        mock_s3 = MagicMock()
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        mock_s3.upload_part.side_effect = ClientError({'Error': {'Code': 'SlowDown'}}, 'UploadPart')
+        mock_s3.abort_multipart_upload.side_effect = ClientError({'Error': {'Code': 'ExpiredToken'}},
+                                                                 'AbortMultipartUpload')
+        mock_boto_client.return_value = mock_s3
+        
+        with patch('sys.stdin', io.TextIOWrapper(io.BytesIO(os.urandom(6 * 1024 * 1024)))):
+            exit_code = self.cli.run(['upload', '-', 'my-bucket', '--key', 'live/stream.mp4',
+                                      '--part-size', '5M'])
+        
+        assert exit_code == 1
+        err = capsys.readouterr().err
+        assert 'SlowDown' in err and 'ExpiredToken' not in err
+    
+    @patch('boto3.client')
+    def test_unreachable_abort_keeps_upload_error(self, mock_boto_client, capsys):
+        """Test that a connection error from the cleanup abort does not mask the upload error."""
+        from botocore.exceptions import EndpointConnectionError
+        mock_s3 = MagicMock()
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        mock_s3.upload_part.side_effect = ClientError({'Error': {'Code': 'SlowDown'}}, 'UploadPart')
+        mock_s3.abort_multipart_upload.side_effect = EndpointConnectionError(
+            endpoint_url='https://s3.amazonaws.com')
+        mock_boto_client.return_value = mock_s3
+        
+        with patch('sys.stdin', io.TextIOWrapper(io.BytesIO(os.urandom(6 * 1024 * 1024)))):
+            exit_code = self.cli.run(['upload', '-', 'my-bucket', '--key', 'live/stream.mp4',
+                                      '--part-size', '5M'])
+        
+        assert exit_code == 1
+        err = capsys.readouterr().err
+        assert 'SlowDown' in err and 'Could not connect' not in err
+    
+    def test_upload_stdin_requires_key(self, capsys):
+        """Test that stdin uploads need an explicit key."""
+        exit_code = self.cli.run(['upload', '-', 'my-bucket'])
+        assert exit_code == 1
+        captured = capsys.readouterr()
+        assert '--key is required when uploading from stdin' in captured.err
+    
+    @patch('boto3.client')
+    def test_download_to_stdout_in_order(self, mock_boto_client):
+        """Test that ranged downloads are written to stdout in order."""
+        data = os.urandom(11 * 1024 * 1024)
+        mock_s3 = MagicMock()
+        mock_s3.head_object.return_value = {'ContentLength': len(data), 'ETag': '"v1"'}
+        
+        def get_object(Bucket, Key, Range, IfMatch):
+            start, end = (int(n) for n in Range[len('bytes='):].split('-'))
+            body = data[start:end + 1]
+            return {'Body': StreamingBody(io.BytesIO(body), len(body))}
+        
+        mock_s3.get_object.side_effect = get_object
+        mock_boto_client.return_value = mock_s3
+        
+        stdout = io.TextIOWrapper(io.BytesIO())
+        with patch('sys.stdout', stdout):
+            exit_code = self.cli.run(['download', 'my-bucket', 'video.mp4', '--output', '-',
+                                      '--part-size', '5M', '--concurrency', '2'])
+        
+        assert exit_code == 0
+        assert stdout.buffer.getvalue() == data
+    
+    @patch('boto3.client')
+    def test_download_small_object_to_stdout(self, mock_boto_client, capsys):
+        """Test that progress messages do not mix with streamed data."""
+        mock_s3 = MagicMock()
+        mock_s3.head_object.return_value = {'ContentLength': 5}
+        mock_s3.get_object.return_value = {'Body': StreamingBody(io.BytesIO(b'hello'), 5)}
+        mock_boto_client.return_value = mock_s3
+        
+        stdout = io.TextIOWrapper(io.BytesIO())
+        with patch('sys.stdout', stdout):
+            exit_code = self.cli.run(['download', 'my-bucket', 'hello.txt', '--output', '-'])
+        
+        assert exit_code == 0
+        assert stdout.buffer.getvalue() == b'hello'
+        captured = capsys.readouterr()
+        assert 'Streaming s3://my-bucket/hello.txt (5 bytes) to stdout' in captured.err
+
+
+class TestProgressReporter:
+    """Test cases for the shared progress reporter."""
+    
+    class FakeTTY(StringIO):
+        def isatty(self):
+            return True
+    
+    def test_aggregates_concurrent_updates(self):
+        """Test that updates from many threads are all counted."""
+        import threading
+        from vib3_cli import ProgressReporter
+        reporter = ProgressReporter(8000, stream=StringIO())
+        threads = [threading.Thread(target=lambda: [reporter.update(1) for _ in range(1000)])
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert reporter.done == 8000
+    
+    def test_render_is_rate_limited(self):
+        """Test that thousands of callbacks produce only a few redraws."""
+        from vib3_cli import ProgressReporter
+        stream = self.FakeTTY()
+        clock = [100.0]
+        with patch('time.monotonic', side_effect=lambda: clock[0]):
+            reporter = ProgressReporter(10000, stream=stream)
+            for _ in range(5000):
+                clock[0] += 0.0001
+                reporter.update(1)
+        # 0.5s of updates at a 0.1s interval
+        assert stream.getvalue().count('\r') == 5
+    
+    def test_tty_line_has_rate_and_eta(self):
+        """Test the terminal status line."""
+        from vib3_cli import ProgressReporter
+        stream = self.FakeTTY()
+        clock = [100.0]
+        with patch('time.monotonic', side_effect=lambda: clock[0]):
+            reporter = ProgressReporter(4 * 1024 * 1024, stream=stream)
+            clock[0] += 1.0
+            reporter.update(1024 * 1024)
+        line = stream.getvalue()
+        assert '25.0%' in line
+        assert '1.0 MiB/s' in line
+        assert 'ETA 0:03' in line
+    
+    def test_ndjson_when_not_a_tty(self):
+        """Test that non-terminal output is periodic NDJSON."""
+        from vib3_cli import ProgressReporter
+        stream = StringIO()
+        clock = [100.0]
+        with patch('time.monotonic', side_effect=lambda: clock[0]):
+            reporter = ProgressReporter(2000, stream=stream)
+            clock[0] += 0.5
+            reporter.update(500)
+            clock[0] += 0.5
+            reporter.update(500)
+            reporter.finish()
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [r['event'] for r in records] == ['progress', 'done']
+        assert records[0]['bytes'] == 1000
+        assert records[0]['rate'] == 1000
+        assert records[0]['eta'] == 1.0
+
+
+class TestChecksums:
+    """Test cases for S3 checksums computed during transfers."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    @staticmethod
+    def _sha256(data):
+        return base64.b64encode(hashlib.sha256(data).digest()).decode()
+    
+    @patch('boto3.client')
+    def test_multipart_upload_sends_part_checksums(self, mock_boto_client, tmp_path, capsys):
+        """Test that every part carries its SHA-256 and the composite is recorded."""
+        data = os.urandom(11 * 1024 * 1024)
+        part = 5 * 1024 * 1024
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(data)
+        
+        sent = {}
+        mock_s3 = MagicMock()
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        
+        def upload_part(Bucket, Key, UploadId, PartNumber, Body, ChecksumSHA256):
+            assert ChecksumSHA256 == self._sha256(Body.read())
+            sent[PartNumber] = ChecksumSHA256
+            return {'ETag': f'"etag-{PartNumber}"'}
+        
+        mock_s3.upload_part.side_effect = upload_part
+        chunks = [data[i:i + part] for i in range(0, len(data), part)]
+        composite = composite_checksum('sha256', [self._sha256(c) for c in chunks])
+        mock_s3.complete_multipart_upload.return_value = {'ETag': '"e-3"', 'ChecksumSHA256': composite}
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--part-size', '5M',
+                                  '--checksum', 'sha256'])
+        
+        assert exit_code == 0
+        assert composite.endswith('-3')
+        assert mock_s3.create_multipart_upload.call_args.kwargs['ChecksumAlgorithm'] == 'SHA256'
+        parts = mock_s3.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        assert [p['ChecksumSHA256'] for p in parts] == [sent[1], sent[2], sent[3]]
+        with open(str(path) + '.vib3sum') as f:
+            manifest = json.load(f)
+        assert manifest['checksum'] == composite
+        assert manifest['parts'] == [sent[1], sent[2], sent[3]]
+    
+    @patch('boto3.client')
+    def test_small_upload_sends_crc32(self, mock_boto_client, tmp_path):
+        """Test that a single PUT carries the whole-file CRC32."""
+        data = b'clip data' * 1000
+        path = tmp_path / 'clip.mp4'
+        path.write_bytes(data)
+        mock_s3 = MagicMock()
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--checksum', 'crc32'])
+        
+        assert exit_code == 0
+        mock_s3.upload_file.assert_not_called()
+        expected = base64.b64encode(zlib.crc32(data).to_bytes(4, 'big')).decode()
+        kwargs = mock_s3.put_object.call_args.kwargs
+        assert kwargs['ChecksumCRC32'] == expected
+        with open(str(path) + '.vib3sum') as f:
+            assert json.load(f)['checksum'] == expected
+    
+    def _make_s3(self, data, checksum, part_size):
+        """Create a mock S3 client serving `data` with a stored SHA-256 checksum."""
+        mock_s3 = MagicMock()
+        
+        def head_object(Bucket, Key, ChecksumMode=None, PartNumber=None):
+            if PartNumber:
+                return {'ContentLength': min(part_size, len(data))}
+            return {'ContentLength': len(data), 'ETag': '"v1"', 'ChecksumSHA256': checksum}
+        
+        def get_object(Bucket, Key, Range, IfMatch=None):
+            start, end = (int(n) for n in Range[len('bytes='):].split('-'))
+            body = data[start:end + 1]
+            return {'Body': StreamingBody(io.BytesIO(body), len(body))}
+        
+        mock_s3.head_object.side_effect = head_object
+        mock_s3.get_object.side_effect = get_object
+        return mock_s3
+    
+    @patch('boto3.client')
+    def test_download_verifies_composite_checksum(self, mock_boto_client, tmp_path, capsys):
+        """Test that ranges follow the part boundaries and the composite is checked."""
+        data = os.urandom(11 * 1024 * 1024)
+        part = 5 * 1024 * 1024
+        chunks = [data[i:i + part] for i in range(0, len(data), part)]
+        checksum = composite_checksum('sha256', [self._sha256(c) for c in chunks])
+        mock_boto_client.return_value = self._make_s3(data, checksum, part)
+        output = tmp_path / 'video.mp4'
+        
+        exit_code = self.cli.run(['download', 'my-bucket', 'video.mp4', '--output', str(output),
+                                  '--verify'])
+        
+        assert exit_code == 0
+        assert output.read_bytes() == data
+        captured = capsys.readouterr()
+        assert f'Verified SHA256 {checksum}' in captured.out
+        with open(str(output) + '.vib3sum') as f:
+            assert json.load(f)['checksum'] == checksum
+    
+    @patch('boto3.client')
+    def test_download_checksum_mismatch(self, mock_boto_client, tmp_path, capsys):
+        """Test that a corrupted download is reported and removed."""
+        data = b'clip data' * 1000
+        mock_boto_client.return_value = self._make_s3(data, self._sha256(b'other'), len(data))
+        output = tmp_path / 'clip.mp4'
+        
+        exit_code = self.cli.run(['download', 'my-bucket', 'clip.mp4', '--output', str(output),
+                                  '--verify'])
+        
+        assert exit_code == 1
+        assert not output.exists()
+        captured = capsys.readouterr()
+        assert 'Checksum mismatch' in captured.err
+        assert 'Successfully downloaded' not in captured.out
+
+class TestAdaptiveConcurrency:
+    """Test cases for the AIMD concurrency controller."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+        self.now = 0.0
+    
+    @pytest.fixture(autouse=True)
+    def _clock(self, monkeypatch):
+        monkeypatch.setattr('vib3_cli.time.monotonic', lambda: self.now)
+    
+    def _round(self, controller, amount, seconds, elapsed):
+        """Complete one round of requests moving `amount` bytes each."""
+        requests = controller.limit
+        for _ in range(requests):
+            controller.acquire()
+        self.now += elapsed
+        for _ in range(requests):
+            controller.release(amount, seconds)
+    
+    def test_grows_while_throughput_improves(self):
+        """Test additive increase, and holding once throughput stops improving."""
+        changes = []
+        controller = AdaptiveConcurrency(initial=2, on_change=changes.append)
+        self._round(controller, 1024 * 1024, 0.5, 1.0)
+        assert controller.limit == 3
+        self._round(controller, 1024 * 1024, 0.5, 1.0)
+        assert controller.limit == 4
+        # Same aggregate throughput with more requests: no further growth
+        self._round(controller, 768 * 1024, 0.5, 1.0)
+        assert controller.limit == 4
+        assert changes == [2, 3, 4]
+    
+    def test_throttling_halves_limit_once_per_burst(self):
+        """Test multiplicative decrease with a cooldown."""
+        controller = AdaptiveConcurrency(initial=8)
+        self.now = 10.0
+        controller.throttle()
+        assert controller.limit == 4
+        controller.throttle()
+        assert controller.limit == 4
+        self.now += AdaptiveConcurrency.COOLDOWN
+        controller.throttle()
+        assert controller.limit == 2
+    
+    def test_rising_latency_backs_off(self):
+        """Test that latency well above the best seen sheds requests."""
+        controller = AdaptiveConcurrency(initial=8)
+        self.now = 10.0
+        self._round(controller, 1024 * 1024, 0.1, 1.0)
+        assert controller.limit == 9
+        self._round(controller, 1024 * 1024, 0.5, 1.0)
+        assert controller.limit == 6
+    
+    def test_run_retries_throttled_requests(self, monkeypatch):
+        """Test that a SlowDown is retried after backing off."""
+        monkeypatch.setattr('vib3_cli.time.sleep', lambda seconds: None)
+        controller = AdaptiveConcurrency(initial=8)
+        self.now = 10.0
+        responses = [ClientError({'Error': {'Code': 'SlowDown'}}, 'UploadPart'), {'ETag': '"e"'}]
+        
+        def request():
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        
+        assert controller.run(request, 1024) == {'ETag': '"e"'}
+        assert controller.limit == 4
+        assert controller.in_flight == 0
+    
+    def test_run_raises_other_errors(self):
+        """Test that non-throttling errors are not retried."""
+        controller = AdaptiveConcurrency()
+        error = ClientError({'Error': {'Code': 'AccessDenied'}}, 'UploadPart')
+        
+        def request():
+            raise error
+        
+        with pytest.raises(ClientError):
+            controller.run(request, 1024)
+        assert controller.in_flight == 0
+        assert controller.limit == AdaptiveConcurrency.INITIAL
+    
+    @patch('boto3.client')
+    def test_upload_with_auto_concurrency(self, mock_boto_client, tmp_path, capsys):
+        """Test that --concurrency auto drives the multipart engine."""
+        data = os.urandom(11 * 1024 * 1024)
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(data)
+        received = {}
+        mock_s3 = MagicMock()
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        
+        def upload_part(Bucket, Key, UploadId, PartNumber, Body):
+            received[PartNumber] = Body.read()
+            return {'ETag': f'"etag-{PartNumber}"'}
+        
+        mock_s3.upload_part.side_effect = upload_part
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--part-size', '5M',
+                                  '--concurrency', 'auto'])
+        
+        assert exit_code == 0
+        assert b''.join(received[n] for n in (1, 2, 3)) == data
+        assert mock_boto_client.call_args.kwargs['config'].max_pool_connections == \
+            AdaptiveConcurrency.MAXIMUM
+        mock_s3.meta.events.register.assert_called_once()
+        captured = capsys.readouterr()
+        assert 'Adaptive concurrency finished at' in captured.out
+    
+    def test_auto_concurrency_rejected_for_batches(self, capsys):
+        """Test that auto is limited to single-file transfers."""
+        exit_code = self.cli.run(['upload', 'a.mp4', 'b.mp4', 'my-bucket', '--concurrency', 'auto'])
+        
+        assert exit_code == 1
+        assert '--concurrency auto can only be used' in capsys.readouterr().err
+
+def _box(kind, payload):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def _make_mp4(chunks, table=b'stco'):
+    """Build a minimal MP4 with moov after mdat and chunk offsets into mdat."""
+    ftyp = _box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2mp41')
+    mdat = _box(b'mdat', b''.join(chunks))
+    offsets = []
+    position = len(ftyp) + 8
+    for chunk in chunks:
+        offsets.append(position)
+        position += len(chunk)
+    width = 'I' if table == b'stco' else 'Q'
+    stco = _box(table, b'\x00\x00\x00\x00' + struct.pack(f'>I{len(offsets)}{width}',
+                                                       len(offsets), *offsets))
+    stbl = _box(b'stbl', _box(b'stsd', b'\x00' * 16) + stco)
+    trak = _box(b'trak', _box(b'tkhd', b'\x00' * 84) +
+                _box(b'mdia', _box(b'minf', stbl)))
+    moov = _box(b'moov', _box(b'mvhd', b'\x00' * 100) + trak)
+    return ftyp + mdat + moov
+
+
+def _chunk_offsets(data):
+    """Return (top-level box order, chunk offsets) of an MP4 built by _make_mp4."""
+    from vib3_cli import mp4_boxes
+    boxes = mp4_boxes(io.BytesIO(data), len(data))
+    for kind in (b'stco', b'co64'):
+        pos = data.find(kind)
+        if pos != -1:
+            count = struct.unpack_from('>I', data, pos + 8)[0]
+            width = 'I' if kind == b'stco' else 'Q'
+            return [box[0] for box in boxes], list(struct.unpack_from(f'>{count}{width}', data, pos + 12))
+
+
+class TestFaststart:
+    """Test cases for MP4 fast-start remuxing."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def test_faststart_moves_moov_and_patches_offsets(self, tmp_path, capsys):
+        """Test that moov moves before mdat and chunk offsets still hit the same bytes."""
+        chunks = [os.urandom(1000), os.urandom(2500), os.urandom(700)]
+        path = tmp_path / 'clip.mp4'
+        path.write_bytes(_make_mp4(chunks))
+        
+        exit_code = self.cli.run(['faststart', str(path)])
+        
+        assert exit_code == 0
+        data = path.read_bytes()
+        order, offsets = _chunk_offsets(data)
+        assert order == [b'ftyp', b'moov', b'mdat']
+        for offset, chunk in zip(offsets, chunks):
+            assert data[offset:offset + len(chunk)] == chunk
+        assert not os.path.exists(str(path) + '.vib3faststart')
+        
+        exit_code = self.cli.run(['faststart', str(path)])
+        assert exit_code == 0
+        assert 'already fast-start' in capsys.readouterr().out
+    
+    def test_faststart_keeps_co64_tables(self, tmp_path):
+        """Test that 64-bit chunk offset tables are patched too."""
+        chunks = [os.urandom(300), os.urandom(400)]
+        source = tmp_path / 'clip.mp4'
+        output = tmp_path / 'fast.mp4'
+        source.write_bytes(_make_mp4(chunks, table=b'co64'))
+        
+        assert self.cli.run(['faststart', str(source), '--output', str(output)]) == 0
+        
+        data = output.read_bytes()
+        order, offsets = _chunk_offsets(data)
+        assert order == [b'ftyp', b'moov', b'mdat']
+        assert data[offsets[1]:offsets[1] + 400] == chunks[1]
+    
+    def test_stco_upgraded_to_co64_on_overflow(self):
+        """Test that offsets past 4 GiB turn a stco table into co64."""
+        from vib3_cli import patch_chunk_offsets
+        data = _make_mp4([b'a' * 10, b'b' * 10])
+        moov = data[data.find(b'moov') - 4:]
+        
+        patched = patch_chunk_offsets(moov, lambda offset: offset + 2 ** 32)
+        
+        assert b'stco' not in patched
+        assert len(patched) == len(moov) + 8
+        assert struct.unpack_from('>I', patched)[0] == len(patched)
+        assert _chunk_offsets(patched)[1] == [offset + 2 ** 32 for offset in _chunk_offsets(moov)[1]]
+    
+    def test_rejects_non_mp4(self, tmp_path, capsys):
+        """Test that files without moov/mdat are refused."""
+        path = tmp_path / 'notes.mp4'
+        path.write_bytes(_box(b'free', b'x' * 20))
+        
+        assert self.cli.run(['faststart', str(path)]) == 1
+        assert 'not a complete MP4 file' in capsys.readouterr().err
+    
+    @patch('boto3.client')
+    def test_upload_faststart(self, mock_boto_client, tmp_path, capsys):
+        """Test that --faststart uploads a remuxed copy and leaves the original alone."""
+        chunks = [os.urandom(1000), os.urandom(2000)]
+        original = _make_mp4(chunks)
+        path = tmp_path / 'clip.mp4'
+        path.write_bytes(original)
+        uploaded = {}
+        mock_s3 = MagicMock()
+        mock_s3.upload_file.side_effect = lambda file, bucket, key, **kwargs: \
+            uploaded.update(key=key, data=open(file, 'rb').read())
+        mock_boto_client.return_value = mock_s3
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--faststart'])
+        
+        assert exit_code == 0
+        assert uploaded['key'] == 'clip.mp4'
+        assert _chunk_offsets(uploaded['data'])[0] == [b'ftyp', b'moov', b'mdat']
+        assert path.read_bytes() == original
+        assert not os.path.exists(str(path) + '.vib3faststart')
+
+class TestFollowUpload:
+    """Test cases for uploading a file that is still being written."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    @staticmethod
+    def _write_slowly(path, chunks, delay=0.1):
+        """Append chunks to a file from another thread, then close it."""
+        def writer():
+            with open(path, 'ab') as f:
+                for chunk in chunks:
+                    time.sleep(delay)
+                    f.write(chunk)
+                    f.flush()
+        thread = threading.Thread(target=writer)
+        thread.start()
+        return thread
+    
+    @staticmethod
+    def _read_all(reader):
+        out = bytearray()
+        buffer = bytearray(64 * 1024)
+        while True:
+            n = reader.readinto(buffer)
+            if not n:
+                return bytes(out)
+            out += buffer[:n]
+    
+    def test_follow_reader_ends_when_writer_closes(self, tmp_path):
+        """Test that inotify's close event finishes the stream without waiting for idle."""
+        from vib3_cli import _FollowReader
+        path = tmp_path / 'recording.mp4'
+        path.write_bytes(b'')
+        reader = _FollowReader(str(path), idle=30)
+        if reader._inotify is None:
+            reader.close()
+            pytest.skip("inotify is not available")
+        chunks = [os.urandom(1000) for _ in range(3)]
+        thread = self._write_slowly(path, chunks)
+        
+        started = time.monotonic()
+        data = self._read_all(reader)
+        reader.close()
+        thread.join()
+        
+        assert data == b''.join(chunks)
+        assert time.monotonic() - started < 10
+    
+    def test_follow_reader_polls_until_idle(self, tmp_path, monkeypatch):
+        """Test the polling fallback when inotify is unavailable."""
+        from vib3_cli import _FollowReader
+        
+        def no_inotify():
+            raise OSError("inotify is not available on this platform")
+        
+        monkeypatch.setattr('vib3_cli.Inotify', no_inotify)
+        path = tmp_path / 'recording.mp4'
+        path.write_bytes(b'')
+        reader = _FollowReader(str(path), idle=0.5, poll_interval=0.05)
+        chunks = [os.urandom(1000) for _ in range(3)]
+        thread = self._write_slowly(path, chunks)
+        
+        data = self._read_all(reader)
+        reader.close()
+        thread.join()
+        
+        assert data == b''.join(chunks)
+    
+    @patch('boto3.client')
+    def test_upload_follow_ships_parts_as_file_grows(self, mock_boto_client, tmp_path, capsys):
+        """Test that --follow streams a growing file as multipart parts."""
+        path = tmp_path / 'recording.mp4'
+        path.write_bytes(b'')
+        received = {}
+        mock_s3 = MagicMock()
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        
+        def upload_part(Bucket, Key, UploadId, PartNumber, Body):
+            received[PartNumber] = Body.read()
+            return {'ETag': f'"etag-{PartNumber}"'}
+        
+        mock_s3.upload_part.side_effect = upload_part
+        mock_boto_client.return_value = mock_s3
+        chunks = [os.urandom(4 * 1024 * 1024) for _ in range(3)]
+        thread = self._write_slowly(path, chunks)
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--follow', '--part-size', '5M',
+                                  '--follow-idle', '1'])
+        thread.join()
+        
+        assert exit_code == 0
+        assert sorted(received) == [1, 2, 3]
+        assert b''.join(received[n] for n in (1, 2, 3)) == b''.join(chunks)
+        captured = capsys.readouterr()
+        assert 'Successfully uploaded 12,582,912 bytes in 3 parts' in captured.out
+    
+    def test_follow_rejects_resume(self, tmp_path, capsys):
+        """Test that --follow refuses options that need the finished file."""
+        path = tmp_path / 'recording.mp4'
+        path.write_bytes(b'data')
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--follow', '--resume'])
+        
+        assert exit_code == 1
+        assert '--follow cannot be combined' in capsys.readouterr().err
+
+class _FakeS3:
+    """Dict-backed stand-in for the S3 calls the chunk store and fan-out uploads make."""
+    
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+        self.gets = []
+        self.uploads = {}
+        self.aborted = []
+        self.page_size = 1000
+        self.deletes = []
+        self.protected = set()
+        self.copies = []
+        self.created = {}
+        self.etags = {}
+        self.pages = 0
+        self.modified = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.created[Key] = kwargs
+        upload_id = 'upload-%d' % len(self.uploads)
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+    
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        data = Body.read()
+        self.uploads[UploadId][PartNumber] = data
+        return {'ETag': '"%s"' % hashlib.md5(data).hexdigest()}
+    
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        self.objects[Key] = b''.join(parts[n] for n in numbers)
+        return {'ETag': '"multipart-%d"' % len(numbers)}
+    
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(Key)
+    
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self.objects[Key] = self.objects[CopySource['Key']]
+        self.copies.append(Key)
+        return {}
+    
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange,
+                         CopySourceIfMatch):
+        data = self.objects[CopySource['Key']]
+        if CopySourceIfMatch != '"%s"' % hashlib.md5(data).hexdigest():
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'UploadPartCopy')
+        start, end = (int(n) for n in CopySourceRange[len('bytes='):].split('-'))
+        self.uploads[UploadId][PartNumber] = data[start:end + 1]
+        return {'CopyPartResult': {'ETag': '"%s"' % hashlib.md5(data[start:end + 1]).hexdigest()}}
+    
+    def delete_objects(self, Bucket, Delete):
+        keys = [obj['Key'] for obj in Delete['Objects']]
+        self.deletes.append(len(keys))
+        errors = []
+        for key in keys:
+            if key in self.protected:
+                errors.append({'Key': key, 'Code': 'AccessDenied', 'Message': 'Access Denied'})
+            else:
+                self.objects.pop(key, None)
+        return {'Errors': errors} if errors else {}
+    
+    def get_paginator(self, operation):
+        fake = self
+        
+        class Paginator:
+            def paginate(self, Bucket, Prefix='', StartAfter=''):
+                keys = sorted(key for key in fake.objects if key.startswith(Prefix) and key > StartAfter)
+                for start in range(0, len(keys), fake.page_size):
+                    fake.pages += 1
+                    yield {'Contents': [{'Key': key, 'Size': len(fake.objects[key]),
+                                         'ETag': fake.etags.get(key, '"%s"' % hashlib.md5(fake.objects[key]).hexdigest()),
+                                         'LastModified': fake.modified, 'StorageClass': 'STANDARD'}
+                                        for key in keys[start:start + fake.page_size]]}
+        
+        return Paginator()
+    
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        self.objects[Key] = data
+        self.puts.append(Key)
+        return {'ETag': '"%s"' % hashlib.md5(data).hexdigest()}
+    
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        data = self.objects[Key]
+        return {'ContentLength': len(data), 'ETag': '"%s"' % hashlib.md5(data).hexdigest(),
+                'ContentType': 'video/mp4', 'Metadata': {'source': Key}}
+    
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None, IfNoneMatch=None):
+        self.gets.append(Key)
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        data = self.objects[Key]
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        if IfMatch and IfMatch != etag:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'GetObject')
+        if IfNoneMatch and IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'}}, 'GetObject')
+        if Range:
+            start, end = (int(n) for n in Range[len('bytes='):].split('-'))
+            data = data[start:end + 1]
+        return {'Body': StreamingBody(io.BytesIO(data), len(data)), 'ContentLength': len(data),
+                'ETag': etag}
+
+
+class TestChunkStore:
+    """Test cases for content-defined chunked uploads."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def test_chunk_boundaries_follow_content(self):
+        """Test that chunks tile the data within bounds and survive an insert."""
+        from vib3_cli import content_defined_chunks
+        sizes = dict(min_size=1024, avg_size=4096, max_size=16384)
+        data = os.urandom(256 * 1024)
+        spans = list(content_defined_chunks(data, **sizes))
+        
+        assert spans[0][0] == 0
+        assert all(a + n == b for (a, n), (b, _) in zip(spans, spans[1:]))
+        assert sum(n for _, n in spans) == len(data)
+        assert all(1024 <= n <= 16384 for _, n in spans[:-1])
+        
+        edited = data[:100000] + b'inserted' + data[100000:]
+        before = {data[a:a + n] for a, n in spans}
+        after = [edited[a:a + n] for a, n in content_defined_chunks(edited, **sizes)]
+        assert sum(1 for chunk in after if chunk not in before) <= 2
+    
+    @patch('boto3.client')
+    def test_reupload_sends_only_new_chunks(self, mock_boto_client, tmp_path, capsys):
+        """Test that an edited version reuses the chunks of the original."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        # Seeded: with arbitrary data the number of chunks an edit touches varies
+        original = random.Random(13).getrandbits(8 * 12 * 1024 * 1024).to_bytes(12 * 1024 * 1024, 'little')
+        path = tmp_path / 'cut.mp4'
+        path.write_bytes(original)
+        
+        assert self.cli.run(['upload', str(path), 'my-bucket', '--chunked']) == 0
+        first = [key for key in fake.puts if key.startswith('vib3-chunks/')]
+        assert 'cut.mp4.vib3chunks' in fake.objects
+        
+        edited = original[:3 * 1024 * 1024] + original[3 * 1024 * 1024 + 5000:]
+        path.write_bytes(edited)
+        fake.puts.clear()
+        capsys.readouterr()
+        
+        assert self.cli.run(['upload', str(path), 'my-bucket', '--chunked']) == 0
+        second = [key for key in fake.puts if key.startswith('vib3-chunks/')]
+        assert 0 < len(second) <= 2 < len(first)
+        assert f'of {len(edited):,} bytes' in capsys.readouterr().out
+        
+        output = tmp_path / 'restored.mp4'
+        assert self.cli.run(['get', 'my-bucket', 'cut.mp4', '--output', str(output)]) == 0
+        assert output.read_bytes() == edited
+    
+    @patch('boto3.client')
+    def test_get_rejects_corrupt_chunk(self, mock_boto_client, tmp_path, capsys):
+        """Test that chunks are verified against their hash."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        path = tmp_path / 'clip.mp4'
+        path.write_bytes(os.urandom(100000))
+        assert self.cli.run(['upload', str(path), 'my-bucket', '--chunked']) == 0
+        chunk = next(key for key in fake.objects if key.startswith('vib3-chunks/'))
+        fake.objects[chunk] = b'garbage'
+        
+        output = tmp_path / 'out.mp4'
+        output.write_bytes(b'previous')
+        
+        with patch('builtins.input', return_value='y'):
+            exit_code = self.cli.run(['get', 'my-bucket', 'clip.mp4', '--output', str(output)])
+        
+        assert exit_code == 1
+        assert 'is corrupt' in capsys.readouterr().err
+        assert output.read_bytes() == b'previous'
+        assert sorted(os.listdir(tmp_path)) == ['clip.mp4', 'out.mp4']
+    
+    @patch('boto3.client')
+    def test_get_keeps_existing_file_unless_confirmed(self, mock_boto_client, tmp_path, capsys):
+        """Test that get asks before overwriting, like download."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        output = tmp_path / 'out.mp4'
+        output.write_bytes(b'previous')
+        
+        with patch('builtins.input', return_value='n'):
+            assert self.cli.run(['get', 'my-bucket', 'clip.mp4', '--output', str(output)]) == 0
+        
+        assert 'Download cancelled.' in capsys.readouterr().out
+        assert output.read_bytes() == b'previous'
+        assert fake.gets == []
+    
+    @patch('boto3.client')
+    def test_get_without_manifest(self, mock_boto_client, tmp_path, capsys):
+        """Test the error for keys that were not uploaded with --chunked."""
+        mock_boto_client.return_value = _FakeS3()
+        
+        exit_code = self.cli.run(['get', 'my-bucket', 'clip.mp4', '--output', str(tmp_path / 'out.mp4')])
+        
+        assert exit_code == 1
+        assert 'No chunk manifest' in capsys.readouterr().err
+
+class TestPack:
+    """Test cases for packing small files into indexed tar shards."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _make_thumbnails(self, directory, count=30):
+        files = {}
+        for i in range(count):
+            name = f"thumbs/{i // 10}/frame-{i:04d}.jpg"
+            data = os.urandom(1000 + i * 37)
+            path = directory / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            files[name] = data
+        return files
+    
+    @patch('boto3.client')
+    def test_pack_writes_shards_and_index(self, mock_boto_client, tmp_path, capsys):
+        """Test that shards are valid tars and the index points at member bytes."""
+        import tarfile
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        source = tmp_path / 'src'
+        files = self._make_thumbnails(source)
+        
+        exit_code = self.cli.run(['pack', str(source), 's3://my-bucket/packs/run1',
+                                  '--shard-size', '16K'])
+        
+        assert exit_code == 0
+        index = json.loads(fake.objects['packs/run1/index.json'])
+        assert len(index['shards']) > 1
+        assert set(index['members']) == set(files)
+        for name, (shard, offset, size) in index['members'].items():
+            data = fake.objects[index['shards'][shard]['key']]
+            assert data[offset:offset + size] == files[name]
+        first = index['shards'][0]['key']
+        with tarfile.open(fileobj=io.BytesIO(fake.objects[first])) as tar:
+            assert all(name in files for name in tar.getnames())
+        assert f'Packed {len(files)} files' in capsys.readouterr().out
+    
+    @patch('boto3.client')
+    def test_download_member_with_one_ranged_get(self, mock_boto_client, tmp_path):
+        """Test that a cached index turns a member fetch into a single GET."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        source = tmp_path / 'src'
+        files = self._make_thumbnails(source)
+        assert self.cli.run(['pack', str(source), 's3://my-bucket/packs/run1',
+                             '--shard-size', '16K']) == 0
+        
+        first = tmp_path / 'first.jpg'
+        assert self.cli.run(['download', 'my-bucket', 'packs/run1', '--member',
+                             'thumbs/0/frame-0003.jpg', '--output', str(first)]) == 0
+        assert first.read_bytes() == files['thumbs/0/frame-0003.jpg']
+        
+        fake.gets.clear()
+        second = tmp_path / 'second.jpg'
+        assert self.cli.run(['download', 'my-bucket', 'packs/run1/index.json', '--member',
+                             'thumbs/2/frame-0027.jpg', '--output', str(second)]) == 0
+        assert second.read_bytes() == files['thumbs/2/frame-0027.jpg']
+        assert len(fake.gets) == 1
+    
+    @patch('boto3.client')
+    def test_stale_index_is_refreshed(self, mock_boto_client, tmp_path):
+        """Test that a repacked prefix invalidates the cached index through If-Match."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        source = tmp_path / 'src'
+        self._make_thumbnails(source)
+        assert self.cli.run(['pack', str(source), 's3://my-bucket/packs/run1']) == 0
+        assert self.cli.run(['download', 'my-bucket', 'packs/run1', '--member',
+                             'thumbs/0/frame-0001.jpg', '--output', str(tmp_path / 'a.jpg')]) == 0
+        
+        replacement = os.urandom(5000)
+        (source / 'thumbs/0/frame-0001.jpg').write_bytes(replacement)
+        assert self.cli.run(['pack', str(source), 's3://my-bucket/packs/run1']) == 0
+        
+        output = tmp_path / 'b.jpg'
+        assert self.cli.run(['download', 'my-bucket', 'packs/run1', '--member',
+                             'thumbs/0/frame-0001.jpg', '--output', str(output)]) == 0
+        assert output.read_bytes() == replacement
+    
+    @patch('boto3.client')
+    def test_member_added_by_repack_is_found(self, mock_boto_client, tmp_path):
+        """Test that a member missing from the cached index triggers one refresh."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        source = tmp_path / 'src'
+        self._make_thumbnails(source, count=2)
+        assert self.cli.run(['pack', str(source), 's3://my-bucket/packs/run1']) == 0
+        assert self.cli.run(['download', 'my-bucket', 'packs/run1', '--member',
+                             'thumbs/0/frame-0001.jpg', '--output', str(tmp_path / 'a.jpg')]) == 0
+        
+        added = os.urandom(3000)
+        (source / 'thumbs/0/new.jpg').write_bytes(added)
+        assert self.cli.run(['pack', str(source), 's3://my-bucket/packs/run1']) == 0
+        
+        output = tmp_path / 'b.jpg'
+        assert self.cli.run(['download', 'my-bucket', 'packs/run1', '--member',
+                             'thumbs/0/new.jpg', '--output', str(output)]) == 0
+        assert output.read_bytes() == added
+    
+    @patch('boto3.client')
+    def test_member_download_keeps_existing_file_unless_confirmed(self, mock_boto_client, tmp_path,
+                                                                  capsys):
+        """Test that --member asks before overwriting, like a normal download."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        source = tmp_path / 'src'
+        files = self._make_thumbnails(source, count=2)
+        assert self.cli.run(['pack', str(source), 's3://my-bucket/packs/run1']) == 0
+        output = tmp_path / 'frame.jpg'
+        output.write_bytes(b'mine')
+        args = ['download', 'my-bucket', 'packs/run1', '--member', 'thumbs/0/frame-0001.jpg',
+                '--output', str(output)]
+        
+        with patch('builtins.input', return_value='n'):
+            assert self.cli.run(args) == 0
+        assert output.read_bytes() == b'mine'
+        assert 'Download cancelled.' in capsys.readouterr().out
+        
+        with patch('builtins.input', return_value='y'):
+            assert self.cli.run(args) == 0
+        assert output.read_bytes() == files['thumbs/0/frame-0001.jpg']
+    
+    @patch('boto3.client')
+    def test_unknown_member(self, mock_boto_client, tmp_path, capsys):
+        """Test the error for a member that is not in the pack."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        source = tmp_path / 'src'
+        self._make_thumbnails(source, count=2)
+        assert self.cli.run(['pack', str(source), 's3://my-bucket/packs/run1']) == 0
+        
+        exit_code = self.cli.run(['download', 'my-bucket', 'packs/run1', '--member', 'missing.jpg',
+                                  '--output', str(tmp_path / 'x.jpg')])
+        
+        assert exit_code == 1
+        assert 'missing.jpg is not in s3://my-bucket/packs/run1/index.json' in capsys.readouterr().err
+
+class TestReplicate:
+    """Test cases for uploading one file to several targets in a single pass."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _clients(self, mock_boto_client):
+        """Hand out a separate fake per endpoint and record how each was built."""
+        fakes = {}
+        
+        def client(service, **kwargs):
+            fake = _FakeS3()
+            fake.kwargs = kwargs
+            fakes[kwargs.get('endpoint_url') or kwargs['region_name']] = fake
+            return fake
+        
+        mock_boto_client.side_effect = client
+        return fakes
+    
+    @patch('boto3.client')
+    def test_replicate_multipart_to_all_targets(self, mock_boto_client, tmp_path, monkeypatch):
+        """Test that every target receives every part of the same file."""
+        monkeypatch.setenv('DO_SPACES_KEY', 'do-key')
+        monkeypatch.setenv('DO_SPACES_SECRET', 'do-secret')
+        monkeypatch.delenv('DO_SPACES_ENDPOINT', raising=False)
+        fakes = self._clients(mock_boto_client)
+        data = os.urandom(12 * 1024 * 1024)
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(data)
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--part-size', '5M',
+                                  '--replicate', 'do:ams3=spaces-bucket,https://minio.local:9000'])
+        
+        assert exit_code == 0
+        assert set(fakes) == {'us-east-1', 'https://ams3.digitaloceanspaces.com',
+                              'https://minio.local:9000'}
+        for fake in fakes.values():
+            assert fake.objects['video.mp4'] == data
+            assert fake.kwargs['config'].max_pool_connections == 8
+        spaces = fakes['https://ams3.digitaloceanspaces.com'].kwargs
+        assert spaces['aws_access_key_id'] == 'do-key'
+        assert spaces['aws_secret_access_key'] == 'do-secret'
+    
+    @patch('boto3.client')
+    def test_interrupted_replication_aborts_every_target(self, mock_boto_client, tmp_path):
+        """Test that an interrupt mid-file leaves no multipart upload open on any target."""
+        from vib3_cli import _readinto_full
+        fakes = self._clients(mock_boto_client)
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(os.urandom(12 * 1024 * 1024))
+        reads = []
+        
+        def interrupted(stream, buffer):
+            reads.append(len(buffer))
+            if len(reads) == 2:
+                raise KeyboardInterrupt
+            return _readinto_full(stream, buffer)
+        
+        with patch('vib3_cli._readinto_full', interrupted):
+            exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--part-size', '5M',
+                                      '--replicate', 'aws:eu-west-1,https://minio.local:9000'])
+        
+        assert exit_code == 130
+        assert len(fakes) == 3
+        for fake in fakes.values():
+            assert fake.aborted == ['video.mp4']
+            assert fake.uploads == {}
+    
+    @patch('boto3.client')
+    def test_replicate_small_file_uses_single_put(self, mock_boto_client, tmp_path):
+        """Test that small files are sent with one PUT per target."""
+        fakes = self._clients(mock_boto_client)
+        path = tmp_path / 'thumb.jpg'
+        path.write_bytes(b'jpeg' * 100)
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--key', 'thumbs/1.jpg',
+                                  '--replicate', 'aws:eu-west-1'])
+        
+        assert exit_code == 0
+        assert set(fakes) == {'us-east-1', 'eu-west-1'}
+        for fake in fakes.values():
+            assert fake.puts == ['thumbs/1.jpg']
+            assert fake.objects['thumbs/1.jpg'] == b'jpeg' * 100
+    
+    @patch('boto3.client')
+    def test_failing_target_does_not_stop_others(self, mock_boto_client, tmp_path, capsys):
+        """Test that a failing target is aborted and reported while others complete."""
+        fakes = self._clients(mock_boto_client)
+        
+        def broken_part(**kwargs):
+            raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'UploadPart')
+        
+        original = mock_boto_client.side_effect
+        
+        def client(service, **kwargs):
+            fake = original(service, **kwargs)
+            if kwargs.get('endpoint_url'):
+                fake.upload_part = broken_part
+            return fake
+        
+        mock_boto_client.side_effect = client
+        data = os.urandom(11 * 1024 * 1024)
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(data)
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--part-size', '5M',
+                                  '--replicate', 'https://minio.local:9000'])
+        
+        assert exit_code == 1
+        assert fakes['us-east-1'].objects['video.mp4'] == data
+        assert fakes['https://minio.local:9000'].aborted == ['video.mp4']
+        assert 'https://minio.local:9000' in capsys.readouterr().err
+    
+    @patch('boto3.client')
+    def test_spaces_requires_credentials(self, mock_boto_client, tmp_path, monkeypatch, capsys):
+        """Test that DigitalOcean targets need the Spaces keys."""
+        monkeypatch.delenv('DO_SPACES_KEY', raising=False)
+        monkeypatch.delenv('DO_SPACES_SECRET', raising=False)
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(b'data')
+        
+        exit_code = self.cli.run(['upload', str(path), 'my-bucket', '--replicate', 'do'])
+        
+        assert exit_code == 1
+        assert 'DO_SPACES_KEY' in capsys.readouterr().err
+
+
+class TestDownloadCache:
+    """Test cases for the ETag-keyed local download cache."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    @patch('boto3.client')
+    def test_repeat_download_is_revalidated_and_served_locally(self, mock_boto_client,
+                                                                tmp_path, capsys):
+        """Test that an unchanged object is served from cache after a bodiless 304."""
+        fake = _FakeS3()
+        fake.objects['sources/take1.mov'] = os.urandom(300000)
+        mock_boto_client.return_value = fake
+        first, second = tmp_path / 'a.mov', tmp_path / 'b.mov'
+        
+        assert self.cli.run(['download', 'my-bucket', 'sources/take1.mov',
+                             '--output', str(first), '--cache']) == 0
+        assert self.cli.run(['download', 'my-bucket', 'sources/take1.mov',
+                             '--output', str(second), '--cache']) == 0
+        
+        assert first.read_bytes() == second.read_bytes() == fake.objects['sources/take1.mov']
+        assert 'from cache' in capsys.readouterr().out
+        assert len(fake.gets) == 2
+    
+    @patch('boto3.client')
+    def test_changed_object_replaces_cached_copy(self, mock_boto_client, tmp_path):
+        """Test that a new ETag is downloaded and the old version dropped."""
+        fake = _FakeS3()
+        fake.objects['clip.mp4'] = b'old' * 1000
+        mock_boto_client.return_value = fake
+        
+        assert self.cli.run(['download', 'my-bucket', 'clip.mp4',
+                             '--output', str(tmp_path / 'v1.mp4'), '--cache']) == 0
+        fake.objects['clip.mp4'] = b'new' * 1000
+        assert self.cli.run(['download', 'my-bucket', 'clip.mp4',
+                             '--output', str(tmp_path / 'v2.mp4'), '--cache']) == 0
+        
+        assert (tmp_path / 'v2.mp4').read_bytes() == b'new' * 1000
+        cached = list((tmp_path / 'home' / 'cache' / 'objects').rglob('*'))
+        assert len([path for path in cached if path.is_file()]) == 1
+    
+    @patch('boto3.client')
+    def test_object_larger_than_cache_is_downloaded_uncached(self, mock_boto_client, tmp_path, capsys):
+        """Test that an object that cannot fit the cache still reaches the output."""
+        fake = _FakeS3()
+        fake.objects['clip.mp4'] = os.urandom(2048)
+        mock_boto_client.return_value = fake
+        output = tmp_path / 'clip.mp4'
+        
+        assert self.cli.run(['download', 'my-bucket', 'clip.mp4', '--output', str(output),
+                             '--cache', '--cache-size', '1K']) == 0
+        
+        assert output.read_bytes() == fake.objects['clip.mp4']
+        assert 'not cached' in capsys.readouterr().out
+        cached = list((tmp_path / 'home' / 'cache' / 'objects').rglob('*'))
+        assert not [path for path in cached if path.is_file()]
+    
+    @patch('boto3.client')
+    def test_least_recently_used_objects_are_evicted(self, mock_boto_client, tmp_path, capsys):
+        """Test that the cache stays within its size by evicting the oldest entries."""
+        fake = _FakeS3()
+        for name in ('a', 'b', 'c'):
+            fake.objects[name] = os.urandom(40000)
+        mock_boto_client.return_value = fake
+        
+        for name in ('a', 'b', 'a', 'c'):
+            assert self.cli.run(['download', 'my-bucket', name, '--output',
+                                 str(tmp_path / f"{name}-{len(fake.gets)}"),
+                                 '--cache', '--cache-size', '100K']) == 0
+        capsys.readouterr()
+        
+        assert self.cli.run(['cache', 'stats', '--max-size', '100K']) == 0
+        out = capsys.readouterr().out
+        assert 'Objects: 2' in out
+        assert 'Hits: 1  Misses: 3' in out
+        fake.gets.clear()
+        assert self.cli.run(['download', 'my-bucket', 'b', '--output', str(tmp_path / 'b2'),
+                             '--cache', '--cache-size', '100K']) == 0
+        assert 'via cache' in capsys.readouterr().out
+    
+    @patch('boto3.client')
+    def test_prune_empties_cache(self, mock_boto_client, tmp_path, capsys):
+        """Test that prune --max-size 0 removes every cached object."""
+        fake = _FakeS3()
+        fake.objects['clip.mp4'] = b'x' * 5000
+        mock_boto_client.return_value = fake
+        assert self.cli.run(['download', 'my-bucket', 'clip.mp4',
+                             '--output', str(tmp_path / 'clip.mp4'), '--cache']) == 0
+        
+        assert self.cli.run(['cache', 'prune', '--max-size', '0']) == 0
+        
+        assert 'Pruned 1 objects (5,000 bytes)' in capsys.readouterr().out
+        assert (tmp_path / 'clip.mp4').read_bytes() == b'x' * 5000
+
+
+class TestLs:
+    """Test cases for streaming and parallel object listing."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _bucket(self):
+        fake = _FakeS3()
+        fake.page_size = 7
+        for i in range(200):
+            fake.objects[f"videos/{hashlib.sha1(str(i).encode()).hexdigest()}.mp4"] = b'v' * i
+        # Keys on a slice boundary and outside the hex alphabet
+        for key in ('videos/a', 'videos/f', 'videos/Zebra.mp4', 'videos/~tmp', 'videos/', 'other/x'):
+            fake.objects[key] = b'edge'
+        return fake
+    
+    @patch('boto3.client')
+    def test_ls_streams_ndjson(self, mock_boto_client, capsys):
+        """Test that every object under the prefix is written as one JSON line, in order."""
+        fake = self._bucket()
+        mock_boto_client.return_value = fake
+        
+        assert self.cli.run(['ls', 's3://my-bucket/videos/']) == 0
+        
+        captured = capsys.readouterr()
+        records = [json.loads(line) for line in captured.out.splitlines()]
+        keys = [record['key'] for record in records]
+        assert keys == sorted(key for key in fake.objects if key.startswith('videos/'))
+        assert records[0]['last_modified'] == '2024-01-01T00:00:00+00:00'
+        assert 'Listed 205 objects' in captured.err
+    
+    @patch('boto3.client')
+    def test_parallel_listing_covers_keyspace_once(self, mock_boto_client, capsys):
+        """Test that slices neither miss nor repeat keys, including boundary keys."""
+        fake = self._bucket()
+        mock_boto_client.return_value = fake
+        
+        assert self.cli.run(['ls', 's3://my-bucket/videos/', '--parallel', '8',
+                             '--shard-depth', '2']) == 0
+        
+        keys = [json.loads(line)['key'] for line in capsys.readouterr().out.splitlines()]
+        assert sorted(keys) == sorted(key for key in fake.objects if key.startswith('videos/'))
+    
+    def test_shard_ranges(self):
+        """Test that slices are contiguous and open-ended."""
+        from vib3_cli import shard_ranges
+        ranges = shard_ranges('v/', 'ba')
+        
+        assert ranges == [(None, 'v/a'), ('v/a', 'v/b'), ('v/b', None)]
+
+
+class TestRm:
+    """Test cases for batched bulk deletes."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    @patch('boto3.client')
+    def test_rm_prefix_in_1000_key_batches(self, mock_boto_client, capsys):
+        """Test that a prefix is deleted with full DeleteObjects batches."""
+        fake = _FakeS3()
+        for i in range(2500):
+            fake.objects[f"renditions/{i:05d}.mp4"] = b''
+        fake.objects['videos/keep.mp4'] = b'keep'
+        mock_boto_client.return_value = fake
+        
+        assert self.cli.run(['rm', 'my-bucket', '--prefix', 'renditions/', '--jobs', '4']) == 0
+        
+        assert sorted(fake.deletes) == [500, 1000, 1000]
+        assert list(fake.objects) == ['videos/keep.mp4']
+        assert 'Deleted 2,500 objects' in capsys.readouterr().out
+    
+    @patch('boto3.client')
+    def test_rm_reports_per_key_failures(self, mock_boto_client, capsys, monkeypatch):
+        """Test that keys S3 refused are reported while the rest are deleted."""
+        fake = _FakeS3()
+        for name in ('a', 'b', 'c', 'd'):
+            fake.objects[name] = b''
+        fake.protected = {'c'}
+        mock_boto_client.return_value = fake
+        monkeypatch.setattr('sys.stdin', StringIO('{"key": "c", "size": 0}\nd\n'))
+        
+        exit_code = self.cli.run(['rm', 'my-bucket', 'a', 'b', '--from-file', '-'])
+        
+        assert exit_code == 1
+        assert list(fake.objects) == ['c']
+        err = capsys.readouterr().err
+        assert 'Failed to delete s3://my-bucket/c: AccessDenied' in err
+        assert '1 of 4 deletes failed' in err
+    
+    @patch('boto3.client')
+    def test_rm_dry_run(self, mock_boto_client, capsys):
+        """Test that --dry-run only lists the keys."""
+        fake = _FakeS3()
+        fake.objects['old/1.mp4'] = b''
+        mock_boto_client.return_value = fake
+        
+        assert self.cli.run(['rm', 'my-bucket', '--prefix', 'old/', '--dry-run']) == 0
+        
+        assert 'old/1.mp4' in fake.objects
+        assert fake.deletes == []
+        assert 'Would delete 1 objects' in capsys.readouterr().out
+
+
+class TestCopy:
+    """Test cases for server-side cp and mv."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    @patch('boto3.client')
+    def test_cp_small_object_to_prefix(self, mock_boto_client):
+        """Test that a small object is copied with one CopyObject under its basename."""
+        fake = _FakeS3()
+        fake.objects['videos/a.mp4'] = b'video'
+        mock_boto_client.return_value = fake
+        
+        assert self.cli.run(['cp', 's3://vib3-dev-videos/videos/a.mp4',
+                             's3://vib3-prod-videos/published/']) == 0
+        
+        assert fake.copies == ['published/a.mp4']
+        assert fake.objects['published/a.mp4'] == b'video'
+        assert 'videos/a.mp4' in fake.objects
+    
+    @patch('boto3.client')
+    def test_cp_recursive_uses_part_copies_for_large_objects(self, mock_boto_client):
+        """Test that large objects are copied as ranges and keep their headers."""
+        fake = _FakeS3()
+        large = os.urandom(12 * 1024 * 1024)
+        fake.objects['dev/videos/large.mp4'] = large
+        fake.objects['dev/videos/thumbs/1.jpg'] = b'jpeg'
+        mock_boto_client.return_value = fake
+        
+        assert self.cli.run(['cp', 's3://vib3-dev-videos/dev/videos', 's3://vib3-prod-videos/prod',
+                             '--recursive', '--part-size', '5M']) == 0
+        
+        assert fake.objects['prod/large.mp4'] == large
+        assert fake.objects['prod/thumbs/1.jpg'] == b'jpeg'
+        assert fake.copies == ['prod/thumbs/1.jpg']
+        assert fake.created['prod/large.mp4'] == {'ContentType': 'video/mp4',
+                                                  'Metadata': {'source': 'dev/videos/large.mp4'}}
+    
+    @patch('boto3.client')
+    def test_mv_deletes_sources_after_copy(self, mock_boto_client, capsys):
+        """Test that mv removes only the sources that were copied."""
+        fake = _FakeS3()
+        fake.objects['staging/1.mp4'] = b'one'
+        fake.objects['staging/2.mp4'] = b'two'
+        fake.objects['other/3.mp4'] = b'three'
+        mock_boto_client.return_value = fake
+        
+        assert self.cli.run(['mv', 's3://my-bucket/staging/', 's3://my-bucket/live/',
+                             '--recursive']) == 0
+        
+        assert sorted(fake.objects) == ['live/1.mp4', 'live/2.mp4', 'other/3.mp4']
+        assert 'Transferred 2 files' in capsys.readouterr().out
+    
+    def test_cp_rejects_same_object(self, capsys):
+        """Test that copying an object onto itself is refused."""
+        assert self.cli.run(['cp', 's3://b/k.mp4', 's3://b/k.mp4']) == 1
+        assert 'same object' in capsys.readouterr().err
+
+
+class TestCatalog:
+    """Test cases for the local object catalog."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _query(self, capsys, *args):
+        capsys.readouterr()
+        assert self.cli.run(['catalog', 'query', *args]) == 0
+        return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    
+    @patch('boto3.client')
+    def test_build_and_query(self, mock_boto_client, capsys):
+        """Test that a build indexes every key and queries filter and sort locally."""
+        fake = _FakeS3()
+        fake.page_size = 3
+        for creator, sizes in (('alice', (10, 500)), ('bob', (20, 30, 40))):
+            for i, size in enumerate(sizes):
+                fake.objects[f"videos/{creator}/{i}.mp4"] = b'v' * size
+        fake.objects['thumbs/alice/0.jpg'] = b't'
+        mock_boto_client.return_value = fake
+        
+        assert self.cli.run(['catalog', 'build', 'my-bucket', '--shard-depth', '2']) == 0
+        
+        assert len(self._query(capsys, 'my-bucket')) == 6
+        largest = self._query(capsys, 's3://my-bucket/videos/', '--sort', 'size', '--limit', '2')
+        assert [row['key'] for row in largest] == ['videos/alice/1.mp4', 'videos/bob/2.mp4']
+        totals = self._query(capsys, 's3://my-bucket/videos/', '--group-by', '1')
+        assert totals == [{'prefix': 'videos/alice', 'objects': 2, 'size': 510},
+                          {'prefix': 'videos/bob', 'objects': 3, 'size': 90}]
+        missing = self._query(capsys, 'my-bucket', '--sql',
+                              "SELECT key FROM objects v WHERE key LIKE 'videos/%' AND NOT EXISTS "
+                              "(SELECT 1 FROM objects t WHERE t.key = 'thumbs/' || "
+                              "replace(substr(v.key, 8), '.mp4', '.jpg'))")
+        assert [row['key'] for row in missing] == ['videos/alice/1.mp4', 'videos/bob/0.mp4',
+                                                   'videos/bob/1.mp4', 'videos/bob/2.mp4']
+    
+    @patch('boto3.client')
+    def test_update_continues_from_markers_and_build_drops_deleted(self, mock_boto_client, capsys):
+        """Test that update lists only past each slice marker and a rebuild drops deleted keys."""
+        fake = _FakeS3()
+        for i in range(20):
+            fake.objects[f"uploads/{i:03d}"] = b'x'
+        mock_boto_client.return_value = fake
+        assert self.cli.run(['catalog', 'build', 's3://my-bucket/uploads/']) == 0
+        
+        fake.objects['uploads/020'] = b'new'
+        fake.pages = 0
+        assert self.cli.run(['catalog', 'update', 's3://my-bucket/uploads/']) == 0
+        assert 'Indexed 1 objects' in capsys.readouterr().out
+        assert len(self._query(capsys, 's3://my-bucket/uploads/')) == 21
+        
+        del fake.objects['uploads/005']
+        assert self.cli.run(['catalog', 'build', 's3://my-bucket/uploads/']) == 0
+        assert '(1 removed)' in capsys.readouterr().out
+        keys = [row['key'] for row in self._query(capsys, 'my-bucket')]
+        assert 'uploads/005' not in keys and len(keys) == 20
+    
+    def test_update_needs_build(self, capsys):
+        """Test that update without a catalog points at build."""
+        assert self.cli.run(['catalog', 'update', 'my-bucket']) == 1
+        assert 'run vib3 catalog build first' in capsys.readouterr().err
+    
+    def test_sql_is_read_only(self, capsys):
+        """Test that --sql cannot modify the catalog."""
+        assert self.cli.run(['catalog', 'query', 'my-bucket', '--sql', 'DELETE FROM objects']) == 1
+        assert 'readonly' in capsys.readouterr().err
+
+
+def _multipart_etag(data, part_size):
+    digests = b''.join(hashlib.md5(data[i:i + part_size]).digest() for i in range(0, len(data), part_size))
+    return '"%s-%d"' % (hashlib.md5(digests).hexdigest(), -(-len(data) // part_size))
+
+
+class TestAudit:
+    """Test cases for local ETag computation and storage audits."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def test_s3_etag(self, tmp_path):
+        """Test plain and multipart ETags against a reference computation."""
+        from vib3_cli import s3_etag
+        data = os.urandom(11 * 1024 * 1024 + 5)
+        path = tmp_path / 'clip.mp4'
+        path.write_bytes(data)
+        
+        assert s3_etag(str(path)) == hashlib.md5(data).hexdigest()
+        assert s3_etag(str(path), 5 * 1024 * 1024) == _multipart_etag(data, 5 * 1024 * 1024).strip('"')
+    
+    @patch('boto3.client')
+    def test_audit_reports_differences_and_caches_hashes(self, mock_boto_client, tmp_path, capsys):
+        """Test matches, mismatches, missing and extra objects, then a cached re-run."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        nas = tmp_path / 'nas'
+        (nas / 'videos').mkdir(parents=True)
+        large = os.urandom(12 * 1024 * 1024)
+        (nas / 'videos' / 'large.mp4').write_bytes(large)
+        (nas / 'videos' / 'small.mp4').write_bytes(b'small')
+        (nas / 'videos' / 'corrupt.mp4').write_bytes(b'AAAA')
+        (nas / 'videos' / 'new.mp4').write_bytes(b'new')
+        fake.objects['archive/videos/large.mp4'] = large
+        # Uploaded by another tool with 6 MiB parts
+        fake.etags['archive/videos/large.mp4'] = _multipart_etag(large, 6 * 1024 * 1024)
+        fake.objects['archive/videos/small.mp4'] = b'small'
+        fake.objects['archive/videos/corrupt.mp4'] = b'BBBB'
+        fake.objects['archive/videos/gone.mp4'] = b'gone'
+        
+        assert self.cli.run(['audit', str(nas), 's3://vib3-archive/archive', '--jobs', '2']) == 1
+        
+        out = capsys.readouterr().out
+        assert 'mismatch: videos/corrupt.mp4' in out
+        assert 'missing: videos/new.mp4' in out
+        assert 'only in S3: videos/gone.mp4' in out
+        assert '2 match, 1 mismatched, 1 missing, 1 only in S3' in out
+        
+        (nas / 'videos' / 'corrupt.mp4').unlink()
+        (nas / 'videos' / 'new.mp4').unlink()
+        assert self.cli.run(['audit', str(nas), 's3://vib3-archive/archive']) == 0
+        assert 'hashed 0 bytes' in capsys.readouterr().out
+
+
+class TestHashCache:
+    """Test cases for the shared persistent hash cache."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def test_digests_cached_until_file_changes(self, tmp_path):
+        """Test that cached digests skip reads and a write invalidates them."""
+        from vib3_cli import HashCache
+        path = tmp_path / 'clip.mp4'
+        path.write_bytes(b'first version')
+        cache = HashCache()
+        
+        digests = cache.digests(str(path), ['sha256', 'md5', 'checksum:crc32'])
+        assert digests['sha256'] == hashlib.sha256(b'first version').hexdigest()
+        assert digests['md5'] == hashlib.md5(b'first version').hexdigest()
+        assert digests['checksum:crc32'] == base64.b64encode(
+            struct.pack('>I', zlib.crc32(b'first version'))).decode()
+        
+        with patch('vib3_cli.compute_digests') as compute:
+            assert cache.digests(str(path), ['sha256', 'md5']) == {
+                'sha256': digests['sha256'], 'md5': digests['md5']}
+            compute.assert_not_called()
+        
+        path.write_bytes(b'second version')
+        assert cache.digest(str(path)) == hashlib.sha256(b'second version').hexdigest()
+        cache.close()
+    
+    @patch('boto3.client')
+    def test_dedup_rerun_reads_no_content(self, mock_boto_client, tmp_path):
+        """Test that re-running a dedup batch on unchanged files hashes nothing."""
+        files = []
+        for i in range(3):
+            path = tmp_path / f"clip{i}.mp4"
+            path.write_bytes(os.urandom(1000))
+            files.append(str(path))
+        mock_s3 = MagicMock()
+        mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        mock_boto_client.return_value = mock_s3
+        
+        assert self.cli.run(['upload', *files, 'my-bucket', '--dedup']) == 0
+        with patch('vib3_cli.compute_digests') as compute:
+            assert self.cli.run(['upload', *files, 'my-bucket', '--dedup']) == 0
+            compute.assert_not_called()
+
+
+class TestPresign:
+    """Test cases for local presigned URL generation."""
+    
+    @pytest.fixture(autouse=True)
+    def _credentials(self, monkeypatch):
+        monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'AKIDEXAMPLE')
+        monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'secret')
+        monkeypatch.delenv('AWS_SESSION_TOKEN', raising=False)
+        monkeypatch.delenv('AWS_PROFILE', raising=False)
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    @pytest.mark.parametrize('region,bucket,key,endpoint,token', [
+        ('us-east-1', 'my-bucket', 'videos/a b+c~\u00e9.mp4', None, 'tok/en+'),
+        ('eu-west-1', 'my.bucket', 'thumbs/1.jpg', None, None),
+        ('nyc3', 'vib3-videos', 'v/1.mp4', 'https://nyc3.digitaloceanspaces.com', None),
+    ])
+    def test_matches_botocore(self, region, bucket, key, endpoint, token):
+        """Test that local signing gives exactly botocore's URL at a fixed time."""
+        import datetime
+        import boto3
+        from botocore.config import Config
+        from vib3_cli import Presigner
+        fixed = datetime.datetime(2026, 10, 17, 12, 0, 0)
+        s3 = {'addressing_style': 'path'} if endpoint else None
+        client = boto3.client('s3', region_name=region, endpoint_url=endpoint,
+                              aws_access_key_id='AKIDEXAMPLE', aws_secret_access_key='secret',
+                              aws_session_token=token, config=Config(signature_version='s3v4', s3=s3))
+        with patch('botocore.auth.get_current_datetime', return_value=fixed):
+            expected = client.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key},
+                                                     ExpiresIn=3600)
+        
+        presigner = Presigner('AKIDEXAMPLE', 'secret', region, token=token, endpoint_url=endpoint)
+        urls = presigner.sign(bucket, [key], 3600, fixed.replace(tzinfo=datetime.timezone.utc))
+        
+        assert urls == [expected]
+    
+    def test_cache_reissues_only_near_expiry(self, capsys, monkeypatch):
+        """Test that cached URLs are reused until they are within the margin of expiry."""
+        monkeypatch.setattr('sys.stdin', StringIO('videos/2.mp4\n{"key": "videos/3.mp4"}\n'))
+        args = ['presign', 'my-bucket', 'videos/1.mp4', '--from-file', '-',
+                '--expires', '3600', '--margin', '600']
+        
+        with patch('vib3_cli.time.time', return_value=1800000000):
+            assert self.cli.run(args) == 0
+        first = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert [record['key'] for record in first] == ['videos/1.mp4', 'videos/2.mp4', 'videos/3.mp4']
+        assert first[0]['expires'] == '2027-01-15T09:00:00Z'
+        
+        monkeypatch.setattr('sys.stdin', StringIO('videos/2.mp4\nvideos/3.mp4\n'))
+        with patch('vib3_cli.time.time', return_value=1800000000 + 2000):
+            assert self.cli.run(args) == 0
+        captured = capsys.readouterr()
+        assert [json.loads(line) for line in captured.out.splitlines()] == first
+        assert '3 reused from cache' in captured.err
+        
+        monkeypatch.setattr('sys.stdin', StringIO(''))
+        with patch('vib3_cli.time.time', return_value=1800000000 + 3100):
+            assert self.cli.run(args) == 0
+        reissued = json.loads(capsys.readouterr().out)
+        assert reissued['url'] != first[0]['url']
+        assert reissued['expires'] == '2027-01-15T09:51:40Z'
+    
+    def test_duplicates_are_not_counted_as_reused(self, capsys):
+        """Test that repeated keys are signed once and only cache hits count as reused."""
+        args = ['presign', 'my-bucket', 'videos/1.mp4', 'videos/1.mp4', 'videos/2.mp4', '--no-cache']
+        
+        assert self.cli.run(args) == 0
+        captured = capsys.readouterr()
+        
+        records = [json.loads(line) for line in captured.out.splitlines()]
+        assert [record['key'] for record in records] == ['videos/1.mp4', 'videos/1.mp4', 'videos/2.mp4']
+        assert records[0] == records[1]
+        assert '(0 reused from cache)' in captured.err
+    
+    def test_expiry_capped_at_temporary_credentials(self, capsys, monkeypatch):
+        """Test that URLs signed with expiring credentials report and cache that expiry."""
+        import datetime
+        from botocore.credentials import RefreshableCredentials
+        from vib3_cli import PresignCache
+        credentials = RefreshableCredentials.create_from_metadata(
+            {'access_key': 'ASIAEXAMPLE', 'secret_key': 'secret', 'token': 'session',
+             'expiry_time': '2027-01-15T08:30:00Z'},
+            refresh_using=lambda: None, method='sts-assume-role')
+        
+        with patch('vib3_cli.boto3.Session') as mock_session, \
+                patch('vib3_cli.time.time', return_value=1800000000), \
+                patch('botocore.credentials._local_now',
+                      return_value=datetime.datetime(2027, 1, 15, 8, 0, tzinfo=datetime.timezone.utc)):
+            mock_session.return_value.get_credentials.return_value = credentials
+            assert self.cli.run(['presign', 'my-bucket', 'videos/1.mp4', '--expires', '3600']) == 0
+        captured = capsys.readouterr()
+        
+        assert json.loads(captured.out)['expires'] == '2027-01-15T08:30:00Z'
+        assert 'Temporary credentials expire at 2027-01-15T08:30:00Z' in captured.err
+        cache = PresignCache()
+        found = cache.lookup('my-bucket', 'ASIAEXAMPLE|us-east-1|', ['videos/1.mp4'], 1800000000)
+        cache.close()
+        assert found['videos/1.mp4'][1] == 1800000000 + 1800
+
+
+class TestUploadQueue:
+    """Test cases for the durable upload queue."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    def _files(self, tmp_path, *names):
+        paths = []
+        for name in names:
+            path = tmp_path / name
+            path.write_bytes(name.encode())
+            paths.append(str(path))
+        return paths
+    
+    @patch('boto3.client')
+    def test_run_uploads_creator_lane_first(self, mock_boto_client, tmp_path, capsys):
+        """Test that creator uploads are claimed ahead of earlier backfills."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        backfill = self._files(tmp_path, 'old1.mp4', 'old2.mp4')
+        creator = self._files(tmp_path, 'new.mp4')
+        
+        assert self.cli.run(['queue', 'add', *backfill, 'my-bucket', '--lane', 'backfill']) == 0
+        assert self.cli.run(['queue', 'add', *creator, 'my-bucket', '--key', 'live/new.mp4']) == 0
+        assert self.cli.run(['queue', 'run', '--workers', '1', '--drain']) == 0
+        
+        assert fake.puts == ['live/new.mp4', 'old1.mp4', 'old2.mp4']
+        assert fake.objects['old2.mp4'] == b'old2.mp4'
+        capsys.readouterr()
+        assert self.cli.run(['queue', 'status']) == 0
+        out = capsys.readouterr().out
+        assert 'creator            0         0         1         0' in out
+        assert 'backfill           0         0         2         0' in out
+    
+    def test_add_skips_files_already_queued(self, tmp_path, capsys):
+        """Test that re-adding a waiting file does not queue a second upload."""
+        files = self._files(tmp_path, 'a.mp4', 'b.mp4')
+        
+        assert self.cli.run(['queue', 'add', files[0], 'my-bucket']) == 0
+        assert self.cli.run(['queue', 'add', *files, 'my-bucket']) == 0
+        
+        assert 'Queued 1 files for s3://my-bucket/ in the creator lane (1 already queued)' in \
+            capsys.readouterr().out
+    
+    def test_failed_jobs_back_off_then_fail(self, tmp_path):
+        """Test that retries are delayed exponentially and stop at the attempt limit."""
+        from vib3_cli import UploadQueue
+        upload_queue = UploadQueue()
+        upload_queue.add([(str(tmp_path / 'a.mp4'), 'my-bucket', 'a.mp4', 'creator')], now=0)
+        
+        job = upload_queue.claim(60, now=0)
+        assert upload_queue.fail(job, 'SlowDown', max_attempts=3, now=0) == 2.0
+        assert upload_queue.claim(60, now=1) is None
+        job = upload_queue.claim(60, now=2)
+        assert upload_queue.fail(job, 'SlowDown', max_attempts=3, now=2) == 4.0
+        job = upload_queue.claim(60, now=6)
+        assert job['attempts'] == 3
+        assert upload_queue.fail(job, 'SlowDown', max_attempts=3, now=6) is None
+        
+        assert upload_queue.next_visible() is None
+        assert upload_queue.stats() == {'creator': {'failed': 1}}
+        upload_queue.close()
+    
+    def test_expired_lease_is_reclaimed(self, tmp_path):
+        """Test that a lapsed lease makes a job visible and voids the old holder."""
+        from vib3_cli import UploadQueue
+        upload_queue = UploadQueue()
+        upload_queue.add([(str(tmp_path / 'a.mp4'), 'my-bucket', 'a.mp4', 'creator')], now=0)
+        
+        stale = upload_queue.claim(10, now=0)
+        assert upload_queue.claim(10, now=5) is None
+        assert upload_queue.extend(stale, 10, now=5)
+        assert upload_queue.claim(10, now=12) is None
+        job = upload_queue.claim(10, now=16)
+        
+        assert job['id'] == stale['id'] and job['attempts'] == 2
+        assert upload_queue.fail(stale, 'SlowDown', now=16) is False
+        assert not upload_queue.complete(stale)
+        assert upload_queue.complete(job)
+        assert upload_queue.stats() == {'creator': {'done': 1}}
+        upload_queue.close()
+    
+    @patch('boto3.client')
+    def test_restart_does_not_reupload_finished_object(self, mock_boto_client, tmp_path, capsys):
+        """Test that a job whose runner died after uploading is recognised by its tag."""
+        from vib3_cli import UploadQueue
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        files = self._files(tmp_path, 'a.mp4')
+        assert self.cli.run(['queue', 'add', *files, 'my-bucket']) == 0
+        upload_queue = UploadQueue()
+        job = upload_queue.claim(0)
+        upload_queue.close()
+        fake.head_object = lambda Bucket, Key: {'ContentLength': 5, 'Metadata': {'vib3-job': job['token']}}
+        
+        assert self.cli.run(['queue', 'run', '--drain']) == 0
+        
+        assert fake.puts == []
+        assert 'skip (already uploaded)' in capsys.readouterr().out
+    
+    @patch('boto3.client')
+    def test_missing_file_fails_without_retries(self, mock_boto_client, tmp_path, capsys):
+        """Test that a file deleted after queueing fails for good at once."""
+        mock_boto_client.return_value = _FakeS3()
+        files = self._files(tmp_path, 'gone.mp4')
+        assert self.cli.run(['queue', 'add', *files, 'my-bucket']) == 0
+        os.remove(files[0])
+        
+        assert self.cli.run(['queue', 'run', '--drain']) == 1
+        
+        err = capsys.readouterr().err
+        assert 'Failed to upload' in err and 'after 1 attempts' in err
+        assert '1 uploads failed for good' in err
+
+class TestWatch:
+    """Test cases for watch-folder ingestion."""
+    
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cli = VIB3CLI()
+    
+    @patch('boto3.client')
+    def test_watch_uploads_existing_and_landing_files(self, mock_boto_client, tmp_path):
+        """Test that present, newly written and renamed-into-place files are uploaded."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        drop = tmp_path / 'drop'
+        drop.mkdir()
+        (drop / 'a.mp4').write_bytes(b'existing')
+        
+        watcher = threading.Thread(target=self.cli.watch_command,
+                                   args=(str(drop), 's3://my-bucket/in', 'us-east-1'),
+                                   kwargs={'settle': 0.1, 'idle_exit': 1.0})
+        watcher.start()
+        time.sleep(0.3)
+        (drop / 'sub').mkdir()
+        (drop / 'sub' / 'new.mp4').write_bytes(b'new')
+        (drop / '.b.mp4.partial').write_bytes(b'renamed')
+        os.rename(drop / '.b.mp4.partial', drop / 'b.mp4')
+        watcher.join(10)
+        
+        assert not watcher.is_alive()
+        assert fake.objects == {'in/a.mp4': b'existing', 'in/sub/new.mp4': b'new', 'in/b.mp4': b'renamed'}
+    
+    @patch('boto3.client')
+    def test_restart_only_uploads_changed_files(self, mock_boto_client, tmp_path):
+        """Test that the watch state keeps a restart from re-uploading the tree."""
+        fake = _FakeS3()
+        mock_boto_client.return_value = fake
+        drop = tmp_path / 'drop'
+        drop.mkdir()
+        (drop / 'a.mp4').write_bytes(b'one')
+        (drop / 'b.mp4').write_bytes(b'two')
+        args = ['watch', str(drop), 's3://my-bucket/', '--settle', '0', '--idle-exit', '0.3']
+        
+        assert self.cli.run(args) == 0
+        assert sorted(fake.puts) == ['a.mp4', 'b.mp4']
+        (drop / 'b.mp4').write_bytes(b'two, edited')
+        assert self.cli.run(args + ['--poll']) == 0
+        
+        assert sorted(fake.puts) == ['a.mp4', 'b.mp4', 'b.mp4']
+        assert fake.objects['b.mp4'] == b'two, edited'
+    
+    def test_open_file_waits_for_close(self, tmp_path):
+        """Test that inotify mode holds a file back until its writer closes it."""
+        from vib3_cli import FolderWatcher
+        watcher = FolderWatcher(str(tmp_path), settle=0.1)
+        watcher.scan()
+        
+        with open(tmp_path / 'clip.mp4', 'wb') as f:
+            f.write(b'frames')
+            f.flush()
+            watcher.poll(0.2)
+            assert watcher.poll(0.2) == []
+        assert watcher.poll(0.2) == []
+        time.sleep(0.15)
+        ready = watcher.poll(0.2)
+        watcher.close()
+        
+        assert [rel for rel, _, _ in ready] == ['clip.mp4']
+    
+    def test_polling_waits_for_size_to_settle(self, tmp_path):
+        """Test that polling mode reports a file only after it stops changing."""
+        from vib3_cli import FolderWatcher
+        path = tmp_path / 'clip.mp4'
+        path.write_bytes(b'part')
+        watcher = FolderWatcher(str(tmp_path), settle=0.2, poll=True)
+        watcher.scan()
+        
+        assert watcher.poll(0) == []
+        with open(path, 'ab') as f:
+            f.write(b' two')
+        time.sleep(0.25)
+        assert watcher.poll(0) == []
+        time.sleep(0.25)
+        
+        assert watcher.poll(0) == [('clip.mp4', str(path), (8, path.stat().st_mtime_ns))]
+    
+    def test_watch_rejects_local_destination(self, tmp_path, capsys):
+        """Test that the destination must be an s3:// URL."""
+        assert self.cli.run(['watch', str(tmp_path), 'my-bucket']) == 1
+        assert 's3:// URL' in capsys.readouterr().err
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
\ No newline at end of file
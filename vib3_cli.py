@@ -7,309 +7,6125 @@ A simple CLI tool for Project VIB3
 import sys
 import argparse
 import os
-from typing import Optional, List
+import io
+import mmap
+import hashlib
+import threading
+import queue
+import sqlite3
+import shutil
+import tarfile
+import itertools
+import hmac
+import re
+import datetime
+import tempfile
+import base64
+import zlib
+import struct
+import select
+import ctypes
+import ctypes.util
+from collections import deque
+from urllib.parse import quote, urlparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Optional, List, Callable, Iterable
 import boto3
-from botocore.exceptions import NoCredentialsError, ClientError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import NoCredentialsError, ClientError, BotoCoreError
 import subprocess
 import json
 import time
 
 
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# S3 multipart limits
+MIN_PART_SIZE = 5 * MB
+MAX_PART_SIZE = 5 * GB
+MAX_PARTS = 10000
+
+# Files at or above this size go through the multipart engine
+MULTIPART_THRESHOLD = 64 * MB
+DEFAULT_PART_SIZE = 8 * MB
+# Streams have no known length, so parts must allow for large objects
+DEFAULT_STREAM_PART_SIZE = 16 * MB
+DEFAULT_CONCURRENCY = 8
+DEFAULT_BATCH_JOBS = 8
+# DeleteObjects accepts at most this many keys per request
+DELETE_BATCH_SIZE = 1000
+
+# Per-directory record of what `vib3 sync` last transferred
+SYNC_MANIFEST = '.vib3sync.json'
+
+# Local state (indexes, caches) lives here unless VIB3_HOME is set
+VIB3_HOME = os.environ.get('VIB3_HOME', os.path.join(os.path.expanduser('~'), '.vib3'))
+
+# Headers CreateMultipartUpload must be given for a copy to keep them
+COPY_HEADERS = ('ContentType', 'CacheControl', 'ContentDisposition', 'ContentEncoding',
+                'ContentLanguage', 'Expires', 'Metadata', 'StorageClass')
+
+# S3 additional checksums: algorithm name and the request/response field
+CHECKSUM_ALGORITHMS = {'crc32': 'CRC32', 'crc32c': 'CRC32C', 'sha256': 'SHA256'}
+CHECKSUM_FIELDS = {'crc32': 'ChecksumCRC32', 'crc32c': 'ChecksumCRC32C', 'sha256': 'ChecksumSHA256'}
+CHECKSUM_SUFFIX = '.vib3sum'
+
+# MP4 boxes on the path from moov to the chunk offset tables
+MP4_CONTAINERS = (b'moov', b'trak', b'mdia', b'minf', b'stbl')
+FASTSTART_SUFFIX = '.vib3faststart'
+
+# upload --follow: how often a growing file is polled, and when it counts as finished
+FOLLOW_POLL_INTERVAL = 0.5
+DEFAULT_FOLLOW_IDLE = 10.0
+
+# Content-defined chunk store: chunk size bounds and where chunks and manifests live
+CDC_MIN_SIZE = 256 * 1024
+CDC_AVG_SIZE = 1 * MB
+CDC_MAX_SIZE = 4 * MB
+CHUNK_PREFIX = 'vib3-chunks/'
+CHUNK_MANIFEST_SUFFIX = '.vib3chunks'
+
+# vib3 pack: small files go into tar shards of about this size plus an index
+DEFAULT_SHARD_SIZE = 256 * MB
+PACK_INDEX = 'index.json'
+
+# download --cache: ETag-keyed local object cache, evicted least recently used first
+DEFAULT_CACHE_SIZE = 20 * 1024 * MB
+FICLONE = 0x40049409
+
+# ls --parallel: keyspace boundaries (hex video IDs by default)
+DEFAULT_SHARD_ALPHABET = '0123456789abcdef'
+
+# presign: SigV4 query-string URLs live at most 7 days
+MAX_PRESIGN_EXPIRES = 7 * 24 * 3600
+DEFAULT_PRESIGN_EXPIRES = 3600
+DEFAULT_PRESIGN_MARGIN = 600
+PRESIGN_BATCH = 10000
+
+# queue: lanes are claimed lowest priority first; failed jobs back off exponentially
+QUEUE_LANES = {'creator': 0, 'backfill': 10}
+DEFAULT_QUEUE_LANE = 'creator'
+DEFAULT_VISIBILITY_TIMEOUT = 300
+DEFAULT_MAX_ATTEMPTS = 5
+QUEUE_RETRY_BASE = 2.0
+QUEUE_RETRY_MAX = 600.0
+QUEUE_POLL_INTERVAL = 1.0
+
+# watch: a landed file must stay quiet this long; without inotify the tree is rescanned
+DEFAULT_WATCH_SETTLE = 2.0
+WATCH_POLL_INTERVAL = 2.0
+WATCH_TICK = 0.25
+
+# upload --replicate: DigitalOcean Spaces endpoint (region is the subdomain)
+DO_SPACES_ENDPOINT = 'https://{region}.digitaloceanspaces.com'
+DEFAULT_DO_SPACES_REGION = 'nyc3'
+
+# --concurrency auto: AIMD-tuned number of requests in flight
+AUTO_CONCURRENCY = 'auto'
+THROTTLE_ERRORS = ('SlowDown', 'ServiceUnavailable', 'RequestTimeout', 'Throttling',
+                   'ThrottlingException', 'RequestLimitExceeded', '503')
+
+SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': MB, 'G': GB, 'T': 1024 * GB}
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte size such as '512K', '64M' or '1.5G' (binary units)."""
+    text = value.strip().upper()
+    if text.endswith('IB'):
+        text = text[:-2]
+    elif text.endswith('B') and len(text) > 1 and text[-2] in SIZE_UNITS:
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ''
+    number = text[:-1] if unit else text
+    try:
+        size = int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size: {value}")
+    if size < 0:
+        raise argparse.ArgumentTypeError(f"Invalid size: {value}")
+    return size
+
+
+def parse_concurrency(value: str):
+    """Parse --concurrency: a number of requests in flight, or 'auto'."""
+    if value.strip().lower() == AUTO_CONCURRENCY:
+        return AUTO_CONCURRENCY
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid concurrency: {value} (use a number or 'auto')")
+
+
+def format_rate(num_bytes: int, seconds: float) -> str:
+    """Format a transfer rate in MiB/s."""
+    return f"{num_bytes / max(seconds, 1e-6) / MB:.1f} MiB/s"
+
+
+def format_utc(timestamp: float) -> str:
+    """Format epoch seconds as an ISO 8601 UTC timestamp."""
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse_s3_url(url: str) -> tuple:
+    """Split an s3://bucket/prefix URL into (bucket, prefix)."""
+    if not url.startswith('s3://'):
+        raise ValueError(f"Not an S3 URL: {url}")
+    bucket, _, prefix = url[len('s3://'):].partition('/')
+    if not bucket:
+        raise ValueError(f"Missing bucket in S3 URL: {url}")
+    return bucket, prefix
+
+
+def local_path(directory: str, rel: str) -> str:
+    """Map a key relative to a prefix onto a path under `directory`, refusing any that escape it."""
+    path = os.path.normpath(os.path.join(directory, *rel.split('/')))
+    root = os.path.abspath(directory)
+    resolved = os.path.abspath(path)
+    if resolved == root or os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Refusing to write {rel!r} outside {directory}")
+    return path
+
+
+def s3_error(e: ClientError, bucket: str, key: Optional[str] = None) -> RuntimeError:
+    """Translate a botocore ClientError into a user-facing RuntimeError."""
+    error_code = e.response.get('Error', {}).get('Code', 'Unknown')
+    if error_code == 'NoSuchBucket':
+        return RuntimeError(f"Bucket '{bucket}' does not exist")
+    elif error_code == 'NoSuchKey' and key is not None:
+        return RuntimeError(f"Key '{key}' does not exist in bucket '{bucket}'")
+    elif error_code == 'AccessDenied':
+        return RuntimeError(f"Access denied to bucket '{bucket}'")
+    return RuntimeError(f"S3 error: {str(e)}")
+
+
+def list_objects(s3_client, bucket: str, prefix: str = '', start_after: Optional[str] = None):
+    """Yield every object under a prefix, following list_objects_v2 pagination."""
+    params = {'Bucket': bucket, 'Prefix': prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(**params):
+        yield from page.get('Contents', [])
+
+
+def list_pages(s3_client, bucket: str, prefix: str = '', start_after: Optional[str] = None,
+               until: Optional[str] = None):
+    """
+    Yield the objects of each list_objects_v2 page, stopping after key `until`.
+    
+    With `start_after` and `until` a listing covers one half-open slice
+    (start_after, until] of the keyspace, so slices can be listed in parallel.
+    """
+    params = {'Bucket': bucket, 'Prefix': prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(**params):
+        objects = page.get('Contents', [])
+        if until is not None and objects and objects[-1]['Key'] > until:
+            yield [obj for obj in objects if obj['Key'] <= until]
+            return
+        yield objects
+
+
+def shard_ranges(prefix: str, alphabet: str, depth: int = 1) -> List[tuple]:
+    """
+    Split the keyspace under a prefix into (start_after, until) slices.
+    
+    Boundaries are the prefix followed by every `depth`-character string
+    over the alphabet (e.g. 0-f for hex video IDs). The first and last
+    slices are open-ended, so keys outside the alphabet are still listed.
+    """
+    boundaries = sorted(prefix + ''.join(chars)
+                        for chars in itertools.product(sorted(set(alphabet)), repeat=depth))
+    return list(zip([None] + boundaries, boundaries + [None]))
+
+
+def prefix_end(prefix: str) -> Optional[str]:
+    """Return the smallest string above every key starting with `prefix` (None for '')."""
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def state_path(name: str) -> str:
+    """Return the path of a file in the VIB3 state directory, creating the directory."""
+    os.makedirs(VIB3_HOME, exist_ok=True)
+    return os.path.join(VIB3_HOME, name)
+
+
+def s3_etag(path: str, part_size: Optional[int] = None) -> str:
+    """
+    Compute the ETag S3 gives an object uploaded from a file.
+    
+    Without a part size this is the MD5 of the content. With one it is the
+    multipart form: the MD5 of the concatenated binary part MD5s followed
+    by "-<number of parts>". The file is memory-mapped and every part is
+    hashed straight from the mapping.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        empty = hashlib.md5()
+        return empty.hexdigest() if not part_size else f"{hashlib.md5(empty.digest()).hexdigest()}-1"
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, 'madvise'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapped)
+        try:
+            if not part_size:
+                return hashlib.md5(view).hexdigest()
+            digests = b''.join(hashlib.md5(view[offset:offset + part_size]).digest()
+                               for offset in range(0, size, part_size))
+            return f"{hashlib.md5(digests).hexdigest()}-{-(-size // part_size)}"
+        finally:
+            view.release()
+
+
+def etag_kind(part_size: Optional[int]) -> str:
+    """Return the HashCache kind of an ETag; a single-part ETag is the MD5."""
+    return f"etag:{part_size}" if part_size else 'md5'
+
+
+def compute_digests(path: str, kinds: List[str]) -> dict:
+    """
+    Compute several digests of a file (see HashCache for the kinds).
+    
+    Plain and checksum digests share one pass over the mapped file;
+    multipart ETags are computed per part size.
+    """
+    results = {}
+    hashers = {}
+    for kind in kinds:
+        name, _, argument = kind.partition(':')
+        if name == 'etag':
+            results[kind] = s3_etag(path, int(argument))
+        elif name == 'checksum':
+            hashers[kind] = new_checksum(argument)
+        else:
+            hashers[kind] = hashlib.new(name)
+    if hashers:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        view = memoryview(mapped) if mapped else memoryview(b'')
+        try:
+            hash_view(view, list(hashers.values()))
+        finally:
+            view.release()
+            if mapped:
+                mapped.close()
+        for kind, hasher in hashers.items():
+            results[kind] = encode_checksum(hasher) if kind.startswith('checksum:') else hasher.hexdigest()
+    return results
+
+
+def etag_part_sizes(size: int, etag: str, part_size: Optional[int] = None) -> List[Optional[int]]:
+    """
+    Return the part sizes that could have produced an ETag, most likely first.
+    
+    A plain ETag needs no part size ([None]). A multipart ETag only records
+    its part count, so the candidates are the given part size, the one vib3
+    picks for the file, the smallest whole MiB giving that many parts and
+    the AWS CLI's 8 MiB default, keeping those that give the right count.
+    """
+    etag = etag.strip('"')
+    if '-' not in etag:
+        return [None]
+    parts = int(etag.rsplit('-', 1)[1])
+    if part_size:
+        candidates = [part_size]
+    else:
+        candidates = [choose_part_size(size), -(-size // parts // MB) * MB or MB, 8 * MB]
+    sizes = []
+    for candidate in candidates:
+        if max(1, -(-size // candidate)) == parts and candidate not in sizes:
+            sizes.append(candidate)
+    return sizes
+
+
+def _audit_file(path: str, etag: str, part_sizes: List[Optional[int]]) -> List[tuple]:
+    """Process pool worker: hash a file per candidate part size until one matches the ETag."""
+    results = []
+    for part_size in part_sizes:
+        local = s3_etag(path, part_size)
+        results.append((part_size, local))
+        if local == etag:
+            break
+    return results
+
+
+def is_not_found(e: ClientError) -> bool:
+    """Check whether a ClientError means the object does not exist."""
+    return e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+
+class _CRC:
+    """hashlib-style wrapper around a CRC function such as zlib.crc32."""
+    
+    def __init__(self, function: Callable):
+        self._function = function
+        self._value = 0
+    
+    def update(self, data) -> None:
+        self._value = self._function(data, self._value)
+    
+    def digest(self) -> bytes:
+        return (self._value & 0xffffffff).to_bytes(4, 'big')
+
+
+def new_checksum(algorithm: str):
+    """Return a hasher for an S3 checksum algorithm (crc32, crc32c or sha256)."""
+    if algorithm == 'sha256':
+        return hashlib.sha256()
+    if algorithm == 'crc32':
+        return _CRC(zlib.crc32)
+    if algorithm == 'crc32c':
+        try:
+            import crc32c
+        except ImportError:
+            raise RuntimeError("CRC32C checksums require the crc32c package: pip install crc32c")
+        return _CRC(crc32c.crc32c)
+    raise ValueError(f"Unsupported checksum algorithm: {algorithm}")
+
+
+def hash_view(view: memoryview, hashers: list) -> None:
+    """
+    Feed a buffer to several hashers in one pass.
+    
+    The buffer is walked in 1 MiB slices and every hasher sees a slice before
+    moving on, so each slice is read from memory once while it is still in
+    cache rather than once per hasher.
+    """
+    for offset in range(0, len(view), MB):
+        chunk = view[offset:offset + MB]
+        for hasher in hashers:
+            hasher.update(chunk)
+
+
+def encode_checksum(hasher) -> str:
+    """Encode a digest the way S3 reports checksums."""
+    return base64.b64encode(hasher.digest()).decode('ascii')
+
+
+def composite_checksum(algorithm: str, part_checksums: List[str]) -> str:
+    """
+    Compute the checksum S3 reports for a multipart object.
+    
+    This is the checksum of the concatenated binary part checksums, suffixed
+    with the part count.
+    """
+    hasher = new_checksum(algorithm)
+    for checksum in part_checksums:
+        hasher.update(base64.b64decode(checksum))
+    return f"{encode_checksum(hasher)}-{len(part_checksums)}"
+
+
+def stored_checksum(response: dict) -> tuple:
+    """Return (algorithm, checksum) from a HeadObject/GetObject response, or (None, None)."""
+    for algorithm, field in CHECKSUM_FIELDS.items():
+        if response.get(field):
+            return algorithm, response[field]
+    return None, None
+
+
+def write_checksum_manifest(file: str, record: dict) -> str:
+    """Atomically write the checksum sidecar next to a file and return its path."""
+    path = file + CHECKSUM_SUFFIX
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def choose_part_size(file_size: int, part_size: Optional[int] = None) -> int:
+    """
+    Pick a multipart part size for a file.
+    
+    An explicit part size is validated against the S3 limits. Otherwise the
+    part size starts at DEFAULT_PART_SIZE and doubles until the file fits in
+    roughly 1,000 parts, which keeps per-request overhead low on large files
+    while leaving enough parts to keep every connection busy.
+    """
+    if part_size is not None:
+        if part_size < MIN_PART_SIZE or part_size > MAX_PART_SIZE:
+            raise ValueError(f"Part size must be between {MIN_PART_SIZE:,} and {MAX_PART_SIZE:,} bytes")
+        if file_size > part_size * MAX_PARTS:
+            raise ValueError(f"Part size {part_size:,} is too small for {file_size:,} bytes "
+                             f"(S3 allows at most {MAX_PARTS:,} parts)")
+        return part_size
+    
+    part_size = DEFAULT_PART_SIZE
+    while part_size * 1000 < file_size and part_size < MAX_PART_SIZE:
+        part_size *= 2
+    return min(part_size, MAX_PART_SIZE)
+
+
+def format_size(num_bytes: float) -> str:
+    """Format a byte count with binary units, e.g. '1.5 GiB'."""
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TiB"
+
+
+class ProgressReporter:
+    """
+    Thread-safe progress and throughput reporter shared by transfer commands.
+    
+    Any number of transfer threads may call update(); bytes are aggregated
+    under a lock and the display is redrawn at most every TTY_INTERVAL
+    seconds, so progress output never dominates small transfers. Throughput
+    is a moving average over the last RATE_WINDOW seconds. When the output
+    stream is not a terminal, one NDJSON line is written every
+    NDJSON_INTERVAL seconds instead of a redrawn status line.
+    """
+    
+    TTY_INTERVAL = 0.1
+    NDJSON_INTERVAL = 1.0
+    RATE_WINDOW = 5.0
+    
+    def __init__(self, total: Optional[int] = None, stream=None):
+        """Initialize the reporter; `stream` defaults to stdout."""
+        self.total = total
+        self.done = 0
+        self.concurrency = None
+        self.stream = stream or sys.stdout
+        self.tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self.interval = self.TTY_INTERVAL if self.tty else self.NDJSON_INTERVAL
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_render = self._started
+        self._samples = deque([(self._started, 0)])
+    
+    def add_total(self, amount: int) -> None:
+        """Grow the expected total, for transfers whose sizes arrive late."""
+        with self._lock:
+            self.total = (self.total or 0) + amount
+    
+    def set_concurrency(self, value: int) -> None:
+        """Record the number of requests currently in flight, for display."""
+        self.concurrency = value
+    
+    def update(self, amount: int) -> None:
+        """Record transferred bytes; safe to call from any thread."""
+        with self._lock:
+            self.done += amount
+            now = time.monotonic()
+            if now - self._last_render >= self.interval:
+                self._last_render = now
+                self._render(now)
+    
+    def log(self, message: str) -> None:
+        """Print a message without garbling the status line."""
+        with self._lock:
+            if self.tty:
+                self.stream.write('\r\x1b[K')
+            print(message, file=self.stream, flush=True)
+            if self.tty:
+                self._render(time.monotonic())
+    
+    def finish(self) -> None:
+        """Render the final state."""
+        with self._lock:
+            self._render(time.monotonic(), final=True)
+    
+    def rate(self, now: float) -> float:
+        """Moving-average throughput in bytes per second."""
+        self._samples.append((now, self.done))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.RATE_WINDOW:
+            self._samples.popleft()
+        then, done_then = self._samples[0]
+        return (self.done - done_then) / max(now - then, 1e-6)
+    
+    def _render(self, now: float, final: bool = False) -> None:
+        rate = self.rate(now)
+        eta = None
+        if self.total and rate > 0:
+            eta = max(self.total - self.done, 0) / rate
+        
+        if not self.tty:
+            record = {'event': 'done' if final else 'progress', 'bytes': self.done,
+                      'total': self.total, 'rate': round(rate),
+                      'eta': None if eta is None else round(eta, 1),
+                      'elapsed': round(now - self._started, 1)}
+            if self.concurrency is not None:
+                record['concurrency'] = self.concurrency
+            print(json.dumps(record), file=self.stream, flush=True)
+            return
+        
+        line = f"Progress: {format_size(self.done)}"
+        if self.total:
+            line = f"Progress: {self.done / self.total * 100:.1f}% " \
+                   f"({format_size(self.done)}/{format_size(self.total)})"
+        line += f" {format_size(rate)}/s"
+        if eta is not None and not final:
+            line += f" ETA {int(eta) // 60}:{int(eta) % 60:02d}"
+        if self.concurrency is not None:
+            line += f" [{self.concurrency} in flight]"
+        self.stream.write('\r' + line + '\x1b[K')
+        self.stream.flush()
+
+
+class BandwidthLimiter:
+    """Token bucket shared by all threads of a transfer."""
+    
+    def __init__(self, rate: int):
+        """Limit throughput to `rate` bytes per second."""
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+    
+    def consume(self, amount: int) -> None:
+        """Block until `amount` bytes may be sent."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_free)
+            self._next_free = start + amount / self.rate
+            delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def is_throttle(e: Exception) -> bool:
+    """Check whether an error means S3 is asking us to slow down."""
+    if not isinstance(e, ClientError):
+        return False
+    error = e.response.get('Error', {})
+    status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return error.get('Code') in THROTTLE_ERRORS or status == 503
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller for the number of requests a transfer keeps in flight.
+    
+    Engines run with `maximum` worker threads and hold a slot from the
+    controller for every request, so only `limit` requests are in flight.
+    Once per round (`limit` completed requests) the round's throughput is
+    compared with the previous round's: the limit grows by one while
+    throughput keeps improving. Throttling (SlowDown/503) halves the limit,
+    and latency per byte rising well above the best seen cuts it by a
+    quarter, so extra requests that only queue behind each other are shed.
+    """
+    
+    INITIAL = 4
+    MAXIMUM = 64
+    IMPROVEMENT = 1.05
+    LATENCY_FACTOR = 2.0
+    COOLDOWN = 1.0
+    RETRIES = 5
+    BACKOFF = 0.5
+    
+    def __init__(self, initial: int = INITIAL, maximum: int = MAXIMUM,
+                 on_change: Optional[Callable[[int], None]] = None):
+        """Start at `initial` requests in flight; `on_change` is told every new limit."""
+        self.limit = min(initial, maximum)
+        self.maximum = maximum
+        self.on_change = on_change
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._best_latency = None
+        self._last_rate = 0.0
+        self._last_decrease = 0.0
+        self._start_round(time.monotonic())
+        if on_change:
+            on_change(self.limit)
+    
+    def _start_round(self, now: float) -> None:
+        self._round_started = now
+        self._round_bytes = 0
+        self._round_requests = 0
+        self._round_latency = 0.0
+    
+    def acquire(self) -> None:
+        """Block until a request may be started."""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+    
+    def release(self, amount: int, seconds: float) -> None:
+        """Finish a request that moved `amount` bytes in `seconds`."""
+        with self._cond:
+            self.in_flight -= 1
+            self._round_bytes += amount
+            self._round_requests += 1
+            self._round_latency += seconds / max(amount, 1)
+            if self._round_requests >= self.limit:
+                self._end_round(time.monotonic())
+            self._cond.notify()
+    
+    def cancel(self) -> None:
+        """Give back a slot without counting the request, e.g. before a retry."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+    
+    def throttle(self) -> None:
+        """Multiplicative decrease after S3 signalled throttling."""
+        with self._cond:
+            self._decrease(self.limit // 2, time.monotonic())
+    
+    def _end_round(self, now: float) -> None:
+        elapsed = now - self._round_started
+        rate = self._round_bytes / elapsed if elapsed > 0 else 0.0
+        latency = self._round_latency / self._round_requests
+        if self._best_latency is None or latency < self._best_latency:
+            self._best_latency = latency
+        
+        if latency > self._best_latency * self.LATENCY_FACTOR:
+            self._decrease(self.limit * 3 // 4, now)
+        elif rate > self._last_rate * self.IMPROVEMENT and self.limit < self.maximum:
+            self._set_limit(self.limit + 1)
+        self._last_rate = rate
+        self._start_round(now)
+    
+    def _decrease(self, limit: int, now: float) -> None:
+        # One decrease per cooldown: a burst of throttled requests is one signal
+        if now - self._last_decrease < self.COOLDOWN:
+            return
+        self._last_decrease = now
+        # Requests already in flight were measured at the old limit
+        self._last_rate = 0.0
+        self._set_limit(max(1, limit))
+        self._start_round(now)
+    
+    def _set_limit(self, limit: int) -> None:
+        if limit == self.limit:
+            return
+        self.limit = limit
+        self._cond.notify_all()
+        if self.on_change:
+            self.on_change(limit)
+    
+    def run(self, request: Callable[[], object], amount: int):
+        """
+        Run one request under a slot and return its result.
+        
+        Throttled requests back off and are retried with a smaller limit,
+        up to RETRIES times.
+        """
+        for attempt in range(self.RETRIES + 1):
+            self.acquire()
+            started = time.monotonic()
+            try:
+                result = request()
+            except ClientError as e:
+                self.cancel()
+                if not is_throttle(e) or attempt == self.RETRIES:
+                    raise
+                self.throttle()
+                time.sleep(self.BACKOFF * 2 ** attempt)
+                continue
+            except BaseException:
+                self.cancel()
+                raise
+            self.release(amount, time.monotonic() - started)
+            return result
+    
+    def watch(self, s3_client) -> Callable[[], None]:
+        """
+        Treat throttled responses that botocore is about to retry as signals.
+        
+        botocore retries SlowDown/503 internally, so without this hook the
+        controller would only see throttling once retries are exhausted.
+        Returns a function that removes the hook.
+        """
+        def on_retry_check(response=None, **kwargs):
+            if response is None:
+                return None
+            http_response, parsed = response
+            if (getattr(http_response, 'status_code', None) == 503 or
+                    parsed.get('Error', {}).get('Code') in THROTTLE_ERRORS):
+                self.throttle()
+            return None
+        
+        unique_id = f'vib3-adaptive-{id(self)}'
+        s3_client.meta.events.register('needs-retry.s3', on_retry_check, unique_id=unique_id)
+        return lambda: s3_client.meta.events.unregister('needs-retry.s3', unique_id=unique_id)
+
+
+class _PartReader(io.RawIOBase):
+    """
+    Seekable read-only file object over a memoryview slice of an mmap.
+    
+    An optional `limiter` paces reads, for bodies sent in a single request.
+    """
+    
+    def __init__(self, view: memoryview, limiter: Optional['BandwidthLimiter'] = None):
+        self._view = view
+        self._pos = 0
+        self._limiter = limiter
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        if self._limiter:
+            self._limiter.consume(n)
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = len(self._view) + offset
+        return self._pos
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def __len__(self) -> int:
+        return len(self._view)
+
+
+class DedupIndex:
+    """
+    Local content hash -> S3 object index for `vib3 upload --dedup`.
+    
+    Entries are hints only: every candidate is re-checked against the SHA-256
+    stored in the object's metadata before it is trusted, and stale entries
+    are dropped as they are found.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """Open (or create) the index database."""
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or state_path('dedup.db'), check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS objects ('
+            'digest TEXT NOT NULL, bucket TEXT NOT NULL, key TEXT NOT NULL, '
+            'PRIMARY KEY (digest, bucket, key))'
+        )
+        self._db.commit()
+    
+    def lookup(self, digest: str) -> List[tuple]:
+        """Return the (bucket, key) pairs last seen with this content."""
+        with self._lock:
+            rows = self._db.execute('SELECT bucket, key FROM objects WHERE digest = ?', (digest,))
+            return rows.fetchall()
+    
+    def add(self, digest: str, bucket: str, key: str) -> None:
+        """Record that an object holds this content."""
+        with self._lock:
+            self._db.execute('INSERT OR IGNORE INTO objects VALUES (?, ?, ?)', (digest, bucket, key))
+            self._db.commit()
+    
+    def discard(self, digest: str, bucket: str, key: str) -> None:
+        """Forget a stale entry."""
+        with self._lock:
+            self._db.execute('DELETE FROM objects WHERE digest = ? AND bucket = ? AND key = ?',
+                             (digest, bucket, key))
+            self._db.commit()
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+
+class ObjectCache:
+    """
+    Local cache of downloaded S3 objects for `vib3 download --cache`.
+    
+    Each object is stored once per (bucket, key, ETag) under a name derived
+    from that triple and handed out by reflink, hardlink or copy. Cached
+    files are read-only so a hardlinked output cannot be edited in place
+    and corrupt the cache. The index records sizes and last use, and the
+    least recently used objects are evicted once the cache exceeds its size.
+    """
+    
+    def __init__(self, directory: Optional[str] = None, max_size: int = DEFAULT_CACHE_SIZE):
+        """Open (or create) the cache and its index."""
+        self.directory = directory or state_path('cache')
+        self.max_size = max_size
+        os.makedirs(os.path.join(self.directory, 'tmp'), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(self.directory, 'cache.db'), timeout=30)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS objects ('
+            'bucket TEXT NOT NULL, key TEXT NOT NULL, etag TEXT NOT NULL, path TEXT NOT NULL, '
+            'size INTEGER NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (bucket, key))'
+        )
+        self._db.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._db.commit()
+    
+    def lookup(self, bucket: str, key: str) -> Optional[dict]:
+        """Return the cached entry for an object, if any."""
+        row = self._db.execute('SELECT etag, path, size FROM objects WHERE bucket = ? AND key = ?',
+                               (bucket, key)).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'path': os.path.join(self.directory, row[1]), 'size': row[2]}
+    
+    def temp_path(self) -> str:
+        """Return a unique path to download into before `add`."""
+        return os.path.join(self.directory, 'tmp', f"{os.getpid()}-{threading.get_ident()}-{time.time_ns()}")
+    
+    def add(self, bucket: str, key: str, etag: str, temp: str, size: int) -> dict:
+        """Move a downloaded file into the cache, replacing older versions, and evict."""
+        name = hashlib.sha256(f"{bucket}\0{key}\0{etag}".encode()).hexdigest()
+        relative = os.path.join('objects', name[:2], name)
+        path = os.path.join(self.directory, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(temp, 0o444)
+        os.replace(temp, path)
+        previous = self.lookup(bucket, key)
+        if previous and previous['path'] != path:
+            self._remove_file(previous['path'])
+        self._db.execute('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)',
+                         (bucket, key, etag, relative, size, time.time()))
+        self._count('misses')
+        self._db.commit()
+        self.evict(self.max_size)
+        return {'etag': etag, 'path': path, 'size': size}
+    
+    def serve(self, bucket: str, key: str, entry: dict, output: str,
+              hit: bool = True) -> Optional[str]:
+        """
+        Place a cached object at `output` and return how ('reflink', 'hardlink' or 'copy').
+        
+        Returns None when the file was evicted by another process meanwhile.
+        `hit` is False for an object that was just downloaded into the cache.
+        """
+        temp = output + '.vib3cache'
+        if os.path.lexists(temp):
+            os.remove(temp)
+        try:
+            method = self._link(entry['path'], temp)
+        except FileNotFoundError:
+            self.discard(bucket, key)
+            return None
+        os.replace(temp, output)
+        self._db.execute('UPDATE objects SET last_used = ? WHERE bucket = ? AND key = ?',
+                         (time.time(), bucket, key))
+        if hit:
+            self._count('hits')
+        self._db.commit()
+        return method
+    
+    @staticmethod
+    def _link(source: str, dest: str) -> str:
+        """Share the cached bytes with `dest`: copy-on-write clone, hardlink, or copy."""
+        try:
+            import fcntl
+            with open(source, 'rb') as src, open(dest, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return 'reflink'
+        except (ImportError, OSError):
+            if not os.path.exists(source):
+                raise FileNotFoundError(source)
+            if os.path.exists(dest):
+                os.remove(dest)
+        try:
+            os.link(source, dest)
+            return 'hardlink'
+        except OSError:
+            shutil.copyfile(source, dest)
+            return 'copy'
+    
+    def discard(self, bucket: str, key: str) -> None:
+        """Drop an object from the cache."""
+        entry = self.lookup(bucket, key)
+        if entry:
+            self._remove_file(entry['path'])
+            self._db.execute('DELETE FROM objects WHERE bucket = ? AND key = ?', (bucket, key))
+            self._db.commit()
+    
+    def evict(self, max_size: int) -> tuple:
+        """Remove least recently used objects until the cache fits; return (objects, bytes) removed."""
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+        removed = freed = 0
+        if total <= max_size:
+            return removed, freed
+        rows = self._db.execute('SELECT bucket, key, path, size FROM objects ORDER BY last_used').fetchall()
+        for bucket, key, relative, size in rows:
+            if total - freed <= max_size:
+                break
+            self._remove_file(os.path.join(self.directory, relative))
+            self._db.execute('DELETE FROM objects WHERE bucket = ? AND key = ?', (bucket, key))
+            removed += 1
+            freed += size
+        self._db.commit()
+        return removed, freed
+    
+    def stats(self) -> dict:
+        """Return object count, total size and hit/miss counters."""
+        objects, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects').fetchone()
+        counters = dict(self._db.execute('SELECT name, value FROM counters'))
+        return {'objects': objects, 'size': size, 'max_size': self.max_size,
+                'hits': counters.get('hits', 0), 'misses': counters.get('misses', 0)}
+    
+    def _count(self, name: str) -> None:
+        self._db.execute('INSERT OR IGNORE INTO counters VALUES (?, 0)', (name,))
+        self._db.execute('UPDATE counters SET value = value + 1 WHERE name = ?', (name,))
+    
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def close(self) -> None:
+        """Close the index."""
+        self._db.close()
+
+
+class Catalog:
+    """
+    Local SQLite index of the objects in a bucket, for `vib3 catalog`.
+    
+    The keyspace under a prefix is split into slices by `shard_ranges`;
+    each slice keeps the last key it listed as a StartAfter marker. A build
+    lists every slice from its start under a new generation and, once a
+    slice is done, drops its rows from older generations (deleted objects).
+    An update continues every slice from its marker, which resumes an
+    interrupted build and picks up keys added after each slice's last key.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """Open (or create) the catalog database."""
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or state_path('catalog.db'), check_same_thread=False)
+        self._db.executescript(
+            'CREATE TABLE IF NOT EXISTS objects ('
+            'bucket TEXT NOT NULL, key TEXT NOT NULL, size INTEGER NOT NULL, etag TEXT, '
+            'last_modified TEXT, storage_class TEXT, generation INTEGER NOT NULL, '
+            'PRIMARY KEY (bucket, key));'
+            'CREATE INDEX IF NOT EXISTS objects_size ON objects (bucket, size);'
+            'CREATE TABLE IF NOT EXISTS shards ('
+            'bucket TEXT NOT NULL, prefix TEXT NOT NULL, lower TEXT, upper TEXT, marker TEXT, '
+            'generation INTEGER NOT NULL, complete INTEGER NOT NULL);'
+        )
+        self._db.commit()
+    
+    def start_build(self, bucket: str, prefix: str, ranges: List[tuple]) -> List[dict]:
+        """Replace the slices of a prefix with fresh ones under a new generation."""
+        with self._lock:
+            generation = self._db.execute('SELECT COALESCE(MAX(generation), 0) + 1 FROM shards '
+                                          'WHERE bucket = ?', (bucket,)).fetchone()[0]
+            self._db.execute('DELETE FROM shards WHERE bucket = ? AND prefix = ?', (bucket, prefix))
+            self._db.executemany('INSERT INTO shards VALUES (?, ?, ?, ?, ?, ?, 0)',
+                                 [(bucket, prefix, lower, upper, lower, generation)
+                                  for lower, upper in ranges])
+            self._db.commit()
+        return self.shards(bucket, prefix)
+    
+    def shards(self, bucket: str, prefix: str) -> List[dict]:
+        """Return the slices recorded for a prefix."""
+        with self._lock:
+            rows = self._db.execute('SELECT rowid, lower, upper, marker, generation, complete '
+                                    'FROM shards WHERE bucket = ? AND prefix = ? ORDER BY rowid',
+                                    (bucket, prefix)).fetchall()
+        return [{'id': row[0], 'bucket': bucket, 'prefix': prefix, 'lower': row[1], 'upper': row[2],
+                 'marker': row[3], 'generation': row[4], 'complete': bool(row[5])} for row in rows]
+    
+    def record_page(self, shard: dict, objects: List[dict]) -> None:
+        """Upsert one listing page and advance the slice marker past it."""
+        if not objects:
+            return
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(shard['bucket'], obj['Key'], obj['Size'], obj.get('ETag'),
+                  obj['LastModified'].isoformat(), obj.get('StorageClass'), shard['generation'])
+                 for obj in objects]
+            )
+            self._db.execute('UPDATE shards SET marker = ? WHERE rowid = ?', (objects[-1]['Key'], shard['id']))
+            self._db.commit()
+    
+    def finish_shard(self, shard: dict) -> int:
+        """Mark a slice complete; a slice finishing a build drops stale rows. Returns rows dropped."""
+        with self._lock:
+            removed = 0
+            if not shard['complete']:
+                conditions = ['bucket = ?', 'generation < ?', 'key >= ?']
+                params = [shard['bucket'], shard['generation'], shard['prefix']]
+                if shard['lower'] is not None:
+                    conditions.append('key > ?')
+                    params.append(shard['lower'])
+                if shard['upper'] is not None:
+                    conditions.append('key <= ?')
+                    params.append(shard['upper'])
+                end = prefix_end(shard['prefix'])
+                if end is not None:
+                    conditions.append('key < ?')
+                    params.append(end)
+                removed = self._db.execute(f"DELETE FROM objects WHERE {' AND '.join(conditions)}",
+                                           params).rowcount
+            self._db.execute('UPDATE shards SET complete = 1 WHERE rowid = ?', (shard['id'],))
+            self._db.commit()
+        return removed
+    
+    def query(self, bucket: str, prefix: str = '', min_size: Optional[int] = None,
+              max_size: Optional[int] = None, order: str = 'key', limit: Optional[int] = None):
+        """Yield catalog rows under a prefix as dicts, filtered by size."""
+        conditions = ['bucket = ?']
+        params = [bucket]
+        if prefix:
+            conditions.append('key >= ?')
+            params.append(prefix)
+            end = prefix_end(prefix)
+            if end is not None:
+                conditions.append('key < ?')
+                params.append(end)
+        if min_size is not None:
+            conditions.append('size >= ?')
+            params.append(min_size)
+        if max_size is not None:
+            conditions.append('size <= ?')
+            params.append(max_size)
+        order_by = {'key': 'key', 'size': 'size DESC', 'last_modified': 'last_modified DESC'}[order]
+        sql = (f"SELECT key, size, etag, last_modified, storage_class FROM objects "
+               f"WHERE {' AND '.join(conditions)} ORDER BY {order_by}")
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        for row in self._db.execute(sql, params):
+            yield dict(zip(('key', 'size', 'etag', 'last_modified', 'storage_class'), row))
+    
+    def execute(self, sql: str):
+        """Run a read-only SQL query and yield rows as dicts keyed by column name."""
+        self._db.execute('PRAGMA query_only = ON')
+        try:
+            cursor = self._db.execute(sql)
+            columns = [column[0] for column in cursor.description or ()]
+            for row in cursor:
+                yield dict(zip(columns, row))
+        finally:
+            self._db.execute('PRAGMA query_only = OFF')
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+
+class HashCache:
+    """
+    Persistent cache of file digests shared by the hashing commands.
+    
+    Digests are keyed by the file's (st_ino, st_mtime_ns, st_size) and a
+    digest kind ('sha256', 'md5', 'etag:<part size>' or
+    'checksum:<algorithm>'), so several digests are kept per file and any
+    write to the file invalidates all of them. Missing digests of a file
+    are computed together in one pass over its mapping, and many files are
+    hashed on a thread pool since hashlib releases the GIL on large buffers.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """Open (or create) the cache database."""
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or state_path('hashes.db'), check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS hashes ('
+            'inode INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, '
+            'kind TEXT NOT NULL, digest TEXT NOT NULL, '
+            'PRIMARY KEY (inode, mtime_ns, size, kind))'
+        )
+        self._db.commit()
+    
+    def get(self, stat: os.stat_result, kind: str) -> Optional[str]:
+        """Return the cached digest for a file state, if any."""
+        with self._lock:
+            row = self._db.execute('SELECT digest FROM hashes WHERE inode = ? AND mtime_ns = ? '
+                                   'AND size = ? AND kind = ?',
+                                   (stat.st_ino, stat.st_mtime_ns, stat.st_size, kind)).fetchone()
+        return row[0] if row else None
+    
+    def put(self, stat: os.stat_result, kind: str, digest: str) -> None:
+        """Record a digest computed for a file state."""
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)',
+                             (stat.st_ino, stat.st_mtime_ns, stat.st_size, kind, digest))
+            self._db.commit()
+    
+    def digests(self, path: str, kinds: List[str]) -> dict:
+        """Return the digests of a file, computing and caching only the missing ones."""
+        stat = os.stat(path)
+        found = {kind: self.get(stat, kind) for kind in kinds}
+        missing = [kind for kind, digest in found.items() if digest is None]
+        if missing:
+            for kind, digest in compute_digests(path, missing).items():
+                found[kind] = digest
+                self.put(stat, kind, digest)
+        return found
+    
+    def digest(self, path: str, kind: str = 'sha256') -> str:
+        """Return one digest of a file."""
+        return self.digests(path, [kind])[kind]
+    
+    def digest_files(self, paths: List[str], kind: str = 'sha256',
+                     jobs: int = DEFAULT_CONCURRENCY) -> dict:
+        """Return {path: digest} for many files, hashing uncached ones on a thread pool."""
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            return dict(zip(paths, executor.map(lambda path: self.digest(path, kind), paths)))
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+
+class Presigner:
+    """
+    Local SigV4 signer for presigned S3 GET URLs.
+    
+    No request is made: the credentials are resolved once and the HMAC
+    signing key is derived once per day. `sign` builds everything that does
+    not depend on the key (scope, query string, host, a keyed HMAC to copy)
+    once per batch, so each URL costs one SHA-256 and one HMAC. URLs match
+    botocore's generate_presigned_url with s3v4 signing.
+    """
+    
+    ALGORITHM = 'AWS4-HMAC-SHA256'
+    DNS_BUCKET = re.compile(r'^[a-z0-9][a-z0-9-]{1,61}[a-z0-9]$')
+    
+    def __init__(self, access_key: str, secret_key: str, region: str,
+                 token: Optional[str] = None, endpoint_url: Optional[str] = None,
+                 expiry: Optional[float] = None):
+        """Initialize the signer; `expiry` is when temporary credentials stop working (epoch seconds)."""
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.token = token
+        self.endpoint_url = endpoint_url
+        self.expiry = expiry
+        self._keys = {}
+    
+    @classmethod
+    def from_session(cls, region: str, endpoint_url: Optional[str] = None) -> 'Presigner':
+        """Create a signer from the credentials boto3 would use."""
+        credentials = boto3.Session().get_credentials()
+        if credentials is None:
+            raise NoCredentialsError()
+        frozen = credentials.get_frozen_credentials()
+        # A URL signed with temporary credentials dies with their session token
+        expiry = getattr(credentials, '_expiry_time', None) if frozen.token else None
+        return cls(frozen.access_key, frozen.secret_key, region, token=frozen.token,
+                   endpoint_url=endpoint_url, expiry=expiry.timestamp() if expiry else None)
+    
+    def signing_key(self, date: str) -> bytes:
+        """Return the SigV4 signing key for a YYYYMMDD date, derived once per date."""
+        key = self._keys.get(date)
+        if key is None:
+            key = ('AWS4' + self.secret_key).encode()
+            for part in (date, self.region, 's3', 'aws4_request'):
+                key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+            self._keys = {date: key}
+        return key
+    
+    def sign(self, bucket: str, keys: Iterable[str], expires: int,
+             now: Optional[datetime.datetime] = None) -> List[str]:
+        """Return a presigned GET URL for every key, valid for `expires` seconds from `now`."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        
+        if self.endpoint_url:
+            endpoint = urlparse(self.endpoint_url)
+            scheme, host, base = endpoint.scheme, endpoint.netloc, f"/{bucket}/"
+        else:
+            scheme = 'https'
+            domain = 's3.amazonaws.com' if self.region == 'us-east-1' else f"s3.{self.region}.amazonaws.com"
+            if self.DNS_BUCKET.match(bucket):
+                host, base = f"{bucket}.{domain}", '/'
+            else:
+                host, base = domain, f"/{bucket}/"
+        
+        params = [('X-Amz-Algorithm', self.ALGORITHM),
+                  ('X-Amz-Credential', f"{self.access_key}/{scope}"),
+                  ('X-Amz-Date', amz_date),
+                  ('X-Amz-Expires', str(expires)),
+                  ('X-Amz-SignedHeaders', 'host')]
+        if self.token:
+            params.append(('X-Amz-Security-Token', self.token))
+        encoded = [(name, quote(value, safe='-_.~')) for name, value in params]
+        query = '&'.join(f"{name}={value}" for name, value in encoded)
+        canonical_query = '&'.join(f"{name}={value}" for name, value in sorted(encoded))
+        request_tail = f"\n{canonical_query}\nhost:{host}\n\nhost\nUNSIGNED-PAYLOAD"
+        string_to_sign = f"{self.ALGORITHM}\n{amz_date}\n{scope}\n"
+        url_head = f"{scheme}://{host}"
+        keyed = hmac.new(self.signing_key(amz_date[:8]), digestmod=hashlib.sha256)
+        
+        urls = []
+        for key in keys:
+            path = base + quote(key, safe='/~')
+            request_hash = hashlib.sha256(f"GET\n{path}{request_tail}".encode()).hexdigest()
+            signer = keyed.copy()
+            signer.update((string_to_sign + request_hash).encode())
+            urls.append(f"{url_head}{path}?{query}&X-Amz-Signature={signer.hexdigest()}")
+        return urls
+
+
+class PresignCache:
+    """
+    Cache of issued presigned URLs for `vib3 presign`.
+    
+    URLs are keyed by bucket, key and signer (credentials, region and
+    endpoint) and reused until they are within a margin of expiring.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """Open (or create) the cache database."""
+        self._db = sqlite3.connect(path or state_path('presign.db'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS urls ('
+            'bucket TEXT NOT NULL, key TEXT NOT NULL, signer TEXT NOT NULL, url TEXT NOT NULL, '
+            'expires_at INTEGER NOT NULL, PRIMARY KEY (bucket, key, signer))'
+        )
+        self._db.commit()
+    
+    def lookup(self, bucket: str, signer: str, keys: List[str], valid_after: float) -> dict:
+        """Return {key: (url, expires_at)} for cached URLs that outlive `valid_after`."""
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT key, url, expires_at FROM urls WHERE bucket = ? AND signer = ? "
+                f"AND expires_at >= ? AND key IN ({','.join('?' * len(batch))})",
+                [bucket, signer, valid_after, *batch]
+            )
+            found.update((key, (url, expires_at)) for key, url, expires_at in rows)
+        return found
+    
+    def store(self, bucket: str, signer: str, entries: List[tuple]) -> None:
+        """Record (key, url, expires_at) entries."""
+        self._db.executemany('INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?)',
+                             [(bucket, key, signer, url, expires_at) for key, url, expires_at in entries])
+        self._db.commit()
+    
+    def prune(self, now: float) -> None:
+        """Drop expired URLs."""
+        self._db.execute('DELETE FROM urls WHERE expires_at < ?', (now,))
+        self._db.commit()
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+
+class UploadQueue:
+    """
+    Durable upload queue for `vib3 queue`, kept in SQLite.
+    
+    Claiming a job leases it for a visibility timeout, as in SQS: a runner
+    that dies mid-upload simply lets the lease lapse and the job becomes
+    claimable again. Every completion or failure is checked against the
+    lease, so a runner whose lease was taken over cannot clobber the job.
+    Jobs are claimed by lane priority, then oldest first.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """Open (or create) the queue database."""
+        self._lock = threading.Lock()
+        # Autocommit, so claims can take the write lock up front with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(path or state_path('queue.db'), timeout=30,
+                                   isolation_level=None, check_same_thread=False)
+        # WAL lets `queue add` and `queue status` run alongside a busy runner
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, file TEXT NOT NULL, bucket TEXT NOT NULL, '
+            'key TEXT NOT NULL, lane TEXT NOT NULL, priority INTEGER NOT NULL, token TEXT NOT NULL, '
+            'state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, visible_at REAL NOT NULL, '
+            'lease TEXT, error TEXT, added_at REAL NOT NULL, finished_at REAL)'
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (priority, id) "
+                         "WHERE state IN ('queued', 'running')")
+    
+    def add(self, entries: List[tuple], now: Optional[float] = None) -> int:
+        """Queue (file, bucket, key, lane) entries; return how many were new."""
+        now = time.time() if now is None else now
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                # A file already waiting for the same destination is not queued twice
+                self._db.executemany(
+                    "INSERT INTO jobs (file, bucket, key, lane, priority, token, state, visible_at, added_at) "
+                    "SELECT ?, ?, ?, ?, ?, ?, 'queued', ?, ? WHERE NOT EXISTS (SELECT 1 FROM jobs "
+                    "WHERE file = ? AND bucket = ? AND key = ? AND state IN ('queued', 'running'))",
+                    [(file, bucket, key, lane, QUEUE_LANES[lane], os.urandom(8).hex(), now, now,
+                      file, bucket, key) for file, bucket, key, lane in entries]
+                )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            return self._db.total_changes - before
+    
+    def claim(self, visibility: float, now: Optional[float] = None) -> Optional[dict]:
+        """Lease the next visible job for `visibility` seconds, or return None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    "SELECT id, file, bucket, key, lane, token, attempts FROM jobs "
+                    "WHERE state IN ('queued', 'running') AND visible_at <= ? "
+                    "ORDER BY priority, id LIMIT 1", (now,)
+                ).fetchone()
+                job = None
+                if row:
+                    job = dict(zip(('id', 'file', 'bucket', 'key', 'lane', 'token', 'attempts'), row))
+                    job['attempts'] += 1
+                    job['lease'] = os.urandom(8).hex()
+                    self._db.execute(
+                        "UPDATE jobs SET state = 'running', attempts = ?, visible_at = ?, lease = ? "
+                        "WHERE id = ?", (job['attempts'], now + visibility, job['lease'], job['id'])
+                    )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            return job
+    
+    def _update(self, job: dict, assignments: str, values: tuple) -> bool:
+        """Update a job only while `job` still holds its lease."""
+        with self._lock:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND lease = ? AND state = 'running'",
+                (*values, job['id'], job['lease'])
+            )
+            return cursor.rowcount == 1
+    
+    def extend(self, job: dict, visibility: float, now: Optional[float] = None) -> bool:
+        """Push a held job's lease `visibility` seconds out; False if the lease was lost."""
+        now = time.time() if now is None else now
+        return self._update(job, 'visible_at = ?', (now + visibility,))
+    
+    def complete(self, job: dict, now: Optional[float] = None) -> bool:
+        """Mark a held job done."""
+        now = time.time() if now is None else now
+        return self._update(job, "state = 'done', lease = NULL, error = NULL, finished_at = ?", (now,))
+    
+    def fail(self, job: dict, error: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+             now: Optional[float] = None):
+        """
+        Record a failed attempt; return the retry delay, or None once the job has failed for good.
+        
+        The delay doubles with every attempt, from QUEUE_RETRY_BASE up to
+        QUEUE_RETRY_MAX seconds. Returns False, and records nothing, if the
+        lease was lost to another runner that now owns the job.
+        """
+        now = time.time() if now is None else now
+        if job['attempts'] >= max_attempts:
+            if not self._update(job, "state = 'failed', lease = NULL, error = ?, finished_at = ?",
+                                (error, now)):
+                return False
+            return None
+        delay = min(QUEUE_RETRY_MAX, QUEUE_RETRY_BASE * 2 ** (job['attempts'] - 1))
+        if not self._update(job, "state = 'queued', lease = NULL, error = ?, visible_at = ?",
+                            (error, now + delay)):
+            return False
+        return delay
+    
+    def release(self, job: dict, now: Optional[float] = None) -> bool:
+        """Hand a held job back untouched, e.g. when a runner is stopped."""
+        now = time.time() if now is None else now
+        return self._update(job, "state = 'queued', lease = NULL, attempts = attempts - 1, visible_at = ?",
+                            (now,))
+    
+    def next_visible(self) -> Optional[float]:
+        """Return when the next unfinished job becomes claimable, or None if there are none."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT MIN(visible_at) FROM jobs WHERE state IN ('queued', 'running')"
+            ).fetchone()[0]
+    
+    def stats(self) -> dict:
+        """Return {lane: {state: count}}."""
+        with self._lock:
+            rows = self._db.execute('SELECT lane, state, COUNT(*) FROM jobs GROUP BY lane, state')
+            stats = {}
+            for lane, state, count in rows:
+                stats.setdefault(lane, {})[state] = count
+            return stats
+    
+    def failures(self, limit: int = 10) -> List[tuple]:
+        """Return the most recent (file, bucket, key, attempts, error) permanent failures."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT file, bucket, key, attempts, error FROM jobs WHERE state = 'failed' "
+                "ORDER BY finished_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+
+class WatchState:
+    """
+    Record of the files `vib3 watch` has uploaded, by size and mtime.
+    
+    A restarted watcher starts from this record, so only files that are new
+    or changed since their upload are sent again.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """Open (or create) the state database."""
+        self._db = sqlite3.connect(path or state_path('watch.db'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'root TEXT NOT NULL, bucket TEXT NOT NULL, prefix TEXT NOT NULL, path TEXT NOT NULL, '
+            'size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, uploaded_at REAL NOT NULL, '
+            'PRIMARY KEY (root, bucket, prefix, path))'
+        )
+        self._db.commit()
+    
+    def load(self, root: str, bucket: str, prefix: str) -> dict:
+        """Return {relative path: (size, mtime_ns)} for a watched tree and destination."""
+        rows = self._db.execute('SELECT path, size, mtime_ns FROM files '
+                                'WHERE root = ? AND bucket = ? AND prefix = ?', (root, bucket, prefix))
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+    
+    def record(self, root: str, bucket: str, prefix: str, path: str, identity: tuple) -> None:
+        """Record that `path` was uploaded as it was at (size, mtime_ns) `identity`."""
+        self._db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (root, bucket, prefix, path, *identity, time.time()))
+        self._db.commit()
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+
+class TransferJournal:
+    """
+    Append-only checkpoint journal for a resumable transfer.
+    
+    The first line records the transfer (bucket, key and the identity of the
+    local file or remote object); every completed part appends one line.
+    Appending keeps checkpointing cheap even for transfers with thousands of
+    parts, and a torn final line from a crash is simply ignored on load.
+    """
+    
+    SUFFIX = '.vib3journal'
+    
+    def __init__(self, path: str, header: dict, parts: Optional[dict] = None):
+        """Initialize the journal."""
+        self.path = path
+        self.header = header
+        self.parts = parts or {}
+        self._lock = threading.Lock()
+        self._handle = None
+    
+    @classmethod
+    def path_for(cls, file: str) -> str:
+        """Return the journal path for a file."""
+        return file + cls.SUFFIX
+    
+    @classmethod
+    def create(cls, file: str, header: dict):
+        """Start a new journal, replacing any existing one."""
+        journal = cls(cls.path_for(file), header)
+        journal._handle = open(journal.path, 'w')
+        journal._write(header)
+        return journal
+    
+    @classmethod
+    def load(cls, file: str):
+        """Load the journal for a file, or return None if there is none."""
+        path = cls.path_for(file)
+        if not os.path.exists(path):
+            return None
+        
+        header = None
+        parts = {}
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if header is None:
+                    header = record
+                else:
+                    parts[record['part']] = record
+        if header is None:
+            return None
+        
+        journal = cls(path, header, parts)
+        journal._handle = open(path, 'a')
+        return journal
+    
+    def record(self, record: dict) -> None:
+        """Checkpoint a completed part."""
+        with self._lock:
+            self.parts[record['part']] = record
+            self._write(record)
+    
+    def _write(self, record: dict) -> None:
+        self._handle.write(json.dumps(record) + '\n')
+        self._handle.flush()
+    
+    def close(self) -> None:
+        """Close the journal file."""
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+    
+    def remove(self) -> None:
+        """Close and delete the journal."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UploadJournal(TransferJournal):
+    """Journal of a multipart upload: UploadId plus part ETags and MD5s."""
+    
+    SUFFIX = '.vib3upload'
+    
+    def matches(self, bucket: str, key: str, stat: os.stat_result) -> bool:
+        """Check that the journal belongs to this target and file version."""
+        return (self.header.get('bucket') == bucket and
+                self.header.get('key') == key and
+                self.header.get('size') == stat.st_size and
+                self.header.get('mtime_ns') == stat.st_mtime_ns)
+    
+    def record_part(self, number: int, etag: str, md5: str,
+                    checksum: Optional[str] = None) -> None:
+        """Checkpoint an uploaded part."""
+        record = {'part': number, 'etag': etag, 'md5': md5}
+        if checksum:
+            record['checksum'] = checksum
+        self.record(record)
+
+
+class DownloadJournal(TransferJournal):
+    """Journal of a ranged download: the object version plus finished ranges."""
+    
+    SUFFIX = '.vib3download'
+    
+    def matches(self, bucket: str, key: str, size: int, etag: Optional[str]) -> bool:
+        """Check that the journal belongs to this object version."""
+        return (self.header.get('bucket') == bucket and
+                self.header.get('key') == key and
+                self.header.get('size') == size and
+                self.header.get('etag') == etag)
+    
+    def record_part(self, number: int, checksum: Optional[str] = None) -> None:
+        """Checkpoint a downloaded range."""
+        record = {'part': number}
+        if checksum:
+            record['checksum'] = checksum
+        self.record(record)
+
+
+_seek_lock = threading.Lock()
+
+
+def _pwrite(fd: int, data, offset: int) -> None:
+    """Write all of `data` at `offset` without moving a shared file position."""
+    view = memoryview(data)
+    if not hasattr(os, 'pwrite'):
+        # Windows has no pwrite; serialize seek+write instead
+        with _seek_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while view:
+                view = view[os.write(fd, view):]
+        return
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def preallocate(fd: int, size: int) -> None:
+    """Reserve `size` bytes for a file, falling back to a sparse resize."""
+    os.ftruncate(fd, size)
+    if size and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            # Filesystem does not support fallocate; the file stays sparse
+            pass
+
+
+class RangedDownloader:
+    """
+    Parallel ranged-GET download engine.
+    
+    The output file is preallocated to the object size and each byte range is
+    written straight to its offset with os.pwrite as it streams in, so there
+    is no reassembly pass. Finished ranges are checkpointed to a
+    DownloadJournal next to the output file so an interrupted download can be
+    resumed.
+    
+    With a `checksum` algorithm each range is also hashed as it streams in and
+    its checksum is returned in the statistics, so verification costs no
+    second read of the file.
+    """
+    
+    CHUNK_SIZE = 1 * MB
+    
+    def __init__(self, s3_client, bucket: str, key: str,
+                 part_size: Optional[int] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 callback: Optional[Callable[[int], None]] = None,
+                 checksum: Optional[str] = None,
+                 controller: Optional[AdaptiveConcurrency] = None):
+        """
+        Initialize the downloader.
+        
+        When `checksum` is set, `part_size` is used exactly as given so the
+        ranges line up with the parts the object was uploaded in. With a
+        `controller`, `concurrency` is the thread count and the controller
+        decides how many ranges are actually in flight.
+        """
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.callback = callback
+        self.checksum = checksum
+        self.controller = controller
+        self.journal = None
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+    
+    def download(self, output: str, size: int, etag: Optional[str],
+                 resume: bool = False) -> dict:
+        """
+        Download the object to `output` and return transfer statistics.
+        
+        Every range is requested with If-Match on the ETag, so an object that
+        is replaced mid-download fails the transfer instead of producing a
+        file stitched together from two versions.
+        """
+        started = time.monotonic()
+        done = set()
+        if resume:
+            journal = DownloadJournal.load(output)
+            if (journal and journal.matches(self.bucket, self.key, size, etag) and
+                    journal.header.get('checksum') == self.checksum and os.path.exists(output)):
+                self.journal = journal
+                done = set(journal.parts)
+            elif journal:
+                journal.remove()
+        
+        if self.journal:
+            part_size = self.journal.header['part_size']
+            fd = os.open(output, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+        else:
+            if self.checksum and self.part_size:
+                part_size = self.part_size
+            else:
+                part_size = choose_part_size(size, self.part_size)
+            fd = os.open(output, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+            preallocate(fd, size)
+            self.journal = DownloadJournal.create(output, {
+                'bucket': self.bucket,
+                'key': self.key,
+                'etag': etag,
+                'size': size,
+                'part_size': part_size,
+                'checksum': self.checksum,
+            })
+        
+        part_count = max(1, -(-size // part_size))
+        missing = [n for n in range(1, part_count + 1) if n not in done]
+        try:
+            if size:
+                self._download_ranges(fd, missing, part_size, size, etag)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+            self.journal.close()
+        
+        checksums = None
+        if self.checksum:
+            checksums = [self.journal.parts[n]['checksum'] for n in range(1, part_count + 1)
+                         if n in self.journal.parts]
+            if not size:
+                checksums = [encode_checksum(new_checksum(self.checksum))]
+        self.journal.remove()
+        self.journal = None
+        elapsed = time.monotonic() - started
+        received = sum(min(n * part_size, size) - (n - 1) * part_size for n in missing)
+        return {
+            'size': size,
+            'received': received if size else 0,
+            'part_size': part_size,
+            'parts': part_count,
+            'resumed_parts': len(done),
+            'seconds': elapsed,
+            'checksums': checksums,
+        }
+    
+    def stream(self, out, size: int, etag: Optional[str]) -> dict:
+        """
+        Write the object to a non-seekable stream such as stdout.
+        
+        Ranges are fetched concurrently but written strictly in order; at
+        most `concurrency` ranges are buffered ahead of the writer.
+        """
+        started = time.monotonic()
+        part_size = choose_part_size(size, self.part_size)
+        ranges = iter(range(0, size, part_size))
+        
+        def fetch(start):
+            end = min(start + part_size, size)
+            params = {'Bucket': self.bucket, 'Key': self.key, 'Range': f'bytes={start}-{end - 1}'}
+            if etag:
+                params['IfMatch'] = etag
+            data = self.s3_client.get_object(**params)['Body'].read()
+            if len(data) != end - start:
+                raise RuntimeError(f"Short read on bytes {start}-{end - 1} of "
+                                   f"s3://{self.bucket}/{self.key}")
+            return data
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            window = deque(executor.submit(fetch, start)
+                           for _, start in zip(range(self.concurrency), ranges))
+            try:
+                while window:
+                    data = window.popleft().result()
+                    start = next(ranges, None)
+                    if start is not None:
+                        window.append(executor.submit(fetch, start))
+                    out.write(data)
+                    if self.callback:
+                        self.callback(len(data))
+            except BaseException:
+                for future in window:
+                    future.cancel()
+                raise
+        out.flush()
+        return {'size': size, 'part_size': part_size, 'seconds': time.monotonic() - started}
+    
+    def _download_ranges(self, fd: int, numbers: List[int], part_size: int,
+                         size: int, etag: Optional[str]) -> None:
+        """Fetch the given ranges concurrently."""
+        if not numbers:
+            return
+        unwatch = self.controller.watch(self.s3_client) if self.controller else None
+        try:
+            self._run_ranges(fd, numbers, part_size, size, etag)
+        finally:
+            if unwatch:
+                unwatch()
+    
+    def _run_ranges(self, fd: int, numbers: List[int], part_size: int,
+                    size: int, etag: Optional[str]) -> None:
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(numbers))) as executor:
+            futures = [
+                executor.submit(self._download_range, fd, number,
+                                (number - 1) * part_size,
+                                min(number * part_size, size), etag)
+                for number in numbers
+            ]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                self._failed.set()
+                for future in futures:
+                    future.cancel()
+                raise
+    
+    def _download_range(self, fd: int, number: int, start: int, end: int,
+                        etag: Optional[str]) -> None:
+        """Stream one byte range straight to its offset in the output file."""
+        if self._failed.is_set():
+            raise RuntimeError("Download aborted")
+        if self.controller:
+            self.controller.run(lambda: self._fetch_range(fd, number, start, end, etag), end - start)
+        else:
+            self._fetch_range(fd, number, start, end, etag)
+    
+    def _fetch_range(self, fd: int, number: int, start: int, end: int,
+                     etag: Optional[str]) -> None:
+        params = {'Bucket': self.bucket, 'Key': self.key, 'Range': f'bytes={start}-{end - 1}'}
+        if etag:
+            params['IfMatch'] = etag
+        response = self.s3_client.get_object(**params)
+        hasher = new_checksum(self.checksum) if self.checksum else None
+        
+        offset = start
+        for chunk in response['Body'].iter_chunks(self.CHUNK_SIZE):
+            _pwrite(fd, chunk, offset)
+            if hasher:
+                hasher.update(chunk)
+            offset += len(chunk)
+            if self.callback:
+                with self._lock:
+                    self.callback(len(chunk))
+        if offset != end:
+            raise RuntimeError(f"Short read on bytes {start}-{end - 1} of s3://{self.bucket}/{self.key}")
+        
+        self.journal.record_part(number, encode_checksum(hasher) if hasher else None)
+
+
+class MultipartUploader:
+    """
+    Parallel S3 multipart upload engine.
+    
+    The file is memory-mapped once and every part is sent straight from a
+    memoryview slice of the mapping, so parts are never copied into separate
+    buffers before they hit the socket. Completed parts are checkpointed to an
+    UploadJournal next to the file so an interrupted upload can be resumed.
+    
+    With a `checksum` algorithm every part's S3 checksum is computed in the
+    same pass over the mapping as its MD5 and sent with the part, so S3
+    rejects any part that is corrupted in transit.
+    """
+    
+    # Errors that a resume cannot fix; the upload is aborted instead
+    FATAL_ERRORS = ('AccessDenied', 'NoSuchBucket', 'NoSuchUpload', 'InvalidAccessKeyId')
+    
+    def __init__(self, s3_client, bucket: str, key: str,
+                 part_size: Optional[int] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 max_bandwidth: Optional[int] = None,
+                 callback: Optional[Callable[[int], None]] = None,
+                 limiter: Optional[BandwidthLimiter] = None,
+                 extra_args: Optional[dict] = None,
+                 checksum: Optional[str] = None,
+                 controller: Optional[AdaptiveConcurrency] = None):
+        """
+        Initialize the uploader.
+        
+        A shared `limiter` caps several concurrent uploads together and takes
+        precedence over `max_bandwidth`. `extra_args` (e.g. Metadata) are
+        passed to CreateMultipartUpload. With a `controller`, `concurrency`
+        is the thread count and the controller decides how many parts are
+        actually in flight.
+        """
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.limiter = limiter or (BandwidthLimiter(max_bandwidth) if max_bandwidth else None)
+        self.callback = callback
+        self.extra_args = extra_args or {}
+        self.checksum = checksum
+        self.controller = controller
+        self.journal = None
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+    
+    def upload(self, file: str, resume: bool = False) -> dict:
+        """
+        Upload a file and return transfer statistics.
+        
+        With resume=True the upload recorded in the file's journal is
+        continued: parts already present in S3 are skipped and only the
+        missing ones are sent. If the upload fails for a reason a resume
+        cannot fix it is aborted; otherwise the multipart upload and journal
+        are kept for a later resume.
+        """
+        stat = os.stat(file)
+        file_size = stat.st_size
+        started = time.monotonic()
+        
+        done = {}
+        if resume:
+            self.journal = self._resume_journal(file, stat)
+        if self.journal:
+            upload_id = self.journal.header['upload_id']
+            part_size = self.journal.header['part_size']
+            # The algorithm is fixed when the multipart upload is created
+            self.checksum = self.journal.header.get('checksum')
+            try:
+                done = self._uploaded_parts(file, upload_id, part_size, file_size)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') == 'NoSuchUpload':
+                    self._discard_journal()
+                    raise RuntimeError(f"Interrupted upload of {file} has expired or was aborted; "
+                                       f"run without --resume to start over")
+                raise
+        else:
+            stale = UploadJournal.load(file)
+            if stale:
+                self._abort(stale.header['upload_id'], stale.header['bucket'], stale.header['key'])
+                stale.remove()
+            part_size = choose_part_size(file_size, self.part_size)
+            extra_args = dict(self.extra_args)
+            if self.checksum:
+                extra_args['ChecksumAlgorithm'] = CHECKSUM_ALGORITHMS[self.checksum]
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                                              **extra_args)
+            upload_id = response['UploadId']
+            self.journal = self._create_journal(file, stat, upload_id, part_size)
+        
+        part_count = max(1, -(-file_size // part_size))
+        sent = 0
+        try:
+            with open(file, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                missing = [n for n in range(1, part_count + 1) if n not in done]
+                parts = list(done.values())
+                parts += self._upload_parts(mapped, upload_id, file_size, part_size, missing)
+                sent = sum(min(n * part_size, file_size) - (n - 1) * part_size for n in missing)
+            finally:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # A view is still referenced by a cancelled request;
+                    # the mapping is released when it is garbage collected.
+                    pass
+            
+            completed = self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': sorted(parts, key=lambda part: part['PartNumber'])}
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in self.FATAL_ERRORS:
+                self._abort(upload_id, self.bucket, self.key)
+                self._discard_journal()
+            raise
+        finally:
+            if self.journal:
+                self.journal.close()
+        
+        self._discard_journal()
+        checksum = None
+        part_checksums = None
+        if self.checksum:
+            field = CHECKSUM_FIELDS[self.checksum]
+            part_checksums = [part[field] for part in sorted(parts, key=lambda part: part['PartNumber'])]
+            checksum = composite_checksum(self.checksum, part_checksums)
+            if completed.get(field) and completed[field] != checksum:
+                raise RuntimeError(f"Checksum mismatch for s3://{self.bucket}/{self.key}: "
+                                   f"S3 reports {completed[field]}, expected {checksum}")
+        elapsed = time.monotonic() - started
+        return {
+            'etag': completed.get('ETag'),
+            'checksum': checksum,
+            'part_checksums': part_checksums,
+            'size': file_size,
+            'sent': sent,
+            'part_size': part_size,
+            'parts': part_count,
+            'resumed_parts': len(done),
+            'seconds': elapsed,
+        }
+    
+    def _create_journal(self, file: str, stat: os.stat_result, upload_id: str,
+                        part_size: int) -> Optional[UploadJournal]:
+        """Start the checkpoint journal; uploads still work without one."""
+        try:
+            return UploadJournal.create(file, {
+                'bucket': self.bucket,
+                'key': self.key,
+                'upload_id': upload_id,
+                'part_size': part_size,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'checksum': self.checksum,
+            })
+        except OSError as e:
+            print(f"Warning: cannot write upload journal ({e}); resume will not be possible",
+                  file=sys.stderr)
+            return None
+    
+    def _resume_journal(self, file: str, stat: os.stat_result) -> Optional[UploadJournal]:
+        """Load and validate the journal of an interrupted upload, if any."""
+        journal = UploadJournal.load(file)
+        if journal is None:
+            return None
+        if not journal.matches(self.bucket, self.key, stat):
+            journal.close()
+            raise ValueError(f"Interrupted upload of {file} does not match this file or "
+                             f"destination; run without --resume to start over")
+        return journal
+    
+    def _uploaded_parts(self, file: str, upload_id: str, part_size: int,
+                        file_size: int) -> dict:
+        """
+        List the parts S3 already has for the upload.
+        
+        A part counts as done when its ETag matches the journal. Parts that
+        reached S3 but were not journaled (the process died in between) are
+        accepted if their ETag matches the MD5 of the local bytes; their S3
+        checksum is computed from the same read.
+        """
+        paginator = self.s3_client.get_paginator('list_parts')
+        remote = {}
+        for page in paginator.paginate(Bucket=self.bucket, Key=self.key, UploadId=upload_id):
+            for part in page.get('Parts', []):
+                remote[part['PartNumber']] = part['ETag']
+        
+        done = {}
+        with open(file, 'rb') as f:
+            for number, etag in remote.items():
+                record = self.journal.parts.get(number)
+                if record is None:
+                    f.seek((number - 1) * part_size)
+                    data = f.read(min(part_size, file_size - (number - 1) * part_size))
+                    if etag.strip('"') != hashlib.md5(data).hexdigest():
+                        continue
+                    checksum = None
+                    if self.checksum:
+                        hasher = new_checksum(self.checksum)
+                        hasher.update(data)
+                        checksum = encode_checksum(hasher)
+                    self.journal.record_part(number, etag, etag.strip('"'), checksum)
+                    record = self.journal.parts[number]
+                elif record['etag'] != etag:
+                    continue
+                done[number] = {'PartNumber': number, 'ETag': etag}
+                if self.checksum:
+                    done[number][CHECKSUM_FIELDS[self.checksum]] = record['checksum']
+        return done
+    
+    def _abort(self, upload_id: str, bucket: str, key: str) -> None:
+        """Abort a multipart upload, ignoring uploads that are already gone."""
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except ClientError:
+            pass
+    
+    def _discard_journal(self) -> None:
+        if self.journal:
+            self.journal.remove()
+            self.journal = None
+    
+    def _upload_parts(self, mapped: mmap.mmap, upload_id: str, file_size: int,
+                      part_size: int, numbers: List[int]) -> List[dict]:
+        """Upload the given parts concurrently."""
+        parts = []
+        if not numbers:
+            return parts
+        unwatch = self.controller.watch(self.s3_client) if self.controller else None
+        try:
+            self._run_parts(mapped, upload_id, file_size, part_size, numbers, parts)
+        finally:
+            if unwatch:
+                unwatch()
+        return parts
+    
+    def _run_parts(self, mapped: mmap.mmap, upload_id: str, file_size: int,
+                   part_size: int, numbers: List[int], parts: List[dict]) -> None:
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(numbers))) as executor:
+            futures = [
+                executor.submit(self._upload_part, mapped, upload_id, number,
+                                (number - 1) * part_size,
+                                min(number * part_size, file_size))
+                for number in numbers
+            ]
+            try:
+                for future in as_completed(futures):
+                    parts.append(future.result())
+            except BaseException:
+                self._failed.set()
+                for future in futures:
+                    future.cancel()
+                raise
+    
+    def _upload_part(self, mapped: mmap.mmap, upload_id: str, number: int,
+                     start: int, end: int) -> dict:
+        """Upload a single part from the mapped file."""
+        if self._failed.is_set():
+            raise RuntimeError("Upload aborted")
+        if self.limiter:
+            self.limiter.consume(end - start)
+        
+        view = memoryview(mapped)[start:end]
+        try:
+            md5 = hashlib.md5()
+            params = {}
+            if self.checksum:
+                hasher = new_checksum(self.checksum)
+                hash_view(view, [md5, hasher])
+                checksum = params[CHECKSUM_FIELDS[self.checksum]] = encode_checksum(hasher)
+            else:
+                checksum = None
+                md5.update(view)
+            
+            def send():
+                return self.s3_client.upload_part(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=_PartReader(view),
+                    **params
+                )
+            
+            response = self.controller.run(send, end - start) if self.controller else send()
+        finally:
+            view.release()
+        
+        if self.journal:
+            self.journal.record_part(number, response['ETag'], md5.hexdigest(), checksum)
+        if self.callback:
+            with self._lock:
+                self.callback(end - start)
+        return {'PartNumber': number, 'ETag': response['ETag'], **params}
+
+
+class MultipartCopier:
+    """
+    Server-side copy of an object, as one CopyObject or parallel UploadPartCopy.
+    
+    Objects below MULTIPART_THRESHOLD are copied with a single request that
+    keeps their metadata. Larger objects (and anything over the 5 GB
+    CopyObject limit) are copied as byte ranges of the source in parallel;
+    every range is pinned to the source ETag, and the source headers are
+    passed to CreateMultipartUpload since a multipart copy does not keep them.
+    """
+    
+    def __init__(self, s3_client, part_size: Optional[int] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 callback: Optional[Callable[[int], None]] = None):
+        """Initialize the copier."""
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        self.s3_client = s3_client
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.callback = callback
+    
+    def copy(self, source_bucket: str, source_key: str, bucket: str, key: str,
+             head: Optional[dict] = None, size: Optional[int] = None) -> int:
+        """Copy an object and return its size; `size` alone is enough for small objects."""
+        source = {'Bucket': source_bucket, 'Key': source_key}
+        if size is None:
+            head = head or self.s3_client.head_object(**source)
+            size = head['ContentLength']
+        if size < MULTIPART_THRESHOLD and not (self.part_size and size > self.part_size):
+            self.s3_client.copy_object(Bucket=bucket, Key=key, CopySource=source,
+                                       MetadataDirective='COPY')
+            self._report(size)
+            return size
+        
+        head = head or self.s3_client.head_object(**source)
+        part_size = choose_part_size(size, self.part_size)
+        extra_args = {field: head[field] for field in COPY_HEADERS if head.get(field)}
+        upload_id = self.s3_client.create_multipart_upload(Bucket=bucket, Key=key,
+                                                           **extra_args)['UploadId']
+        
+        def copy_part(number):
+            start = (number - 1) * part_size
+            end = min(start + part_size, size) - 1
+            response = self.s3_client.upload_part_copy(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                CopySource=source,
+                CopySourceRange=f"bytes={start}-{end}",
+                CopySourceIfMatch=head['ETag']
+            )
+            self._report(end - start + 1)
+            return {'PartNumber': number, 'ETag': response['CopyPartResult']['ETag']}
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                parts = list(executor.map(copy_part, range(1, -(-size // part_size) + 1)))
+            self.s3_client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                                     MultipartUpload={'Parts': parts})
+        except BaseException:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            except ClientError:
+                pass
+            raise
+        return size
+    
+    def _report(self, size: int) -> None:
+        if self.callback:
+            self.callback(size)
+
+
+def _readinto_full(stream, buffer: bytearray) -> int:
+    """Fill `buffer` from a stream, returning fewer bytes only at end of stream."""
+    view = memoryview(buffer)
+    filled = 0
+    while filled < len(buffer):
+        n = stream.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    view.release()
+    return filled
+
+
+class StreamUploader:
+    """
+    Multipart upload from a non-seekable stream such as a pipe.
+    
+    Parts are read into a small pool of reusable buffers, at most one more
+    than the number of parts in flight, so memory stays bounded at roughly
+    (concurrency + 1) x part size however long the stream runs. Streams
+    shorter than one part are sent with a single PutObject.
+    """
+    
+    def __init__(self, s3_client, bucket: str, key: str,
+                 part_size: Optional[int] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 callback: Optional[Callable[[int], None]] = None,
+                 limiter: Optional[BandwidthLimiter] = None,
+                 extra_args: Optional[dict] = None):
+        """Initialize the uploader."""
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = choose_part_size(0, part_size or DEFAULT_STREAM_PART_SIZE)
+        self.concurrency = concurrency
+        self.callback = callback
+        self.limiter = limiter
+        self.extra_args = extra_args or {}
+        self._free = queue.Queue()
+        self._allocated = 0
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+    
+    def upload(self, stream) -> dict:
+        """Upload everything read from `stream` and return transfer statistics."""
+        started = time.monotonic()
+        buffer = self._take_buffer()
+        n = _readinto_full(stream, buffer)
+        
+        if n < self.part_size:
+            if self.limiter:
+                self.limiter.consume(n)
+            response = self.s3_client.put_object(Bucket=self.bucket, Key=self.key,
+                                                 Body=_PartReader(memoryview(buffer)[:n]),
+                                                 **self.extra_args)
+            self._report(n)
+            return {'etag': response.get('ETag'), 'size': n, 'parts': 1,
+                    'seconds': time.monotonic() - started}
+        
+        response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                                          **self.extra_args)
+        upload_id = response['UploadId']
+        total = 0
+        number = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = []
+                while n and not self._failed.is_set():
+                    number += 1
+                    if number > MAX_PARTS:
+                        raise ValueError(f"Stream exceeds {MAX_PARTS:,} parts of "
+                                         f"{self.part_size:,} bytes; use a larger --part-size")
+                    futures.append(executor.submit(self._upload_part, upload_id, number, buffer, n))
+                    total += n
+                    buffer = self._take_buffer()
+                    n = _readinto_full(stream, buffer)
+                parts = [future.result() for future in futures]
+            
+            completed = self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException:
+            self._failed.set()
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=upload_id)
+            except (ClientError, BotoCoreError):
+                # The abort often fails for the same reason the upload did; report the upload error
+                pass
+            raise
+        
+        return {'etag': completed.get('ETag'), 'size': total, 'parts': number,
+                'seconds': time.monotonic() - started}
+    
+    def _take_buffer(self) -> bytearray:
+        """Reuse a free buffer, allocate one, or wait for a part to finish."""
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        if self._allocated <= self.concurrency:
+            self._allocated += 1
+            return bytearray(self.part_size)
+        return self._free.get()
+    
+    def _upload_part(self, upload_id: str, number: int, buffer: bytearray, size: int) -> dict:
+        """Upload one buffered part, then hand the buffer back to the reader."""
+        try:
+            if self._failed.is_set():
+                raise RuntimeError("Upload aborted")
+            if self.limiter:
+                self.limiter.consume(size)
+            view = memoryview(buffer)[:size]
+            try:
+                response = self.s3_client.upload_part(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=_PartReader(view)
+                )
+            finally:
+                view.release()
+        except BaseException:
+            self._failed.set()
+            raise
+        finally:
+            self._free.put(buffer)
+        
+        self._report(size)
+        return {'PartNumber': number, 'ETag': response['ETag']}
+    
+    def _report(self, size: int) -> None:
+        if self.callback:
+            with self._lock:
+                self.callback(size)
+
+
+class Inotify:
+    """Minimal inotify(7) binding through ctypes (Linux only)."""
+    
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    EVENT = struct.Struct('iIII')
+    
+    def __init__(self):
+        """Create the inotify instance; raises OSError where inotify is unavailable."""
+        name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available on this platform")
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+    
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watch a path for the events in `mask`; returns the watch descriptor."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+    
+    def read(self, timeout: float) -> List[tuple]:
+        """Wait up to `timeout` seconds and return events as (wd, mask, cookie, name)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            wd, mask, cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+    
+    def close(self) -> None:
+        """Close the inotify instance."""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class _FollowReader(io.RawIOBase):
+    """
+    Reader over a file that is still being written.
+    
+    Reads block at the current end of file until more data arrives. The
+    stream ends once the writer closes the file (seen through inotify where
+    available) or the file stops growing for `idle` seconds.
+    """
+    
+    def __init__(self, path: str, idle: float = DEFAULT_FOLLOW_IDLE,
+                 poll_interval: float = FOLLOW_POLL_INTERVAL):
+        self.path = path
+        self.idle = idle
+        self.poll_interval = poll_interval
+        self._file = open(path, 'rb', buffering=0)
+        self._last_growth = time.monotonic()
+        self._writer_closed = False
+        try:
+            self._inotify = Inotify()
+            self._inotify.add_watch(path, Inotify.IN_MODIFY | Inotify.IN_CLOSE_WRITE)
+        except (OSError, AttributeError, TypeError):
+            self._inotify = None
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while True:
+            n = self._file.readinto(buffer)
+            if n:
+                self._last_growth = time.monotonic()
+                return n
+            if os.fstat(self._file.fileno()).st_size < self._file.tell():
+                raise RuntimeError(f"{self.path} was truncated while it was being uploaded")
+            if self._writer_closed:
+                return 0
+            waited = time.monotonic() - self._last_growth
+            if waited >= self.idle:
+                return 0
+            self._wait(min(self.poll_interval, self.idle - waited))
+    
+    def _wait(self, timeout: float) -> None:
+        if self._inotify is None:
+            time.sleep(timeout)
+            return
+        for _, mask, _, _ in self._inotify.read(timeout):
+            if mask & Inotify.IN_CLOSE_WRITE:
+                # Drain whatever was written before the close, then stop
+                self._writer_closed = True
+    
+    def close(self) -> None:
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+        self._file.close()
+        super().close()
+
+
+class FolderWatcher:
+    """
+    Detect files that have finished landing in a directory tree.
+    
+    With inotify(7) a file is ready once its writer has closed it (or it
+    was renamed into place) and it has then stayed quiet for `settle`
+    seconds. Where inotify is unavailable, or with `poll=True` for network
+    shares whose remote writes it never sees, the tree is rescanned every
+    WATCH_POLL_INTERVAL seconds and a file is ready once its size and mtime
+    have not changed for `settle` seconds.
+    
+    `seen` maps relative paths to the (size, mtime_ns) already handled;
+    only files that differ from it are reported.
+    """
+    
+    MASK = Inotify.IN_MODIFY | Inotify.IN_CLOSE_WRITE | Inotify.IN_MOVED_TO | Inotify.IN_CREATE
+    
+    def __init__(self, root: str, settle: float = DEFAULT_WATCH_SETTLE, seen: Optional[dict] = None,
+                 poll: bool = False, ignore: Optional[Callable[[str], bool]] = None):
+        """Start watching `root`; falls back to polling if inotify cannot be used."""
+        self.root = root
+        self.settle = settle
+        self.seen = seen if seen is not None else {}
+        self.ignore = ignore or (lambda name: False)
+        self.pending = {}
+        self.fallback = None
+        self._dirs = {}
+        self._inotify = None
+        self._scanned = 0.0
+        if not poll:
+            try:
+                self._inotify = Inotify()
+            except (OSError, AttributeError, TypeError) as e:
+                self.fallback = str(e)
+    
+    @property
+    def polling(self) -> bool:
+        """Whether the tree is rescanned rather than watched."""
+        return self._inotify is None
+    
+    def scan(self, rel_dir: str = '') -> None:
+        """Walk (part of) the tree, watching directories and queueing changed files."""
+        stack = [rel_dir]
+        while stack:
+            rel = stack.pop()
+            path = os.path.join(self.root, rel)
+            self._watch(path, rel)
+            try:
+                entries = list(os.scandir(path))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            for entry in entries:
+                if self.ignore(entry.name):
+                    continue
+                name = rel + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name + '/')
+                elif entry.is_file():
+                    try:
+                        self._touch(name, entry.stat(), closed=None)
+                    except FileNotFoundError:
+                        pass
+        if rel_dir == '':
+            self._scanned = time.monotonic()
+    
+    def _watch(self, path: str, rel: str) -> None:
+        if self._inotify is None:
+            return
+        try:
+            self._dirs[self._inotify.add_watch(path, self.MASK)] = rel
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Typically ENOSPC: the inotify watch limit is exhausted
+            self.fallback = str(e)
+            self._inotify.close()
+            self._inotify = None
+            self._dirs.clear()
+    
+    def _touch(self, rel: str, stat: os.stat_result, closed: Optional[bool]) -> None:
+        """Note the current state of a file; `closed` is None when no event says."""
+        identity = (stat.st_size, stat.st_mtime_ns)
+        entry = self.pending.get(rel)
+        if entry is None:
+            if closed is None and self.seen.get(rel) == identity:
+                return
+            entry = self.pending[rel] = {'identity': None, 'changed': 0.0, 'closed': True}
+        if entry['identity'] != identity:
+            entry['identity'] = identity
+            entry['changed'] = time.monotonic()
+        if closed is not None:
+            entry['closed'] = closed
+            entry['changed'] = time.monotonic()
+    
+    def poll(self, timeout: float) -> List[tuple]:
+        """Wait up to `timeout` seconds for changes; return ready files as (rel, path, (size, mtime_ns))."""
+        if self._inotify is None:
+            if time.monotonic() - self._scanned >= WATCH_POLL_INTERVAL:
+                self.scan()
+            else:
+                time.sleep(timeout)
+        else:
+            self._read_events(timeout)
+        
+        now = time.monotonic()
+        ready = []
+        for rel, entry in list(self.pending.items()):
+            if not entry['closed'] or now - entry['changed'] < self.settle:
+                continue
+            path = os.path.join(self.root, rel)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[rel]
+                continue
+            identity = (stat.st_size, stat.st_mtime_ns)
+            if identity != entry['identity']:
+                entry['identity'] = identity
+                entry['changed'] = now
+                continue
+            del self.pending[rel]
+            self.seen[rel] = identity
+            ready.append((rel, path, identity))
+        return ready
+    
+    def _read_events(self, timeout: float) -> None:
+        touched = {}
+        for wd, mask, _, name in self._inotify.read(timeout):
+            if mask & Inotify.IN_Q_OVERFLOW:
+                # Events were dropped: only a rescan can tell what changed
+                self.scan()
+                continue
+            if mask & Inotify.IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            if wd not in self._dirs or not name or self.ignore(name):
+                continue
+            rel = self._dirs[wd] + name
+            if mask & Inotify.IN_ISDIR:
+                if mask & (Inotify.IN_CREATE | Inotify.IN_MOVED_TO):
+                    # Files may land before the new directory is watched
+                    self.scan(rel + '/')
+                    if self._inotify is None:
+                        return
+                continue
+            # The last event wins: a write after a close means the file is open again
+            touched[rel] = bool(mask & (Inotify.IN_CLOSE_WRITE | Inotify.IN_MOVED_TO))
+        for rel, closed in touched.items():
+            try:
+                self._touch(rel, os.stat(os.path.join(self.root, rel)), closed)
+            except FileNotFoundError:
+                self.pending.pop(rel, None)
+    
+    def retry(self, rel: str, identity: tuple, delay: float) -> None:
+        """Report a file as ready again after `delay` seconds, e.g. after a failed upload."""
+        self.pending[rel] = {'identity': identity, 'closed': True,
+                             'changed': time.monotonic() + delay - self.settle}
+    
+    def close(self) -> None:
+        """Stop watching."""
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+
+# One pseudo-random bit per byte value: a 1-bit gear table for the chunker
+_CDC_TABLE = bytes(hashlib.sha256(bytes([value])).digest()[0] & 1 for value in range(256))
+
+
+def content_defined_chunks(data, min_size: int = CDC_MIN_SIZE, avg_size: int = CDC_AVG_SIZE,
+                           max_size: int = CDC_MAX_SIZE):
+    """
+    Split a buffer (bytes or mmap) into content-defined chunks, yielding (offset, length).
+    
+    FastCDC-style: no cut point is looked for in the first `min_size` bytes
+    of a chunk, a stricter cut condition applies up to `avg_size` and a
+    looser one after it (normalized chunking), and chunks are capped at
+    `max_size`. A cut point is the end of a run of bytes whose bits in a
+    fixed 1-bit gear table are all set. That depends only on nearby
+    content, so an edit moves just the boundaries around it. The search
+    uses bytes.translate() and find(), so it runs at C speed instead of
+    hashing byte by byte in Python.
+    """
+    # Expected distance to a run of k set bits is about 2^(k+1) bytes
+    run = max(avg_size.bit_length() - 2, 4)
+    strict = b'\x01' * (run + 2)
+    loose = b'\x01' * (run - 2)
+    size = len(data)
+    pos = 0
+    while pos < size:
+        if size - pos <= min_size:
+            yield pos, size - pos
+            return
+        end = min(pos + max_size, size)
+        found = data[pos + min_size:min(pos + avg_size, end)].translate(_CDC_TABLE).find(strict)
+        if found != -1:
+            cut = pos + min_size + found + len(strict)
+        else:
+            # Look for the looser run in avg-sized windows rather than
+            # translating everything up to max_size
+            cut = end
+            start = max(pos + avg_size - len(loose) + 1, pos + min_size)
+            while start < end:
+                stop = min(start + avg_size, end)
+                found = data[start:stop].translate(_CDC_TABLE).find(loose)
+                if found != -1:
+                    cut = start + found + len(loose)
+                    break
+                start = stop - len(loose) + 1 if stop < end else end
+        yield pos, cut - pos
+        pos = cut
+
+
+class ChunkStore:
+    """
+    Content-addressed chunk storage for files that share most of their bytes.
+    
+    A file is split with content_defined_chunks(); every chunk is stored
+    once under CHUNK_PREFIX + its SHA-256, and each uploaded version gets a
+    manifest at `<key>.vib3chunks` listing its chunks in order. Uploading a
+    re-edited file only sends the chunks S3 does not already have.
+    """
+    
+    def __init__(self, s3_client, bucket: str, concurrency: int = DEFAULT_CONCURRENCY,
+                 callback: Optional[Callable[[int], None]] = None):
+        """Initialize the store."""
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.callback = callback
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def chunk_key(digest: str) -> str:
+        return f"{CHUNK_PREFIX}{digest[:2]}/{digest}"
+    
+    def load_manifest(self, key: str) -> Optional[dict]:
+        """Fetch the chunk manifest for a key, or None if there is none."""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=key + CHUNK_MANIFEST_SUFFIX)
+        except ClientError as e:
+            if is_not_found(e):
+                return None
+            raise
+        return json.loads(response['Body'].read())
+    
+    def put(self, file: str, key: str) -> dict:
+        """
+        Store a file as chunks plus a manifest and return transfer statistics.
+        
+        Each chunk is hashed straight from the mapped file and, if S3 does
+        not have it yet, sent from the same pages. Chunks listed in the
+        key's previous manifest are known to exist and are not checked.
+        """
+        started = time.monotonic()
+        size = os.path.getsize(file)
+        previous = self.load_manifest(key)
+        claimed = {digest for digest, _ in previous['chunks']} if previous else set()
+        sent = {}
+        
+        with open(file, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        try:
+            spans = list(content_defined_chunks(mapped))
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                digests = list(executor.map(
+                    lambda span: self._put_chunk(mapped, span[0], span[1], claimed, sent), spans))
+        finally:
+            if size:
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass
+        
+        manifest = {
+            'version': 1,
+            'size': size,
+            'chunks': [[digest, length] for digest, (_, length) in zip(digests, spans)],
+        }
+        self.s3_client.put_object(Bucket=self.bucket, Key=key + CHUNK_MANIFEST_SUFFIX,
+                                  Body=json.dumps(manifest).encode(),
+                                  ContentType='application/json')
+        return {
+            'size': size,
+            'chunks': len(spans),
+            'new_chunks': len(sent),
+            'sent': sum(sent.values()),
+            'seconds': time.monotonic() - started,
+        }
+    
+    def _put_chunk(self, mapped, offset: int, length: int, claimed: set, sent: dict) -> str:
+        # `claimed` holds digests that are known to exist or that another
+        # worker is already handling, so repeated chunks are sent once
+        view = memoryview(mapped)[offset:offset + length]
+        try:
+            digest = hashlib.sha256(view).hexdigest()
+            with self._lock:
+                mine = digest not in claimed
+                claimed.add(digest)
+            if mine and not self._exists(digest):
+                self.s3_client.put_object(Bucket=self.bucket, Key=self.chunk_key(digest),
+                                          Body=_PartReader(view))
+                with self._lock:
+                    sent[digest] = length
+        finally:
+            view.release()
+        if self.callback:
+            with self._lock:
+                self.callback(length)
+        return digest
+    
+    def _exists(self, digest: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=self.chunk_key(digest))
+            return True
+        except ClientError as e:
+            if is_not_found(e):
+                return False
+            raise
+    
+    def get(self, key: str, output: str) -> dict:
+        """
+        Reassemble a stored file into `output` and return transfer statistics.
+        
+        Distinct chunks are fetched in parallel, checked against their
+        SHA-256 and written with pwrite to every offset they occur at. The
+        file is assembled beside `output` and only replaces it once every
+        chunk has been verified.
+        """
+        started = time.monotonic()
+        manifest = self.load_manifest(key)
+        if manifest is None:
+            raise FileNotFoundError(f"No chunk manifest for s3://{self.bucket}/{key}")
+        
+        offsets = {}
+        position = 0
+        for digest, length in manifest['chunks']:
+            offsets.setdefault(digest, []).append(position)
+            position += length
+        if position != manifest['size']:
+            raise RuntimeError(f"Chunk manifest for s3://{self.bucket}/{key} is inconsistent")
+        
+        temp = output + '.vib3get'
+        fd = os.open(temp, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            try:
+                preallocate(fd, manifest['size'])
+                with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                    list(executor.map(lambda item: self._get_chunk(fd, *item), offsets.items()))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(temp, output)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        received = sum(dict(manifest['chunks']).values())
+        return {
+            'size': manifest['size'],
+            'chunks': len(manifest['chunks']),
+            'received': received,
+            'seconds': time.monotonic() - started,
+        }
+    
+    def _get_chunk(self, fd: int, digest: str, offsets: List[int]) -> None:
+        data = self.s3_client.get_object(Bucket=self.bucket, Key=self.chunk_key(digest))['Body'].read()
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise RuntimeError(f"Chunk {digest} in s3://{self.bucket} is corrupt")
+        for offset in offsets:
+            _pwrite(fd, data, offset)
+            if self.callback:
+                with self._lock:
+                    self.callback(len(data))
+
+
+class ReplicaTarget:
+    """One destination of a fan-out upload, with its own client and upload state."""
+    
+    def __init__(self, name: str, s3_client, bucket: str):
+        self.name = name
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.upload_id = None
+        self.parts = []
+        self.etag = None
+        self.error = None
+
+
+class FanoutUploader:
+    """
+    Upload one file to several S3-compatible targets with a single read.
+    
+    Each part is read from disk once into a buffer shared by all targets
+    and sent to every target concurrently; the buffer is reused only after
+    the last target has sent it. Buffers come from a pool of concurrency + 1,
+    so memory stays bounded and the transfer runs at the pace of the
+    slowest target. Every target has its own client, connection pool and
+    worker threads; a failing target is aborted while the others finish.
+    """
+    
+    def __init__(self, targets: List[ReplicaTarget], key: str,
+                 part_size: Optional[int] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 callback: Optional[Callable[[int], None]] = None,
+                 limiter: Optional[BandwidthLimiter] = None):
+        """Initialize the uploader."""
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        self.targets = targets
+        self.key = key
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.callback = callback
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        self._free = queue.Queue()
+        self._allocated = 0
+    
+    def upload(self, file: str) -> dict:
+        """Upload the file to every target and return transfer statistics."""
+        started = time.monotonic()
+        size = os.path.getsize(file)
+        if size >= MULTIPART_THRESHOLD or (self.part_size and size > self.part_size):
+            part_size = choose_part_size(size, self.part_size)
+            self._upload_multipart(file, size, part_size)
+        else:
+            part_size = size
+            self._upload_single(file, size)
+        return {'size': size, 'part_size': part_size, 'seconds': time.monotonic() - started}
+    
+    def _upload_single(self, file: str, size: int) -> None:
+        with open(file, 'rb') as f:
+            data = f.read()
+        
+        def put(target):
+            try:
+                response = target.s3_client.put_object(Bucket=target.bucket, Key=self.key,
+                                                       Body=_PartReader(memoryview(data), self.limiter))
+                target.etag = response.get('ETag')
+            except Exception as e:
+                target.error = e
+            self._report(size)
+        
+        with ThreadPoolExecutor(max_workers=len(self.targets)) as executor:
+            list(executor.map(put, self.targets))
+    
+    def _upload_multipart(self, file: str, size: int, part_size: int) -> None:
+        for target in self.targets:
+            try:
+                response = target.s3_client.create_multipart_upload(Bucket=target.bucket, Key=self.key)
+                target.upload_id = response['UploadId']
+            except Exception as e:
+                target.error = e
+        
+        executors = {target.name: ThreadPoolExecutor(max_workers=self.concurrency)
+                     for target in self.targets}
+        try:
+            try:
+                with open(file, 'rb', buffering=0) as f:
+                    for number in range(1, max(1, -(-size // part_size)) + 1):
+                        live = [target for target in self.targets if target.error is None]
+                        if not live:
+                            break
+                        buffer = self._take_buffer(part_size)
+                        n = _readinto_full(f, buffer)
+                        view = memoryview(buffer)[:n]
+                        # Senders left before the buffer can be reused
+                        pending = [len(live)]
+                        for target in live:
+                            executors[target.name].submit(self._send_part, target, number,
+                                                          view, buffer, pending)
+            finally:
+                for executor in executors.values():
+                    executor.shutdown(wait=True)
+        except BaseException:
+            # There is no resume journal here, so nothing may be left behind
+            for target in self.targets:
+                if target.upload_id is not None:
+                    self._abort(target)
+            raise
+        
+        for target in self.targets:
+            if target.upload_id is None:
+                continue
+            try:
+                if target.error is None:
+                    response = target.s3_client.complete_multipart_upload(
+                        Bucket=target.bucket,
+                        Key=self.key,
+                        UploadId=target.upload_id,
+                        MultipartUpload={'Parts': sorted(target.parts, key=lambda part: part['PartNumber'])}
+                    )
+                    target.etag = response.get('ETag')
+                    continue
+            except Exception as e:
+                target.error = e
+            self._abort(target)
+    
+    def _abort(self, target: ReplicaTarget) -> None:
+        """Abort a target's multipart upload, ignoring uploads that are already gone."""
+        try:
+            target.s3_client.abort_multipart_upload(Bucket=target.bucket, Key=self.key,
+                                                    UploadId=target.upload_id)
+        except ClientError:
+            pass
+    
+    def _take_buffer(self, part_size: int) -> bytearray:
+        """Reuse a free buffer, allocate one, or wait until every target has sent one."""
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        if self._allocated <= self.concurrency:
+            self._allocated += 1
+            return bytearray(part_size)
+        return self._free.get()
+    
+    def _send_part(self, target: ReplicaTarget, number: int, view: memoryview,
+                   buffer: bytearray, pending: list) -> None:
+        try:
+            if target.error is None:
+                response = target.s3_client.upload_part(
+                    Bucket=target.bucket,
+                    Key=self.key,
+                    UploadId=target.upload_id,
+                    PartNumber=number,
+                    Body=_PartReader(view, self.limiter)
+                )
+                with self._lock:
+                    target.parts.append({'PartNumber': number, 'ETag': response['ETag']})
+                self._report(len(view))
+        except Exception as e:
+            target.error = target.error or e
+        finally:
+            with self._lock:
+                pending[0] -= 1
+                done = pending[0] == 0
+            if done:
+                self._free.put(buffer)
+    
+    def _report(self, size: int) -> None:
+        if self.callback:
+            with self._lock:
+                self.callback(size)
+
+
+def mp4_boxes(f, file_size: int) -> List[tuple]:
+    """List the top-level boxes of an MP4 file as (type, offset, size)."""
+    boxes = []
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        header = f.read(16)
+        size, kind = struct.unpack_from('>I4s', header)
+        if size == 1:
+            size = struct.unpack_from('>Q', header, 8)[0]
+        elif size == 0:
+            size = file_size - offset
+        if size < 8 or offset + size > file_size:
+            raise ValueError(f"Corrupt MP4: bad {kind.decode('latin-1')!r} box at byte {offset}")
+        boxes.append((kind, offset, size))
+        offset += size
+    return boxes
+
+
+def _iter_boxes(data: bytes, start: int, end: int):
+    """Yield (type, offset, size, header size) for the boxes in data[start:end]."""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"Corrupt MP4: bad {kind.decode('latin-1')!r} box in moov")
+        yield kind, pos, size, header
+        pos += size
+
+
+def _make_box(kind: bytes, payload: bytes) -> bytes:
+    size = 8 + len(payload)
+    if size > 0xFFFFFFFF:
+        return struct.pack('>I4sQ', 1, kind, size + 8) + payload
+    return struct.pack('>I4s', size, kind) + payload
+
+
+def patch_chunk_offsets(moov: bytes, relocate: Callable[[int], int]) -> bytes:
+    """
+    Return a copy of a moov box with every stco/co64 chunk offset relocated.
+    
+    A 32-bit stco table whose new offsets no longer fit is rewritten as a
+    64-bit co64 table, which makes the moov box larger.
+    """
+    def rebuild(start: int, end: int) -> bytes:
+        out = []
+        for kind, pos, size, header in _iter_boxes(moov, start, end):
+            body = pos + header
+            if kind in MP4_CONTAINERS:
+                out.append(_make_box(kind, rebuild(body, pos + size)))
+            elif kind in (b'stco', b'co64'):
+                count = struct.unpack_from('>I', moov, body + 4)[0]
+                width = 'I' if kind == b'stco' else 'Q'
+                offsets = [relocate(offset) for offset in
+                           struct.unpack_from(f'>{count}{width}', moov, body + 8)]
+                if kind == b'stco' and offsets and max(offsets) > 0xFFFFFFFF:
+                    kind, width = b'co64', 'Q'
+                out.append(_make_box(kind, moov[body:body + 4] + struct.pack('>I', count) +
+                                     struct.pack(f'>{count}{width}', *offsets)))
+            else:
+                out.append(moov[pos:pos + size])
+        return b''.join(out)
+    
+    return rebuild(0, len(moov))
+
+
+def _copy_range(src, dst, start: int, length: int) -> None:
+    """Copy `length` bytes at `start` of `src` to `dst` through a 1 MiB buffer."""
+    src.seek(start)
+    buffer = memoryview(bytearray(MB))
+    while length:
+        n = src.readinto(buffer[:min(MB, length)])
+        if not n:
+            raise ValueError("Unexpected end of file while copying MP4 data")
+        dst.write(buffer[:n])
+        length -= n
+
+
+def faststart_mp4(source: str, destination: str) -> Optional[dict]:
+    """
+    Rewrite an MP4 with its moov box in front of the media data.
+    
+    Only the moov box is held in memory; the media data is streamed through
+    a fixed buffer. moov is placed just before the first mdat and the chunk
+    offsets are shifted by the moov size. Returns None without writing
+    anything if the file is already fast-start.
+    """
+    with open(source, 'rb') as src:
+        file_size = os.fstat(src.fileno()).st_size
+        boxes = mp4_boxes(src, file_size)
+        moov = next((box for box in boxes if box[0] == b'moov'), None)
+        mdat = next((box for box in boxes if box[0] == b'mdat'), None)
+        if moov is None or mdat is None:
+            raise ValueError(f"{source} is not a complete MP4 file (no moov or mdat box)")
+        _, moov_start, moov_size = moov
+        insert_at = mdat[1]
+        if moov_start < insert_at:
+            return None
+        
+        src.seek(moov_start)
+        data = src.read(moov_size)
+        # Upgrading stco to co64 grows moov, which moves the data again
+        new_size = moov_size
+        while True:
+            def relocate(offset: int, grow: int = new_size) -> int:
+                if offset < insert_at:
+                    return offset
+                if offset < moov_start:
+                    return offset + grow
+                return offset + grow - moov_size
+            patched = patch_chunk_offsets(data, relocate)
+            if len(patched) == new_size:
+                break
+            new_size = len(patched)
+        
+        with open(destination, 'wb') as dst:
+            _copy_range(src, dst, 0, insert_at)
+            dst.write(patched)
+            _copy_range(src, dst, insert_at, moov_start - insert_at)
+            _copy_range(src, dst, moov_start + moov_size, file_size - moov_start - moov_size)
+    return {'moov_size': new_size, 'moved': moov_start - insert_at}
+
+
 class VIB3CLI:
     """Main CLI application class for VIB3."""
     
-    def __init__(self):
-        """Initialize the CLI application."""
-        self.parser = self._create_parser()
+    def __init__(self):
+        """Initialize the CLI application."""
+        self.parser = self._create_parser()
+    
+    def _create_parser(self) -> argparse.ArgumentParser:
+        """Create and configure the argument parser."""
+        parser = argparse.ArgumentParser(
+            prog='vib3',
+            description='VIB3 Command Line Interface',
+            epilog='For more information, visit the project documentation.'
+        )
+        
+        parser.add_argument(
+            '--version',
+            action='version',
+            version='%(prog)s 1.0.0'
+        )
+        
+        subparsers = parser.add_subparsers(
+            dest='command',
+            help='Available commands'
+        )
+        
+        # Add 'hello' command
+        hello_parser = subparsers.add_parser(
+            'hello',
+            help='Print a greeting message'
+        )
+        hello_parser.add_argument(
+            'name',
+            nargs='?',
+            default='World',
+            help='Name to greet (default: World)'
+        )
+        
+        # Add 'list' command
+        list_parser = subparsers.add_parser(
+            'list',
+            help='List items'
+        )
+        list_parser.add_argument(
+            '--items',
+            nargs='+',
+            default=['item1', 'item2', 'item3'],
+            help='Items to list'
+        )
+        
+        # Add 'config' command
+        config_parser = subparsers.add_parser(
+            'config',
+            help='Show configuration'
+        )
+        config_parser.add_argument(
+            '--show',
+            action='store_true',
+            help='Show current configuration'
+        )
+        
+        # Add 'upload' command
+        upload_parser = subparsers.add_parser(
+            'upload',
+            help='Upload files to S3'
+        )
+        upload_parser.add_argument(
+            'files',
+            nargs='*',
+            metavar='file',
+            help='Path(s) to files to upload ("-" reads from stdin; requires --key)'
+        )
+        upload_parser.add_argument(
+            'bucket',
+            help='S3 bucket name'
+        )
+        upload_parser.add_argument(
+            '--key',
+            help='S3 key (defaults to filename)'
+        )
+        upload_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        upload_parser.add_argument(
+            '--part-size',
+            type=parse_size,
+            help='Multipart part size, e.g. 64M (default: chosen from file size)'
+        )
+        upload_parser.add_argument(
+            '--concurrency',
+            type=parse_concurrency,
+            default=DEFAULT_CONCURRENCY,
+            help=f'Number of parts uploaded in parallel, or "auto" to tune it from '
+                 f'throughput and throttling (default: {DEFAULT_CONCURRENCY})'
+        )
+        upload_parser.add_argument(
+            '--max-bandwidth',
+            type=parse_size,
+            help='Bandwidth cap in bytes per second, e.g. 100M (default: unlimited)'
+        )
+        upload_parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Resume an interrupted multipart upload, sending only missing parts'
+        )
+        upload_parser.add_argument(
+            '--dedup',
+            action='store_true',
+            help='Skip or server-side copy files whose content is already in S3'
+        )
+        upload_parser.add_argument(
+            '--faststart',
+            action='store_true',
+            help='Upload MP4s with the moov box moved to the front (the local file is not changed)'
+        )
+        upload_parser.add_argument(
+            '--follow',
+            action='store_true',
+            help='Upload a file that is still being written, sending parts as it grows'
+        )
+        upload_parser.add_argument(
+            '--follow-idle',
+            type=float,
+            default=DEFAULT_FOLLOW_IDLE,
+            help=f'With --follow, finish once the file has not grown for this many seconds '
+                 f'(default: {DEFAULT_FOLLOW_IDLE:g}; a writer closing the file also finishes)'
+        )
+        upload_parser.add_argument(
+            '--chunked',
+            action='store_true',
+            help='Store as content-defined chunks plus a manifest, sending only chunks '
+                 'S3 does not have yet (read back with vib3 get)'
+        )
+        upload_parser.add_argument(
+            '--replicate',
+            metavar='TARGETS',
+            help='Also upload to these comma-separated targets, reading the file once: '
+                 'aws[:region], do[:region] (DigitalOcean Spaces, DO_SPACES_KEY/SECRET) or an '
+                 'endpoint URL, each optionally followed by =bucket'
+        )
+        upload_parser.add_argument(
+            '--checksum',
+            choices=sorted(CHECKSUM_ALGORITHMS),
+            help='Send an S3 checksum computed while reading the file and record it '
+                 'in a .vib3sum sidecar (crc32c needs the crc32c package)'
+        )
+        self._add_batch_arguments(upload_parser, 'file', 'key')
+        
+        # Add 'download' command
+        download_parser = subparsers.add_parser(
+            'download',
+            help='Download file from S3'
+        )
+        download_parser.add_argument(
+            'bucket',
+            help='S3 bucket name'
+        )
+        download_parser.add_argument(
+            'keys',
+            nargs='*',
+            metavar='key',
+            help='S3 key(s) (file path in bucket)'
+        )
+        download_parser.add_argument(
+            '--output',
+            help='Output file path (defaults to key basename; "-" writes to stdout); '
+                 'a directory for batches'
+        )
+        download_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        download_parser.add_argument(
+            '--part-size',
+            type=parse_size,
+            help='Size of each ranged GET, e.g. 64M (default: chosen from object size)'
+        )
+        download_parser.add_argument(
+            '--concurrency',
+            type=parse_concurrency,
+            default=DEFAULT_CONCURRENCY,
+            help=f'Number of ranges fetched in parallel, or "auto" to tune it from '
+                 f'throughput and throttling (default: {DEFAULT_CONCURRENCY})'
+        )
+        download_parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Resume an interrupted ranged download, fetching only missing ranges'
+        )
+        download_parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Overwrite existing files in batch downloads (default: skip them)'
+        )
+        download_parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Verify the S3 checksum while downloading and record it in a .vib3sum sidecar'
+        )
+        download_parser.add_argument(
+            '--member',
+            help='Fetch one file from a vib3 pack; the key is the pack prefix or its index.json'
+        )
+        download_parser.add_argument(
+            '--cache',
+            action='store_true',
+            help='Serve repeat downloads from the local object cache, revalidated by ETag'
+        )
+        download_parser.add_argument(
+            '--cache-size',
+            type=parse_size,
+            default=DEFAULT_CACHE_SIZE,
+            help='Evict least recently used objects beyond this size, e.g. 50G (default: 20G)'
+        )
+        self._add_batch_arguments(download_parser, 'key', 'output')
+        
+        # Add 'sync' command
+        sync_parser = subparsers.add_parser(
+            'sync',
+            help='Sync a directory with an S3 prefix (either direction)'
+        )
+        sync_parser.add_argument(
+            'source',
+            help='Local directory or s3://bucket/prefix'
+        )
+        sync_parser.add_argument(
+            'destination',
+            help='s3://bucket/prefix or local directory'
+        )
+        sync_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        sync_parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=16,
+            help='Number of files transferred in parallel (default: 16)'
+        )
+        sync_parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete destination files that do not exist in the source'
+        )
+        sync_parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be transferred without doing it'
+        )
+        
+        # Add 'get' command
+        get_parser = subparsers.add_parser(
+            'get',
+            help='Reassemble a file uploaded with --chunked'
+        )
+        get_parser.add_argument(
+            'bucket',
+            help='S3 bucket name'
+        )
+        get_parser.add_argument(
+            'key',
+            help='S3 key the file was uploaded as'
+        )
+        get_parser.add_argument(
+            '--output',
+            help='Output file path (defaults to key basename)'
+        )
+        get_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        get_parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help=f'Number of chunks fetched in parallel (default: {DEFAULT_CONCURRENCY})'
+        )
+        
+        # Add 'pack' command
+        pack_parser = subparsers.add_parser(
+            'pack',
+            help='Pack a directory of small files into indexed tar shards on S3'
+        )
+        pack_parser.add_argument(
+            'source',
+            help='Local directory to pack'
+        )
+        pack_parser.add_argument(
+            'destination',
+            help='s3://bucket/prefix for the shards and index.json'
+        )
+        pack_parser.add_argument(
+            '--shard-size',
+            type=parse_size,
+            default=DEFAULT_SHARD_SIZE,
+            help='Target shard size, e.g. 256M (default: 256M)'
+        )
+        pack_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        pack_parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help=f'Number of parts uploaded in parallel per shard (default: {DEFAULT_CONCURRENCY})'
+        )
+        
+        # Add 'faststart' command
+        faststart_parser = subparsers.add_parser(
+            'faststart',
+            help='Move the moov box of an MP4 to the front so playback can start immediately'
+        )
+        faststart_parser.add_argument(
+            'file',
+            help='MP4 file to rewrite'
+        )
+        faststart_parser.add_argument(
+            '--output',
+            help='Write the result here instead of rewriting the file in place'
+        )
+        
+        # Add 'ls' command
+        ls_parser = subparsers.add_parser(
+            'ls',
+            help='List objects as NDJSON, streaming while paging'
+        )
+        ls_parser.add_argument(
+            'target',
+            help='Bucket name or s3://bucket/prefix'
+        )
+        ls_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        ls_parser.add_argument(
+            '--parallel',
+            type=int,
+            default=1,
+            help='List this many keyspace slices concurrently (default: 1, sequential)'
+        )
+        ls_parser.add_argument(
+            '--shards',
+            default=DEFAULT_SHARD_ALPHABET,
+            metavar='ALPHABET',
+            help='Characters that follow the prefix in keys, used to slice the keyspace '
+                 f'with --parallel (default: {DEFAULT_SHARD_ALPHABET})'
+        )
+        ls_parser.add_argument(
+            '--shard-depth',
+            type=int,
+            default=1,
+            help='Slice on this many leading characters (2 gives 256 hex slices; default: 1)'
+        )
+        
+        # Add 'rm' command
+        rm_parser = subparsers.add_parser(
+            'rm',
+            help='Delete objects with batched DeleteObjects requests'
+        )
+        rm_parser.add_argument(
+            'bucket',
+            help='S3 bucket name'
+        )
+        rm_parser.add_argument(
+            'keys',
+            nargs='*',
+            metavar='key',
+            help='S3 key(s) to delete'
+        )
+        rm_parser.add_argument(
+            '--from-file',
+            metavar='PATH',
+            help='Read more keys from PATH ("-" for stdin): one key per line, '
+                 'or NDJSON objects with "key" (e.g. vib3 ls output)'
+        )
+        rm_parser.add_argument(
+            '--prefix',
+            help='Delete every object under this prefix'
+        )
+        rm_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        rm_parser.add_argument(
+            '--jobs',
+            type=int,
+            default=DEFAULT_BATCH_JOBS,
+            help=f'Number of 1000-key delete requests in flight (default: {DEFAULT_BATCH_JOBS})'
+        )
+        rm_parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the keys that would be deleted without deleting them'
+        )
+        
+        # Add 'cp' and 'mv' commands
+        for name, help_text in (('cp', 'Copy objects server-side between buckets and prefixes'),
+                                ('mv', 'Move objects server-side (copy, then delete the source)')):
+            copy_parser = subparsers.add_parser(name, help=help_text)
+            copy_parser.add_argument(
+                'source',
+                help='s3://bucket/key, or s3://bucket/prefix with --recursive'
+            )
+            copy_parser.add_argument(
+                'destination',
+                help='s3://bucket/key, or a prefix ending in "/" (or with --recursive)'
+            )
+            copy_parser.add_argument(
+                '--recursive',
+                action='store_true',
+                help='Copy every object under the source prefix'
+            )
+            copy_parser.add_argument(
+                '--region',
+                default='us-east-1',
+                help='AWS region (default: us-east-1)'
+            )
+            copy_parser.add_argument(
+                '--jobs',
+                type=int,
+                default=DEFAULT_BATCH_JOBS,
+                help=f'Number of objects copied at once (default: {DEFAULT_BATCH_JOBS})'
+            )
+            copy_parser.add_argument(
+                '--part-size',
+                type=parse_size,
+                help='Size of each UploadPartCopy range, e.g. 512M (default: chosen from object size)'
+            )
+            copy_parser.add_argument(
+                '--concurrency',
+                type=int,
+                default=DEFAULT_CONCURRENCY,
+                help=f'Number of ranges copied in parallel per large object '
+                     f'(default: {DEFAULT_CONCURRENCY})'
+            )
+        
+        # Add 'catalog' command
+        catalog_parser = subparsers.add_parser(
+            'catalog',
+            help='Keep a local SQLite index of a bucket and query it'
+        )
+        catalog_parser.add_argument(
+            'action',
+            choices=['build', 'update', 'query'],
+            help='build (full listing), update (continue from each slice marker) or query'
+        )
+        catalog_parser.add_argument(
+            'target',
+            help='Bucket name or s3://bucket/prefix'
+        )
+        catalog_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        catalog_parser.add_argument(
+            '--parallel',
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help=f'Number of keyspace slices listed at once (default: {DEFAULT_CONCURRENCY})'
+        )
+        catalog_parser.add_argument(
+            '--shards',
+            default=DEFAULT_SHARD_ALPHABET,
+            metavar='ALPHABET',
+            help=f'Characters that follow the prefix in keys (default: {DEFAULT_SHARD_ALPHABET})'
+        )
+        catalog_parser.add_argument(
+            '--shard-depth',
+            type=int,
+            default=1,
+            help='Slice on this many leading characters (default: 1)'
+        )
+        catalog_parser.add_argument(
+            '--min-size',
+            type=parse_size,
+            help='With query, only objects of at least this size'
+        )
+        catalog_parser.add_argument(
+            '--max-size',
+            type=parse_size,
+            help='With query, only objects of at most this size'
+        )
+        catalog_parser.add_argument(
+            '--sort',
+            choices=['key', 'size', 'last_modified'],
+            default='key',
+            help='With query, order by key, size (largest first) or last_modified (newest first)'
+        )
+        catalog_parser.add_argument(
+            '--limit',
+            type=int,
+            help='With query, print at most this many rows'
+        )
+        catalog_parser.add_argument(
+            '--group-by',
+            type=int,
+            metavar='DEPTH',
+            help='With query, print object count and size per DEPTH leading path components'
+        )
+        catalog_parser.add_argument(
+            '--sql',
+            help='With query, run this read-only SQL against the objects and shards tables'
+        )
+        
+        # Add 'audit' command
+        audit_parser = subparsers.add_parser(
+            'audit',
+            help='Check that a local directory matches an S3 prefix by recomputing ETags'
+        )
+        audit_parser.add_argument(
+            'directory',
+            help='Local directory'
+        )
+        audit_parser.add_argument(
+            'url',
+            help='s3://bucket/prefix to compare against'
+        )
+        audit_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        audit_parser.add_argument(
+            '--part-size',
+            type=parse_size,
+            help='Part size the objects were uploaded with, e.g. 16M '
+                 '(default: try vib3\'s choice, the ETag\'s part count and 8M)'
+        )
+        audit_parser.add_argument(
+            '--jobs',
+            type=int,
+            help='Number of hashing processes (default: one per CPU)'
+        )
+        audit_parser.add_argument(
+            '--catalog',
+            action='store_true',
+            help='Compare against the local catalog instead of listing the bucket'
+        )
+        
+        # Add 'presign' command
+        presign_parser = subparsers.add_parser(
+            'presign',
+            help='Print presigned GET URLs as NDJSON, signed locally'
+        )
+        presign_parser.add_argument(
+            'bucket',
+            help='S3 bucket name'
+        )
+        presign_parser.add_argument(
+            'keys',
+            nargs='*',
+            metavar='key',
+            help='S3 key(s) to sign'
+        )
+        presign_parser.add_argument(
+            '--from-file',
+            metavar='PATH',
+            help='Read more keys from PATH ("-" for stdin): one key per line, '
+                 'or NDJSON objects with "key"'
+        )
+        presign_parser.add_argument(
+            '--expires',
+            type=int,
+            default=DEFAULT_PRESIGN_EXPIRES,
+            help=f'Seconds each new URL stays valid (default: {DEFAULT_PRESIGN_EXPIRES}, '
+                 f'at most {MAX_PRESIGN_EXPIRES})'
+        )
+        presign_parser.add_argument(
+            '--margin',
+            type=int,
+            default=DEFAULT_PRESIGN_MARGIN,
+            help=f'Reuse a cached URL unless it expires within this many seconds '
+                 f'(default: {DEFAULT_PRESIGN_MARGIN})'
+        )
+        presign_parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Sign every key instead of reusing cached URLs'
+        )
+        presign_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        presign_parser.add_argument(
+            '--endpoint-url',
+            help='S3-compatible endpoint, e.g. https://nyc3.digitaloceanspaces.com (path-style URLs)'
+        )
+        
+        # Add 'queue' command
+        queue_parser = subparsers.add_parser(
+            'queue',
+            help='Queue uploads durably and run them with a fixed worker pool'
+        )
+        queue_subparsers = queue_parser.add_subparsers(
+            dest='queue_command',
+            help='Queue commands'
+        )
+        
+        # Queue add subcommand
+        queue_add_parser = queue_subparsers.add_parser(
+            'add',
+            help='Queue files for upload'
+        )
+        queue_add_parser.add_argument(
+            'files',
+            nargs='*',
+            metavar='file',
+            help='Path(s) to files to queue'
+        )
+        queue_add_parser.add_argument(
+            'bucket',
+            help='S3 bucket name'
+        )
+        queue_add_parser.add_argument(
+            '--key',
+            help='S3 key (defaults to filename; single file only)'
+        )
+        queue_add_parser.add_argument(
+            '--lane',
+            choices=list(QUEUE_LANES),
+            default=DEFAULT_QUEUE_LANE,
+            help=f'Priority lane: creator uploads are claimed ahead of backfills '
+                 f'(default: {DEFAULT_QUEUE_LANE})'
+        )
+        queue_add_parser.add_argument(
+            '--from-file',
+            metavar='PATH',
+            help='Read more files from PATH ("-" for stdin): one path per line, '
+                 'or NDJSON objects with "file" and optional "key"'
+        )
+        
+        # Queue run subcommand
+        queue_run_parser = queue_subparsers.add_parser(
+            'run',
+            help='Upload queued files'
+        )
+        queue_run_parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_BATCH_JOBS,
+            help=f'Number of files uploaded at once (default: {DEFAULT_BATCH_JOBS})'
+        )
+        queue_run_parser.add_argument(
+            '--drain',
+            action='store_true',
+            help='Exit once no unfinished jobs remain instead of waiting for more'
+        )
+        queue_run_parser.add_argument(
+            '--visibility-timeout',
+            type=float,
+            default=DEFAULT_VISIBILITY_TIMEOUT,
+            help=f'Seconds a claimed job stays hidden from other runners; held jobs are '
+                 f'renewed while they upload (default: {DEFAULT_VISIBILITY_TIMEOUT})'
+        )
+        queue_run_parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=DEFAULT_MAX_ATTEMPTS,
+            help=f'Attempts before a job fails for good (default: {DEFAULT_MAX_ATTEMPTS})'
+        )
+        queue_run_parser.add_argument(
+            '--part-size',
+            type=parse_size,
+            help='Multipart part size, e.g. 16M (default: chosen from file size)'
+        )
+        queue_run_parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help=f'Parts uploaded in parallel per file (default: {DEFAULT_CONCURRENCY})'
+        )
+        queue_run_parser.add_argument(
+            '--pool-size',
+            type=int,
+            help='Maximum HTTP connections in the shared pool (default: workers x concurrency)'
+        )
+        queue_run_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        
+        # Queue status subcommand
+        queue_subparsers.add_parser(
+            'status',
+            help='Show job counts per lane and recent failures'
+        )
+        
+        # Add 'watch' command
+        watch_parser = subparsers.add_parser(
+            'watch',
+            help='Upload files as they land in a directory'
+        )
+        watch_parser.add_argument(
+            'directory',
+            help='Directory tree to watch'
+        )
+        watch_parser.add_argument(
+            'destination',
+            help='Destination s3://bucket/prefix'
+        )
+        watch_parser.add_argument(
+            '--settle',
+            type=float,
+            default=DEFAULT_WATCH_SETTLE,
+            help=f'Seconds a finished file must stay unchanged before it is uploaded '
+                 f'(default: {DEFAULT_WATCH_SETTLE:g})'
+        )
+        watch_parser.add_argument(
+            '--poll',
+            action='store_true',
+            help=f'Rescan every {WATCH_POLL_INTERVAL:g}s instead of using inotify '
+                 f'(for NFS/SMB shares written from other hosts)'
+        )
+        watch_parser.add_argument(
+            '--idle-exit',
+            type=float,
+            metavar='SECONDS',
+            help='Exit once nothing has landed or been uploading for this long (default: run until stopped)'
+        )
+        watch_parser.add_argument(
+            '--jobs',
+            type=int,
+            default=DEFAULT_BATCH_JOBS,
+            help=f'Number of files uploaded at once (default: {DEFAULT_BATCH_JOBS})'
+        )
+        watch_parser.add_argument(
+            '--part-size',
+            type=parse_size,
+            help='Multipart part size, e.g. 16M (default: chosen from file size)'
+        )
+        watch_parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help=f'Parts uploaded in parallel per file (default: {DEFAULT_CONCURRENCY})'
+        )
+        watch_parser.add_argument(
+            '--pool-size',
+            type=int,
+            help='Maximum HTTP connections in the shared pool (default: jobs x concurrency)'
+        )
+        watch_parser.add_argument(
+            '--region',
+            default='us-east-1',
+            help='AWS region (default: us-east-1)'
+        )
+        
+        # Add 'cache' command
+        cache_parser = subparsers.add_parser(
+            'cache',
+            help='Inspect or prune the local download cache'
+        )
+        cache_parser.add_argument(
+            'action',
+            choices=['stats', 'prune'],
+            help='Cache action'
+        )
+        cache_parser.add_argument(
+            '--max-size',
+            type=parse_size,
+            default=DEFAULT_CACHE_SIZE,
+            help='With prune, evict least recently used objects down to this size, '
+                 'e.g. 5G (0 empties the cache; default: 20G)'
+        )
+        
+        # Add 'deploy' command
+        deploy_parser = subparsers.add_parser(
+            'deploy',
+            help='Deploy web application'
+        )
+        deploy_subparsers = deploy_parser.add_subparsers(
+            dest='deploy_command',
+            help='Deployment commands'
+        )
+        
+        # Deploy web subcommand
+        deploy_web_parser = deploy_subparsers.add_parser(
+            'web',
+            help='Deploy web application to cloud provider'
+        )
+        deploy_web_parser.add_argument(
+            'provider',
+            choices=['aws', 'oracle', 'digitalocean', 'local'],
+            help='Cloud provider to deploy to'
+        )
+        deploy_web_parser.add_argument(
+            '--env',
+            choices=['dev', 'staging', 'prod'],
+            default='dev',
+            help='Environment to deploy to (default: dev)'
+        )
+        deploy_web_parser.add_argument(
+            '--port',
+            type=int,
+            default=3000,
+            help='Port for local deployment (default: 3000)'
+        )
+        
+        # Deploy config subcommand
+        deploy_config_parser = deploy_subparsers.add_parser(
+            'config',
+            help='Manage deployment configurations'
+        )
+        deploy_config_parser.add_argument(
+            'action',
+            choices=['show', 'set', 'get'],
+            help='Configuration action'
+        )
+        deploy_config_parser.add_argument(
+            '--key',
+            help='Configuration key (for set/get actions)'
+        )
+        deploy_config_parser.add_argument(
+            '--value',
+            help='Configuration value (for set action)'
+        )
+        
+        # Deploy status subcommand
+        deploy_status_parser = deploy_subparsers.add_parser(
+            'status',
+            help='Check deployment status'
+        )
+        deploy_status_parser.add_argument(
+            '--provider',
+            choices=['aws', 'oracle', 'digitalocean', 'local'],
+            help='Cloud provider to check'
+        )
+        
+        return parser
+    
+    def _add_batch_arguments(self, parser: argparse.ArgumentParser, field: str,
+                             target: str) -> None:
+        """Add the options shared by batch uploads and downloads."""
+        parser.add_argument(
+            '--from-file',
+            metavar='PATH',
+            help=f'Read more items from PATH ("-" for stdin): one {field} per line, '
+                 f'or NDJSON objects with "{field}" and optional "{target}"'
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=DEFAULT_BATCH_JOBS,
+            help=f'Number of files transferred in parallel (default: {DEFAULT_BATCH_JOBS})'
+        )
+        parser.add_argument(
+            '--pool-size',
+            type=int,
+            help='Maximum HTTP connections in the shared pool (default: jobs x concurrency)'
+        )
+    
+    def hello_command(self, name: str) -> None:
+        """Execute the hello command."""
+        print(f"Hello, {name}!")
+    
+    def list_command(self, items: List[str]) -> None:
+        """Execute the list command."""
+        print("Items:")
+        for i, item in enumerate(items, 1):
+            print(f"  {i}. {item}")
+    
+    def config_command(self, show: bool) -> None:
+        """Execute the config command."""
+        if show:
+            print("Configuration:")
+            print("  Version: 1.0.0")
+            print("  Project: VIB3")
+            print("  Type: Command Line Application")
+        else:
+            print("Use --show to display configuration")
+    
+    def upload_command(self, file: str, bucket: str, key: Optional[str], region: str,
+                       part_size: Optional[int] = None,
+                       concurrency: int = DEFAULT_CONCURRENCY,
+                       max_bandwidth: Optional[int] = None,
+                       resume: bool = False,
+                       dedup: bool = False,
+                       checksum: Optional[str] = None,
+                       faststart: bool = False,
+                       follow: bool = False,
+                       follow_idle: float = DEFAULT_FOLLOW_IDLE,
+                       chunked: bool = False,
+                       replicate: Optional[str] = None) -> None:
+        """Execute the upload command."""
+        if file == '-':
+            if concurrency == AUTO_CONCURRENCY:
+                raise ValueError("--concurrency auto cannot be used when uploading from stdin")
+            if faststart:
+                raise ValueError("--faststart needs a seekable file, not stdin")
+            if replicate:
+                raise ValueError("--replicate needs a seekable file, not stdin")
+            self._upload_stdin(bucket, key, region, part_size, concurrency, max_bandwidth)
+            return
+        
+        if not os.path.exists(file):
+            raise FileNotFoundError(f"File not found: {file}")
+        
+        if not os.path.isfile(file):
+            raise ValueError(f"Not a file: {file}")
+        
+        # Use filename as key if not specified
+        if key is None:
+            key = os.path.basename(file)
+        
+        if follow:
+            if (resume or dedup or checksum or faststart or replicate or
+                    concurrency == AUTO_CONCURRENCY):
+                raise ValueError("--follow cannot be combined with --resume, --dedup, --checksum, "
+                                 "--faststart, --replicate or --concurrency auto")
+            self._upload_follow(file, bucket, key, region, part_size, concurrency,
+                                max_bandwidth, follow_idle)
+            return
+        
+        if faststart:
+            staged = self._stage_faststart(file, resume)
+            if staged:
+                try:
+                    self.upload_command(staged, bucket, key, region, part_size=part_size,
+                                        concurrency=concurrency, max_bandwidth=max_bandwidth,
+                                        resume=resume, dedup=dedup, checksum=checksum,
+                                        chunked=chunked, replicate=replicate)
+                finally:
+                    # Keep the remuxed copy while an interrupted upload of it can be resumed
+                    if not os.path.exists(UploadJournal.path_for(staged)):
+                        os.remove(staged)
+                    if os.path.exists(staged + CHECKSUM_SUFFIX):
+                        os.replace(staged + CHECKSUM_SUFFIX, file + CHECKSUM_SUFFIX)
+                return
+        
+        if chunked:
+            if resume or dedup or checksum or concurrency == AUTO_CONCURRENCY:
+                raise ValueError("--chunked cannot be combined with --resume, --dedup, --checksum "
+                                 "or --concurrency auto")
+            if replicate:
+                raise ValueError("--chunked cannot be combined with --replicate")
+            self._upload_chunked(file, bucket, key, region, concurrency)
+            return
+        
+        if replicate:
+            if resume or dedup or checksum or concurrency == AUTO_CONCURRENCY:
+                raise ValueError("--replicate cannot be combined with --resume, --dedup, --checksum "
+                                 "or --concurrency auto")
+            self._upload_replicated(file, bucket, key, region, replicate, part_size,
+                                    concurrency, max_bandwidth)
+            return
+        
+        # Initialize S3 client
+        config = {}
+        if checksum:
+            # The signed checksum header already covers the body, so skip
+            # botocore's SHA-256 payload signing, which is a second pass
+            config['s3'] = {'payload_signing_enabled': False}
+        if concurrency == AUTO_CONCURRENCY:
+            config['max_pool_connections'] = AdaptiveConcurrency.MAXIMUM
+        if config:
+            s3_client = boto3.client('s3', region_name=region, config=Config(**config))
+        else:
+            s3_client = boto3.client('s3', region_name=region)
+        
+        try:
+            # Get file size for progress tracking
+            file_size = os.path.getsize(file)
+            extra_args = {}
+            if dedup:
+                index = DedupIndex()
+                hashes = HashCache()
+                try:
+                    digest = hashes.digest(file)
+                    message = self._dedup_object(s3_client, index, digest, file_size, bucket, key)
+                finally:
+                    index.close()
+                    hashes.close()
+                if message:
+                    print(message)
+                    return
+                extra_args['Metadata'] = {'sha256': digest}
+            
+            print(f"Uploading {file} ({file_size:,} bytes) to s3://{bucket}/{key}")
+            
+            progress = ProgressReporter(file_size)
+            upload_callback = progress.update
+            
+            has_journal = resume and os.path.exists(UploadJournal.path_for(file))
+            if (file_size >= MULTIPART_THRESHOLD or has_journal or
+                    (part_size and file_size > part_size)):
+                # Large files go through the parallel multipart engine
+                controller = None
+                if concurrency == AUTO_CONCURRENCY:
+                    controller = AdaptiveConcurrency(on_change=progress.set_concurrency)
+                    concurrency = controller.maximum
+                uploader = MultipartUploader(
+                    s3_client,
+                    bucket,
+                    key,
+                    part_size=part_size,
+                    concurrency=concurrency,
+                    max_bandwidth=max_bandwidth,
+                    callback=upload_callback,
+                    extra_args=extra_args,
+                    checksum=checksum,
+                    controller=controller
+                )
+                try:
+                    stats = uploader.upload(file, resume=resume)
+                except KeyboardInterrupt:
+                    if uploader.journal:
+                        print(f"\nUpload interrupted. Resume with: vib3 upload {file} {bucket} "
+                              f"--key {key} --resume")
+                    raise
+                progress.finish()
+                print(f"\nSuccessfully uploaded to s3://{bucket}/{key}")
+                if stats['resumed_parts']:
+                    print(f"Resumed upload: {stats['resumed_parts']} of {stats['parts']} parts "
+                          f"were already uploaded")
+                print(f"Sent {stats['parts'] - stats['resumed_parts']} parts of "
+                      f"{stats['part_size']:,} bytes in {stats['seconds']:.1f}s "
+                      f"({format_rate(stats['sent'], stats['seconds'])})")
+                if controller:
+                    print(f"Adaptive concurrency finished at {controller.limit} parts in flight")
+                # A resumed upload keeps the algorithm it was started with
+                checksum = uploader.checksum
+                if checksum:
+                    record = {'algorithm': checksum, 'checksum': stats['checksum'],
+                              'part_size': stats['part_size'], 'parts': stats['part_checksums']}
+            elif checksum:
+                record = {'algorithm': checksum,
+                          'checksum': self._put_checksummed(s3_client, file, bucket, key, checksum,
+                                                            extra_args, max_bandwidth, upload_callback)}
+                progress.finish()
+                print(f"\nSuccessfully uploaded to s3://{bucket}/{key}")
+            else:
+                # Upload file with progress callback
+                extra = {}
+                if max_bandwidth:
+                    extra['Config'] = TransferConfig(max_bandwidth=max_bandwidth)
+                if extra_args:
+                    extra['ExtraArgs'] = extra_args
+                s3_client.upload_file(
+                    file, 
+                    bucket, 
+                    key,
+                    Callback=upload_callback,
+                    **extra
+                )
+                
+                progress.finish()
+                print(f"\nSuccessfully uploaded to s3://{bucket}/{key}")
+            
+            if checksum:
+                record.update({'bucket': bucket, 'key': key, 'size': file_size})
+                path = write_checksum_manifest(file, record)
+                print(f"{CHECKSUM_ALGORITHMS[checksum]} {record['checksum']} recorded in {path}")
+            
+            if dedup:
+                index = DedupIndex()
+                index.add(digest, bucket, key)
+                index.close()
+            
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            error_code = e.response.get('Error', {}).get('Code', 'Unknown')
+            if error_code == 'NoSuchBucket':
+                raise RuntimeError(f"Bucket '{bucket}' does not exist")
+            elif error_code == 'AccessDenied':
+                raise RuntimeError(f"Access denied to bucket '{bucket}'")
+            else:
+                raise RuntimeError(f"S3 error: {str(e)}")
+    
+    def download_command(self, bucket: str, key: str, output: Optional[str], region: str,
+                         part_size: Optional[int] = None,
+                         concurrency: int = DEFAULT_CONCURRENCY,
+                         resume: bool = False,
+                         verify: bool = False,
+                         member: Optional[str] = None,
+                         cache: bool = False,
+                         cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """Execute the download command."""
+        if cache and (member or resume or verify or output == '-' or
+                      concurrency == AUTO_CONCURRENCY):
+            raise ValueError("--cache cannot be combined with --member, --resume, --verify, "
+                             "--output - or --concurrency auto")
+        if member:
+            self._download_member(bucket, key, member, output, region)
+            return
+        
+        if output == '-':
+            if concurrency == AUTO_CONCURRENCY:
+                raise ValueError("--concurrency auto cannot be used when downloading to stdout")
+            self._download_stdout(bucket, key, region, part_size, concurrency)
+            return
+        
+        # Use key basename as output if not specified
+        if output is None:
+            output = os.path.basename(key)
+        
+        has_journal = resume and os.path.exists(DownloadJournal.path_for(output))
+        
+        # Check if output file already exists
+        if os.path.exists(output) and not has_journal:
+            response = input(f"File '{output}' already exists. Overwrite? (y/N): ")
+            if response.lower() != 'y':
+                print("Download cancelled.")
+                return
+        
+        if cache:
+            self._download_cached(bucket, key, output, region, part_size, concurrency, cache_size)
+            return
+        
+        # Initialize S3 client
+        auto = concurrency == AUTO_CONCURRENCY
+        s3_client = self._s3_client(region, AdaptiveConcurrency.MAXIMUM if auto else None)
+        
+        try:
+            # Get object metadata to determine file size
+            if verify:
+                response = s3_client.head_object(Bucket=bucket, Key=key, ChecksumMode='ENABLED')
+                algorithm, expected = stored_checksum(response)
+                if not algorithm:
+                    raise RuntimeError(f"s3://{bucket}/{key} has no stored checksum to verify against; "
+                                       f"upload it with --checksum")
+                part_size = self._checksum_part_size(s3_client, bucket, key, response, expected)
+            else:
+                response = s3_client.head_object(Bucket=bucket, Key=key)
+                algorithm = None
+            file_size = response['ContentLength']
+            print(f"Downloading s3://{bucket}/{key} ({file_size:,} bytes) to {output}")
+            
+            progress = ProgressReporter(file_size)
+            download_callback = progress.update
+            
+            if (verify or file_size >= MULTIPART_THRESHOLD or has_journal or
+                    (part_size and file_size > part_size)):
+                # Large objects are fetched as parallel byte ranges
+                controller = None
+                if auto:
+                    controller = AdaptiveConcurrency(on_change=progress.set_concurrency)
+                    concurrency = controller.maximum
+                downloader = RangedDownloader(
+                    s3_client,
+                    bucket,
+                    key,
+                    part_size=part_size,
+                    concurrency=concurrency,
+                    callback=download_callback,
+                    checksum=algorithm,
+                    controller=controller
+                )
+                try:
+                    stats = downloader.download(output, file_size, response.get('ETag'), resume=resume)
+                except KeyboardInterrupt:
+                    print(f"\nDownload interrupted. Resume with: vib3 download {bucket} {key} "
+                          f"--output {output} --resume")
+                    raise
+                progress.finish()
+                if verify:
+                    self._verify_download(output, bucket, key, algorithm, expected, stats)
+                print(f"\nSuccessfully downloaded to {output}")
+                if stats['resumed_parts']:
+                    print(f"Resumed download: {stats['resumed_parts']} of {stats['parts']} ranges "
+                          f"were already downloaded")
+                print(f"Fetched {stats['parts'] - stats['resumed_parts']} ranges of "
+                      f"{stats['part_size']:,} bytes in {stats['seconds']:.1f}s "
+                      f"({format_rate(stats['received'], stats['seconds'])})")
+                if controller:
+                    print(f"Adaptive concurrency finished at {controller.limit} ranges in flight")
+                return
+            
+            # Download file with progress callback
+            s3_client.download_file(
+                bucket,
+                key,
+                output,
+                Callback=download_callback
+            )
+            
+            progress.finish()
+            print(f"\nSuccessfully downloaded to {output}")
+            
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            error_code = e.response.get('Error', {}).get('Code', 'Unknown')
+            if error_code == 'NoSuchBucket':
+                raise RuntimeError(f"Bucket '{bucket}' does not exist")
+            elif error_code == 'NoSuchKey':
+                raise RuntimeError(f"Key '{key}' does not exist in bucket '{bucket}'")
+            elif error_code == 'PreconditionFailed':
+                raise RuntimeError(f"s3://{bucket}/{key} changed during download; run the download again")
+            elif error_code == 'AccessDenied':
+                raise RuntimeError(f"Access denied to s3://{bucket}/{key}")
+            else:
+                raise RuntimeError(f"S3 error: {str(e)}")
+    
+    def _download_cached(self, bucket: str, key: str, output: str, region: str,
+                         part_size: Optional[int], concurrency: int, cache_size: int) -> None:
+        """
+        Download through the local object cache.
+        
+        A cached copy is revalidated with a GET carrying If-None-Match, so an
+        unchanged object costs one request with no body. When the object did
+        change, that same response already carries the new body, which is
+        used directly for small objects.
+        """
+        s3_client = self._s3_client(region)
+        cache = ObjectCache(max_size=cache_size)
+        try:
+            entry = cache.lookup(bucket, key)
+            response = None
+            if entry:
+                try:
+                    response = s3_client.get_object(Bucket=bucket, Key=key, IfNoneMatch=entry['etag'])
+                except ClientError as e:
+                    if e.response.get('Error', {}).get('Code') not in ('304', 'NotModified'):
+                        raise
+                    method = cache.serve(bucket, key, entry, output)
+                    if method:
+                        print(f"Served s3://{bucket}/{key} ({entry['size']:,} bytes) from cache "
+                              f"to {output} ({method})")
+                        return
+            if response is None:
+                response = s3_client.head_object(Bucket=bucket, Key=key)
+            
+            file_size = response['ContentLength']
+            etag = response.get('ETag')
+            # An object larger than the whole cache would be evicted as soon as it was added
+            cacheable = file_size <= cache.max_size
+            print(f"Downloading s3://{bucket}/{key} ({file_size:,} bytes) to {output}" +
+                  (" via cache" if cacheable else " (larger than the cache; not cached)"))
+            progress = ProgressReporter(file_size)
+            temp = cache.temp_path()
+            try:
+                if file_size >= MULTIPART_THRESHOLD or (part_size and file_size > part_size):
+                    if 'Body' in response:
+                        response['Body'].close()
+                    downloader = RangedDownloader(s3_client, bucket, key, part_size=part_size,
+                                                  concurrency=concurrency, callback=progress.update)
+                    downloader.download(temp, file_size, etag)
+                else:
+                    if 'Body' not in response:
+                        response = s3_client.get_object(Bucket=bucket, Key=key, IfMatch=etag)
+                    with open(temp, 'wb') as f:
+                        for chunk in response['Body'].iter_chunks(1024 * 1024):
+                            f.write(chunk)
+                            progress.update(len(chunk))
+                if cacheable:
+                    entry = cache.add(bucket, key, etag, temp, file_size)
+                else:
+                    shutil.move(temp, output)
+            finally:
+                if os.path.exists(temp):
+                    os.remove(temp)
+            progress.finish()
+            if not cacheable:
+                print(f"\nSuccessfully downloaded to {output}")
+                return
+            method = cache.serve(bucket, key, entry, output, hit=False)
+            if method is None:
+                raise RuntimeError(f"The cached copy of s3://{bucket}/{key} was evicted before it "
+                                   f"could be served; run the download again")
+            print(f"\nSuccessfully downloaded to {output} ({method} of the cached copy)")
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'PreconditionFailed':
+                raise RuntimeError(f"s3://{bucket}/{key} changed during download; run the download again")
+            raise s3_error(e, bucket, key)
+        finally:
+            cache.close()
     
-    def _create_parser(self) -> argparse.ArgumentParser:
-        """Create and configure the argument parser."""
-        parser = argparse.ArgumentParser(
-            prog='vib3',
-            description='VIB3 Command Line Interface',
-            epilog='For more information, visit the project documentation.'
-        )
+    def cache_command(self, action: str, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """Execute the cache command."""
+        cache = ObjectCache(max_size=max_size)
+        try:
+            if action == 'stats':
+                stats = cache.stats()
+                lookups = stats['hits'] + stats['misses']
+                print(f"Cache: {cache.directory}")
+                print(f"Objects: {stats['objects']:,}")
+                print(f"Size: {stats['size']:,} of {stats['max_size']:,} bytes")
+                print(f"Hits: {stats['hits']:,}  Misses: {stats['misses']:,}" +
+                      (f"  ({stats['hits'] / lookups:.0%} hit rate)" if lookups else ''))
+            else:
+                removed, freed = cache.evict(max_size)
+                # Leftovers of downloads that were killed mid-transfer
+                tmp = os.path.join(cache.directory, 'tmp')
+                for name in os.listdir(tmp):
+                    path = os.path.join(tmp, name)
+                    if os.path.getmtime(path) < time.time() - 3600:
+                        os.remove(path)
+                print(f"Pruned {removed:,} objects ({freed:,} bytes); "
+                      f"cache is now {cache.stats()['size']:,} bytes")
+        finally:
+            cache.close()
+    
+    @staticmethod
+    def _checksum_part_size(s3_client, bucket: str, key: str, head: dict,
+                            expected: str) -> Optional[int]:
+        """
+        Return the range size that lines up with the checksummed parts of an object.
         
-        parser.add_argument(
-            '--version',
-            action='version',
-            version='%(prog)s 1.0.0'
-        )
+        A multipart object's checksum ("<checksum>-N") covers its parts, so
+        ranges must match the part boundaries; every part but the last has the
+        size of part 1. A whole-object checksum needs the bytes in order, so
+        the object is fetched as one range.
+        """
+        if '-' not in expected:
+            return max(head['ContentLength'], 1)
+        part = s3_client.head_object(Bucket=bucket, Key=key, PartNumber=1)
+        part_size = part['ContentLength']
+        if -(-head['ContentLength'] // part_size) != int(expected.rsplit('-', 1)[1]):
+            raise RuntimeError(f"s3://{bucket}/{key} was uploaded in parts of different sizes; "
+                               f"its checksum cannot be verified by ranged download")
+        return part_size
+    
+    @staticmethod
+    def _verify_download(output: str, bucket: str, key: str, algorithm: str,
+                         expected: str, stats: dict) -> None:
+        """Compare the checksums computed while downloading with the one S3 stored."""
+        checksums = stats['checksums']
+        if '-' in expected:
+            actual = composite_checksum(algorithm, checksums)
+        else:
+            actual = checksums[0]
+        if actual != expected:
+            os.remove(output)
+            raise RuntimeError(f"Checksum mismatch for s3://{bucket}/{key}: expected {expected}, "
+                               f"got {actual}; the download was removed")
+        record = {'bucket': bucket, 'key': key, 'size': stats['size'], 'algorithm': algorithm,
+                  'checksum': actual}
+        if '-' in expected:
+            record.update({'part_size': stats['part_size'], 'parts': checksums})
+        path = write_checksum_manifest(output, record)
+        print(f"Verified {CHECKSUM_ALGORITHMS[algorithm]} {actual} (recorded in {path})")
+    
+    def _upload_stdin(self, bucket: str, key: Optional[str], region: str,
+                      part_size: Optional[int], concurrency: int,
+                      max_bandwidth: Optional[int]) -> None:
+        """Upload standard input as a multipart stream."""
+        if not key:
+            raise ValueError("--key is required when uploading from stdin")
         
-        subparsers = parser.add_subparsers(
-            dest='command',
-            help='Available commands'
+        s3_client = boto3.client('s3', region_name=region)
+        progress = ProgressReporter(stream=sys.stderr)
+        uploader = StreamUploader(
+            s3_client,
+            bucket,
+            key,
+            part_size=part_size,
+            concurrency=concurrency,
+            callback=progress.update,
+            limiter=BandwidthLimiter(max_bandwidth) if max_bandwidth else None
         )
+        print(f"Uploading stdin to s3://{bucket}/{key}", file=sys.stderr)
+        try:
+            stats = uploader.upload(sys.stdin.buffer)
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, bucket)
+        progress.finish()
+        print(f"\nSuccessfully uploaded {stats['size']:,} bytes in {stats['parts']} parts to "
+              f"s3://{bucket}/{key} ({format_rate(stats['size'], stats['seconds'])})",
+              file=sys.stderr)
+    
+    def _upload_chunked(self, file: str, bucket: str, key: str, region: str,
+                        concurrency: int) -> None:
+        """Upload a file into the content-defined chunk store."""
+        s3_client = boto3.client('s3', region_name=region)
+        file_size = os.path.getsize(file)
+        print(f"Uploading {file} ({file_size:,} bytes) as chunks to s3://{bucket}/{key}")
+        progress = ProgressReporter(file_size)
+        store = ChunkStore(s3_client, bucket, concurrency=concurrency, callback=progress.update)
+        try:
+            stats = store.put(file, key)
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, bucket, key)
+        progress.finish()
+        print(f"\nSuccessfully uploaded to s3://{bucket}/{key}{CHUNK_MANIFEST_SUFFIX}")
+        print(f"Sent {stats['new_chunks']} of {stats['chunks']} chunks "
+              f"({stats['sent']:,} of {stats['size']:,} bytes) in {stats['seconds']:.1f}s")
+    
+    def _upload_replicated(self, file: str, bucket: str, key: str, region: str,
+                           replicate: str, part_size: Optional[int], concurrency: int,
+                           max_bandwidth: Optional[int]) -> None:
+        """Upload a file to the primary bucket and every replica target in one pass."""
+        targets = [ReplicaTarget('s3', self._s3_client(region, concurrency), bucket)]
+        for spec in replicate.split(','):
+            spec = spec.strip()
+            if spec:
+                targets.append(self._replica_target(spec, bucket, region, concurrency))
+        seen = set()
+        for target in targets:
+            if (target.name, target.bucket) in seen:
+                raise ValueError(f"Replication target listed twice: {target.name}")
+            seen.add((target.name, target.bucket))
         
-        # Add 'hello' command
-        hello_parser = subparsers.add_parser(
-            'hello',
-            help='Print a greeting message'
-        )
-        hello_parser.add_argument(
-            'name',
-            nargs='?',
-            default='World',
-            help='Name to greet (default: World)'
+        file_size = os.path.getsize(file)
+        names = ', '.join(f"{target.name} ({target.bucket})" for target in targets)
+        print(f"Uploading {file} ({file_size:,} bytes) as {key} to {len(targets)} targets: {names}")
+        progress = ProgressReporter(file_size * len(targets))
+        uploader = FanoutUploader(
+            targets,
+            key,
+            part_size=part_size,
+            concurrency=concurrency,
+            callback=progress.update,
+            limiter=BandwidthLimiter(max_bandwidth) if max_bandwidth else None
         )
+        stats = uploader.upload(file)
+        progress.finish()
+        print()
+        failed = []
+        for target in targets:
+            if target.error is None:
+                print(f"Successfully uploaded to {target.name}: {target.bucket}/{key}")
+            elif isinstance(target.error, NoCredentialsError):
+                failed.append(f"{target.name}: credentials not found")
+            elif isinstance(target.error, ClientError):
+                failed.append(f"{target.name}: {s3_error(target.error, target.bucket, key)}")
+            else:
+                failed.append(f"{target.name}: {target.error}")
+        print(f"Read {stats['size']:,} bytes once and sent them to {len(targets)} targets "
+              f"in {stats['seconds']:.1f}s")
+        if failed:
+            raise RuntimeError("Replication failed for " + '; '.join(failed))
+    
+    def _replica_target(self, spec: str, bucket: str, region: str,
+                        concurrency: int) -> ReplicaTarget:
+        """
+        Build a replica target from `aws[:region]`, `do[:region]` or an endpoint URL.
         
-        # Add 'list' command
-        list_parser = subparsers.add_parser(
-            'list',
-            help='List items'
-        )
-        list_parser.add_argument(
-            '--items',
-            nargs='+',
-            default=['item1', 'item2', 'item3'],
-            help='Items to list'
-        )
+        A trailing `=bucket` sends the replica to a different bucket.
+        """
+        name, sep, target_bucket = spec.rpartition('=')
+        if not sep:
+            name, target_bucket = spec, bucket
+        config = Config(max_pool_connections=concurrency)
+        kind, _, target_region = name.partition(':')
+        if name.startswith(('http://', 'https://')):
+            s3_client = boto3.client('s3', region_name=region, endpoint_url=name, config=config)
+        elif kind == 'aws':
+            s3_client = boto3.client('s3', region_name=target_region or region, config=config)
+        elif kind == 'do':
+            access_key = os.environ.get('DO_SPACES_KEY')
+            secret_key = os.environ.get('DO_SPACES_SECRET')
+            if not access_key or not secret_key:
+                raise ValueError("DigitalOcean Spaces replication needs DO_SPACES_KEY and "
+                                 "DO_SPACES_SECRET")
+            endpoint = os.environ.get('DO_SPACES_ENDPOINT')
+            if target_region or not endpoint:
+                endpoint = DO_SPACES_ENDPOINT.format(region=target_region or DEFAULT_DO_SPACES_REGION)
+            s3_client = boto3.client('s3', region_name=target_region or DEFAULT_DO_SPACES_REGION,
+                                     endpoint_url=endpoint, aws_access_key_id=access_key,
+                                     aws_secret_access_key=secret_key, config=config)
+        else:
+            raise ValueError(f"Unknown replication target '{name}' "
+                             f"(use aws[:region], do[:region] or an endpoint URL)")
+        return ReplicaTarget(name, s3_client, target_bucket)
+    
+    def ls_command(self, target: str, region: str, parallel: int = 1,
+                   alphabet: str = DEFAULT_SHARD_ALPHABET, depth: int = 1) -> None:
+        """
+        Execute the ls command: stream every object under a prefix as NDJSON.
         
-        # Add 'config' command
-        config_parser = subparsers.add_parser(
-            'config',
-            help='Show configuration'
-        )
-        config_parser.add_argument(
-            '--show',
-            action='store_true',
-            help='Show current configuration'
-        )
+        Each page is written as soon as it arrives. With `parallel` > 1 the
+        keyspace is cut into slices by `shard_ranges` and the slices are
+        listed concurrently, so lines are grouped by slice rather than sorted.
+        """
+        if target.startswith('s3://'):
+            bucket, prefix = parse_s3_url(target)
+        else:
+            bucket, prefix = target, ''
+        if parallel < 1:
+            raise ValueError("--parallel must be at least 1")
+        if depth < 1 or not alphabet:
+            raise ValueError("--shards needs at least one character and --shard-depth at least 1")
         
-        # Add 'upload' command
-        upload_parser = subparsers.add_parser(
-            'upload',
-            help='Upload file to S3'
-        )
-        upload_parser.add_argument(
-            'file',
-            help='Path to file to upload'
-        )
-        upload_parser.add_argument(
-            'bucket',
-            help='S3 bucket name'
-        )
-        upload_parser.add_argument(
-            '--key',
-            help='S3 key (defaults to filename)'
-        )
-        upload_parser.add_argument(
-            '--region',
-            default='us-east-1',
-            help='AWS region (default: us-east-1)'
-        )
+        s3_client = self._s3_client(region, parallel if parallel > 1 else None)
+        lock = threading.Lock()
+        totals = {'objects': 0, 'bytes': 0}
+        started = time.monotonic()
         
-        # Add 'download' command
-        download_parser = subparsers.add_parser(
-            'download',
-            help='Download file from S3'
-        )
-        download_parser.add_argument(
-            'bucket',
-            help='S3 bucket name'
-        )
-        download_parser.add_argument(
-            'key',
-            help='S3 key (file path in bucket)'
-        )
-        download_parser.add_argument(
-            '--output',
-            help='Output file path (defaults to key basename)'
-        )
-        download_parser.add_argument(
-            '--region',
-            default='us-east-1',
-            help='AWS region (default: us-east-1)'
+        def emit(objects):
+            lines = ''.join(json.dumps({
+                'key': obj['Key'],
+                'size': obj['Size'],
+                'last_modified': obj['LastModified'].isoformat(),
+                'etag': obj.get('ETag'),
+                'storage_class': obj.get('StorageClass'),
+            }) + '\n' for obj in objects)
+            with lock:
+                sys.stdout.write(lines)
+                sys.stdout.flush()
+                totals['objects'] += len(objects)
+                totals['bytes'] += sum(obj['Size'] for obj in objects)
+        
+        def list_slice(start_after, until):
+            for objects in list_pages(s3_client, bucket, prefix, start_after, until):
+                emit(objects)
+        
+        try:
+            if parallel == 1:
+                list_slice(None, None)
+            else:
+                with ThreadPoolExecutor(max_workers=parallel) as executor:
+                    futures = [executor.submit(list_slice, start_after, until)
+                               for start_after, until in shard_ranges(prefix, alphabet, depth)]
+                    for future in as_completed(futures):
+                        future.result()
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, bucket)
+        print(f"Listed {totals['objects']:,} objects ({totals['bytes']:,} bytes) "
+              f"in {time.monotonic() - started:.1f}s", file=sys.stderr)
+    
+    def catalog_command(self, action: str, target: str, region: str, parallel: int = 1,
+                        alphabet: str = DEFAULT_SHARD_ALPHABET, depth: int = 1,
+                        min_size: Optional[int] = None, max_size: Optional[int] = None,
+                        order: str = 'key', limit: Optional[int] = None,
+                        group_by: Optional[int] = None, sql: Optional[str] = None) -> None:
+        """Execute the catalog command."""
+        if target.startswith('s3://'):
+            bucket, prefix = parse_s3_url(target)
+        else:
+            bucket, prefix = target, ''
+        catalog = Catalog()
+        try:
+            if action == 'query':
+                self._query_catalog(catalog, bucket, prefix, min_size, max_size, order, limit,
+                                    group_by, sql)
+                return
+            
+            if parallel < 1:
+                raise ValueError("--parallel must be at least 1")
+            if action == 'build':
+                if depth < 1 or not alphabet:
+                    raise ValueError("--shards needs at least one character and --shard-depth at least 1")
+                ranges = shard_ranges(prefix, alphabet, depth) if parallel > 1 else [(None, None)]
+                shards = catalog.start_build(bucket, prefix, ranges)
+            else:
+                shards = catalog.shards(bucket, prefix)
+                if not shards:
+                    raise ValueError(f"No catalog for s3://{bucket}/{prefix}; run vib3 catalog build first")
+            
+            s3_client = self._s3_client(region, parallel if parallel > 1 else None)
+            started = time.monotonic()
+            totals = {'objects': 0, 'removed': 0}
+            lock = threading.Lock()
+            
+            def index(shard):
+                for objects in list_pages(s3_client, bucket, prefix, shard['marker'], shard['upper']):
+                    catalog.record_page(shard, objects)
+                    with lock:
+                        totals['objects'] += len(objects)
+                removed = catalog.finish_shard(shard)
+                with lock:
+                    totals['removed'] += removed
+            
+            print(f"Cataloging s3://{bucket}/{prefix} in {len(shards)} slices")
+            try:
+                with ThreadPoolExecutor(max_workers=parallel) as executor:
+                    for future in as_completed([executor.submit(index, shard) for shard in shards]):
+                        future.result()
+            except NoCredentialsError:
+                raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+            except ClientError as e:
+                raise s3_error(e, bucket)
+            print(f"Indexed {totals['objects']:,} objects ({totals['removed']:,} removed) "
+                  f"in {time.monotonic() - started:.1f}s")
+        finally:
+            catalog.close()
+    
+    def _query_catalog(self, catalog: Catalog, bucket: str, prefix: str,
+                       min_size: Optional[int], max_size: Optional[int], order: str,
+                       limit: Optional[int], group_by: Optional[int], sql: Optional[str]) -> None:
+        """Print catalog rows, per-group totals or SQL results as NDJSON."""
+        if sql:
+            rows = catalog.execute(sql)
+        else:
+            rows = catalog.query(bucket, prefix, min_size, max_size, order,
+                                 None if group_by else limit)
+        if group_by:
+            # Totals per leading path components, e.g. per creator for videos/<creator>/...
+            groups = {}
+            for row in rows:
+                group = '/'.join(row['key'][len(prefix):].split('/')[:group_by])
+                count, size = groups.get(group, (0, 0))
+                groups[group] = (count + 1, size + row['size'])
+            ordered = sorted(groups.items(), key=lambda item: -item[1][1] if order == 'size' else item[0])
+            rows = ({'prefix': prefix + group, 'objects': count, 'size': size}
+                    for group, (count, size) in ordered[:limit])
+        for row in rows:
+            sys.stdout.write(json.dumps(row) + '\n')
+    
+    def audit_command(self, directory: str, url: str, region: str,
+                      part_size: Optional[int] = None, jobs: Optional[int] = None,
+                      use_catalog: bool = False) -> None:
+        """
+        Execute the audit command: check a local tree against an S3 prefix by ETag.
+        
+        Remote ETags come from one listing (or the catalog). Sizes are
+        compared first; files whose ETag is not cached are hashed in a
+        process pool, and every computed ETag is cached by inode, mtime and
+        size so unchanged files are not read again on the next audit.
+        """
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+        bucket, prefix = parse_s3_url(url)
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        
+        try:
+            if use_catalog:
+                catalog = Catalog()
+                try:
+                    remote = {row['key'][len(prefix):]: (row['size'], row['etag'])
+                              for row in catalog.query(bucket, prefix)}
+                finally:
+                    catalog.close()
+            else:
+                s3_client = self._s3_client(region)
+                remote = {obj['Key'][len(prefix):]: (obj['Size'], obj['ETag'])
+                          for obj in list_objects(s3_client, bucket, prefix)}
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, bucket)
+        
+        started = time.monotonic()
+        counts = {'match': 0, 'mismatch': 0, 'missing': 0, 'unverifiable': 0}
+        cache = HashCache()
+        jobs_to_run = []
+        total = 0
+        local = set()
+        try:
+            for rel, path, stat in sorted(self._scan_directory(directory)):
+                local.add(rel)
+                total += stat.st_size
+                if rel not in remote:
+                    counts['missing'] += 1
+                    print(f"missing: {rel}")
+                    continue
+                size, etag = remote[rel]
+                etag = etag.strip('"')
+                if size != stat.st_size:
+                    counts['mismatch'] += 1
+                    print(f"mismatch: {rel} (local {stat.st_size:,} bytes, S3 {size:,} bytes)")
+                    continue
+                part_sizes = etag_part_sizes(size, etag, part_size)
+                if not part_sizes:
+                    counts['unverifiable'] += 1
+                    print(f"unverifiable: {rel} (no known part size gives ETag {etag}; try --part-size)")
+                    continue
+                cached = [cache.get(stat, etag_kind(candidate)) for candidate in part_sizes]
+                if etag in cached:
+                    counts['match'] += 1
+                elif None not in cached:
+                    counts['mismatch'] += 1
+                    print(f"mismatch: {rel} (local ETag {cached[0]}, S3 {etag})")
+                else:
+                    jobs_to_run.append((rel, path, stat, etag,
+                                        [c for c, hit in zip(part_sizes, cached) if hit is None]))
+            
+            hashed = sum(stat.st_size for _, _, stat, _, _ in jobs_to_run)
+            progress = ProgressReporter(hashed)
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {executor.submit(_audit_file, path, etag, candidates): (rel, stat, etag)
+                           for rel, path, stat, etag, candidates in jobs_to_run}
+                for future in as_completed(futures):
+                    rel, stat, etag = futures[future]
+                    results = future.result()
+                    for candidate, local_etag in results:
+                        cache.put(stat, etag_kind(candidate), local_etag)
+                    progress.update(stat.st_size)
+                    if results[-1][1] == etag:
+                        counts['match'] += 1
+                    else:
+                        counts['mismatch'] += 1
+                        progress.log(f"mismatch: {rel} (local ETag {results[0][1]}, S3 {etag})")
+            if jobs_to_run:
+                progress.finish()
+                if progress.tty:
+                    print()
+        finally:
+            cache.close()
+        
+        extra = sorted(set(remote) - local)
+        for rel in extra:
+            print(f"only in S3: {rel}")
+        elapsed = time.monotonic() - started
+        print(f"Audited {len(local):,} files ({total:,} bytes) in {elapsed:.1f}s: "
+              f"{counts['match']:,} match, {counts['mismatch']:,} mismatched, "
+              f"{counts['missing']:,} missing, {len(extra):,} only in S3, "
+              f"{counts['unverifiable']:,} unverifiable; hashed {hashed:,} bytes "
+              f"({format_rate(hashed, elapsed)})")
+        if counts['mismatch'] or counts['missing']:
+            raise RuntimeError(f"Audit failed: {counts['mismatch']} mismatched, "
+                               f"{counts['missing']} missing from s3://{bucket}/{prefix}")
+    
+    def get_command(self, bucket: str, key: str, output: Optional[str], region: str,
+                    concurrency: int = DEFAULT_CONCURRENCY) -> None:
+        """Execute the get command."""
+        if output is None:
+            output = os.path.basename(key)
+        
+        if os.path.exists(output):
+            response = input(f"File '{output}' already exists. Overwrite? (y/N): ")
+            if response.lower() != 'y':
+                print("Download cancelled.")
+                return
+        
+        s3_client = boto3.client('s3', region_name=region)
+        progress = ProgressReporter()
+        store = ChunkStore(s3_client, bucket, concurrency=concurrency, callback=progress.update)
+        try:
+            stats = store.get(key, output)
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, bucket, key)
+        progress.finish()
+        print(f"\nSuccessfully reassembled s3://{bucket}/{key} ({stats['size']:,} bytes) to {output}")
+        print(f"Fetched {stats['chunks']} chunks ({stats['received']:,} bytes) in "
+              f"{stats['seconds']:.1f}s ({format_rate(stats['received'], stats['seconds'])})")
+    
+    def _upload_follow(self, file: str, bucket: str, key: str, region: str,
+                       part_size: Optional[int], concurrency: int,
+                       max_bandwidth: Optional[int], idle: float) -> None:
+        """Upload a growing file as a multipart stream, following it until it is finished."""
+        s3_client = boto3.client('s3', region_name=region)
+        progress = ProgressReporter()
+        uploader = StreamUploader(
+            s3_client,
+            bucket,
+            key,
+            part_size=part_size,
+            concurrency=concurrency,
+            callback=progress.update,
+            limiter=BandwidthLimiter(max_bandwidth) if max_bandwidth else None
         )
+        print(f"Following {file} to s3://{bucket}/{key} (finishes after {idle:g}s without growth)")
+        reader = _FollowReader(file, idle=idle)
+        try:
+            stats = uploader.upload(reader)
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, bucket)
+        finally:
+            reader.close()
+        progress.finish()
+        print(f"\nSuccessfully uploaded {stats['size']:,} bytes in {stats['parts']} parts to "
+              f"s3://{bucket}/{key} ({format_rate(stats['size'], stats['seconds'])})")
+    
+    def _download_stdout(self, bucket: str, key: str, region: str,
+                         part_size: Optional[int], concurrency: int) -> None:
+        """Stream an object to standard output; messages go to stderr."""
+        s3_client = boto3.client('s3', region_name=region)
+        out = sys.stdout.buffer
+        try:
+            response = s3_client.head_object(Bucket=bucket, Key=key)
+            size = response['ContentLength']
+            print(f"Streaming s3://{bucket}/{key} ({size:,} bytes) to stdout", file=sys.stderr)
+            progress = ProgressReporter(size, stream=sys.stderr)
+            if size >= MULTIPART_THRESHOLD or (part_size and size > part_size):
+                downloader = RangedDownloader(s3_client, bucket, key, part_size=part_size,
+                                              concurrency=concurrency, callback=progress.update)
+                downloader.stream(out, size, response.get('ETag'))
+            else:
+                body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+                for chunk in body.iter_chunks(RangedDownloader.CHUNK_SIZE):
+                    out.write(chunk)
+                    progress.update(len(chunk))
+                out.flush()
+            progress.finish()
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, bucket, key)
+    
+    def batch_upload_command(self, files: List[str], bucket: str, region: str,
+                             from_file: Optional[str] = None,
+                             jobs: int = DEFAULT_BATCH_JOBS,
+                             pool_size: Optional[int] = None,
+                             part_size: Optional[int] = None,
+                             concurrency: int = DEFAULT_CONCURRENCY,
+                             max_bandwidth: Optional[int] = None,
+                             resume: bool = False,
+                             dedup: bool = False) -> None:
+        """Upload many files over one shared S3 client and connection pool."""
+        items = [{'file': file} for file in files]
+        items += self._read_batch_items(from_file, 'file')
+        if not items:
+            raise ValueError("No files to upload")
+        for item in items:
+            if not os.path.isfile(item['file']):
+                raise FileNotFoundError(f"File not found: {item['file']}")
+            item.setdefault('key', os.path.basename(item['file']))
+        
+        limiter = BandwidthLimiter(max_bandwidth) if max_bandwidth else None
+        progress = ProgressReporter(sum(os.path.getsize(item['file']) for item in items))
+        index = DedupIndex() if dedup else None
+        if dedup:
+            hashes = HashCache()
+            try:
+                digests = hashes.digest_files([item['file'] for item in items], jobs=jobs)
+            finally:
+                hashes.close()
+        
+        def upload(item):
+            size = os.path.getsize(item['file'])
+            extra_args = {}
+            if index:
+                digest = digests[item['file']]
+                if self._dedup_object(s3_client, index, digest, size, bucket, item['key']):
+                    progress.add_total(-size)
+                    return 0
+                extra_args['Metadata'] = {'sha256': digest}
+            self._put_file(s3_client, item['file'], bucket, item['key'], size,
+                           part_size=part_size, concurrency=concurrency,
+                           limiter=limiter, resume=resume, extra_args=extra_args,
+                           callback=progress.update)
+            if index:
+                index.add(digest, bucket, item['key'])
+            return size
+        
+        s3_client = self._batch_client(region, jobs, pool_size, concurrency)
+        print(f"Uploading {len(items):,} files to s3://{bucket}/ ({jobs} at a time)")
+        try:
+            self._run_batch(items, upload, lambda item: f"{item['file']} -> s3://{bucket}/{item['key']}",
+                            jobs, 'upload', bucket, progress)
+        finally:
+            if index:
+                index.close()
+    
+    def batch_download_command(self, bucket: str, keys: List[str], output: Optional[str],
+                               region: str, from_file: Optional[str] = None,
+                               jobs: int = DEFAULT_BATCH_JOBS,
+                               pool_size: Optional[int] = None,
+                               part_size: Optional[int] = None,
+                               concurrency: int = DEFAULT_CONCURRENCY,
+                               force: bool = False) -> None:
+        """Download many objects over one shared S3 client and connection pool."""
+        items = [{'key': key} for key in keys]
+        items += self._read_batch_items(from_file, 'key')
+        if not items:
+            raise ValueError("No keys to download")
+        
+        # Keys keep their path under the output directory so names cannot collide
+        directory = output or '.'
+        for item in items:
+            if 'output' not in item:
+                try:
+                    item['output'] = local_path(directory, item['key'])
+                except ValueError as e:
+                    # Reported as a failed download rather than written outside the directory
+                    item['output'], item['error'] = os.path.join(directory, item['key']), e
+        
+        if not force:
+            pending = []
+            for item in items:
+                if 'error' not in item and os.path.exists(item['output']):
+                    print(f"Skipping {item['output']} (already exists; use --force to overwrite)")
+                else:
+                    pending.append(item)
+            items = pending
+        
+        progress = ProgressReporter()
+        
+        def download(item):
+            if 'error' in item:
+                raise item['error']
+            response = s3_client.head_object(Bucket=bucket, Key=item['key'])
+            size = response['ContentLength']
+            progress.add_total(size)
+            self._get_file(s3_client, bucket, item['key'], item['output'], size,
+                           response.get('ETag'), part_size=part_size, concurrency=concurrency,
+                           callback=progress.update)
+            return size
+        
+        s3_client = self._batch_client(region, jobs, pool_size, concurrency)
+        print(f"Downloading {len(items):,} objects from s3://{bucket}/ ({jobs} at a time)")
+        self._run_batch(items, download, lambda item: f"s3://{bucket}/{item['key']} -> {item['output']}",
+                        jobs, 'download', bucket, progress)
+    
+    def rm_command(self, bucket: str, keys: List[str], region: str,
+                   from_file: Optional[str] = None, prefix: Optional[str] = None,
+                   jobs: int = DEFAULT_BATCH_JOBS, dry_run: bool = False) -> None:
+        """Execute the rm command: delete keys in concurrent 1000-key batches."""
+        if not keys and not from_file and prefix is None:
+            raise ValueError("Give keys, --from-file or --prefix to choose what to delete")
+        if jobs < 1:
+            raise ValueError("Jobs must be at least 1")
+        s3_client = self._s3_client(region, max_pool_connections=jobs)
+        
+        def targets():
+            yield from keys
+            for item in self._read_batch_items(from_file, 'key'):
+                yield item['key']
+            if prefix is not None:
+                for obj in list_objects(s3_client, bucket, prefix):
+                    yield obj['Key']
+        
+        if dry_run:
+            count = 0
+            for key in targets():
+                print(f"(dry run) delete: s3://{bucket}/{key}")
+                count += 1
+            print(f"Would delete {count:,} objects")
+            return
+        
+        started = time.monotonic()
+        counts = {'deleted': 0}
+        
+        def report(deleted, errors):
+            counts['deleted'] += deleted
+            for error in errors:
+                print(f"Failed to delete s3://{bucket}/{error['Key']}: "
+                      f"{error.get('Code')} {error.get('Message', '')}".rstrip(), file=sys.stderr)
+        
+        try:
+            errors = self._delete_keys(s3_client, bucket, targets(), jobs=jobs, callback=report)
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, bucket)
+        print(f"Deleted {counts['deleted']:,} objects in {time.monotonic() - started:.1f}s")
+        if errors:
+            raise RuntimeError(f"{len(errors):,} of {counts['deleted'] + len(errors):,} deletes failed")
+    
+    def cp_command(self, source: str, destination: str, region: str,
+                   recursive: bool = False, jobs: int = DEFAULT_BATCH_JOBS,
+                   part_size: Optional[int] = None,
+                   concurrency: int = DEFAULT_CONCURRENCY,
+                   move: bool = False) -> None:
+        """Execute the cp and mv commands: copy objects server-side, then delete sources for mv."""
+        if not source.startswith('s3://') or not destination.startswith('s3://'):
+            raise ValueError("Copy source and destination must both be s3:// URLs")
+        source_bucket, source_prefix = parse_s3_url(source)
+        bucket, prefix = parse_s3_url(destination)
+        s3_client = self._batch_client(region, jobs, None, concurrency)
+        verb = 'move' if move else 'copy'
+        
+        try:
+            if recursive:
+                if source_prefix and not source_prefix.endswith('/'):
+                    source_prefix += '/'
+                if prefix and not prefix.endswith('/'):
+                    prefix += '/'
+                if (source_bucket, source_prefix) == (bucket, prefix):
+                    raise ValueError("Source and destination are the same prefix")
+                items = [{'key': obj['Key'], 'size': obj['Size'],
+                          'target': prefix + obj['Key'][len(source_prefix):]}
+                         for obj in list_objects(s3_client, source_bucket, source_prefix)]
+            else:
+                if not source_prefix:
+                    raise ValueError("Give a source key, or use --recursive to copy a prefix")
+                if not prefix or prefix.endswith('/'):
+                    prefix += os.path.basename(source_prefix)
+                if (source_bucket, source_prefix) == (bucket, prefix):
+                    raise ValueError("Source and destination are the same object")
+                items = [{'key': source_prefix, 'size': None, 'target': prefix}]
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, source_bucket)
+        if not items:
+            raise ValueError(f"No objects under s3://{source_bucket}/{source_prefix}")
         
-        # Add 'deploy' command
-        deploy_parser = subparsers.add_parser(
-            'deploy',
-            help='Deploy web application'
-        )
-        deploy_subparsers = deploy_parser.add_subparsers(
-            dest='deploy_command',
-            help='Deployment commands'
-        )
+        progress = ProgressReporter(sum(item['size'] or 0 for item in items) or None)
+        copier = MultipartCopier(s3_client, part_size=part_size, concurrency=concurrency,
+                                 callback=progress.update)
+        moved = []
         
-        # Deploy web subcommand
-        deploy_web_parser = deploy_subparsers.add_parser(
-            'web',
-            help='Deploy web application to cloud provider'
-        )
-        deploy_web_parser.add_argument(
-            'provider',
-            choices=['aws', 'oracle', 'digitalocean', 'local'],
-            help='Cloud provider to deploy to'
-        )
-        deploy_web_parser.add_argument(
-            '--env',
-            choices=['dev', 'staging', 'prod'],
-            default='dev',
-            help='Environment to deploy to (default: dev)'
-        )
-        deploy_web_parser.add_argument(
-            '--port',
-            type=int,
-            default=3000,
-            help='Port for local deployment (default: 3000)'
-        )
+        def copy(item):
+            size = copier.copy(source_bucket, item['key'], bucket, item['target'], size=item['size'])
+            if move:
+                moved.append(item['key'])
+            return size
         
-        # Deploy config subcommand
-        deploy_config_parser = deploy_subparsers.add_parser(
-            'config',
-            help='Manage deployment configurations'
-        )
-        deploy_config_parser.add_argument(
-            'action',
-            choices=['show', 'set', 'get'],
-            help='Configuration action'
-        )
-        deploy_config_parser.add_argument(
-            '--key',
-            help='Configuration key (for set/get actions)'
-        )
-        deploy_config_parser.add_argument(
-            '--value',
-            help='Configuration value (for set action)'
-        )
+        print(f"Copying {len(items):,} objects from s3://{source_bucket}/{source_prefix} "
+              f"to s3://{bucket}/{prefix} server-side ({jobs} at a time)")
+        try:
+            self._run_batch(items, copy,
+                            lambda item: f"s3://{source_bucket}/{item['key']} -> s3://{bucket}/{item['target']}",
+                            jobs, verb, source_bucket, progress)
+        finally:
+            # Only sources whose copy completed are deleted
+            if moved:
+                for error in self._delete_keys(s3_client, source_bucket, moved, jobs=jobs):
+                    print(f"Failed to delete s3://{source_bucket}/{error['Key']} after copying: "
+                          f"{error.get('Message', error.get('Code'))}", file=sys.stderr)
+    
+    def presign_command(self, bucket: str, keys: List[str], region: str,
+                        from_file: Optional[str] = None,
+                        expires: int = DEFAULT_PRESIGN_EXPIRES,
+                        margin: int = DEFAULT_PRESIGN_MARGIN,
+                        endpoint_url: Optional[str] = None,
+                        use_cache: bool = True) -> None:
+        """Execute the presign command: print presigned GET URLs as NDJSON."""
+        if not 1 <= expires <= MAX_PRESIGN_EXPIRES:
+            raise ValueError(f"--expires must be between 1 and {MAX_PRESIGN_EXPIRES} seconds")
+        if not 0 <= margin < expires:
+            raise ValueError("--margin must be at least 0 and less than --expires")
+        keys = keys + [item['key'] for item in self._read_batch_items(from_file, 'key')]
+        if not keys:
+            raise ValueError("No keys to presign")
+        try:
+            presigner = Presigner.from_session(region, endpoint_url)
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
         
-        # Deploy status subcommand
-        deploy_status_parser = deploy_subparsers.add_parser(
-            'status',
-            help='Check deployment status'
-        )
-        deploy_status_parser.add_argument(
-            '--provider',
-            choices=['aws', 'oracle', 'digitalocean', 'local'],
-            help='Cloud provider to check'
-        )
+        started = time.monotonic()
+        now = int(time.time())
+        signer = f"{presigner.access_key}|{region}|{endpoint_url or ''}"
+        expires_at = now + expires
+        if presigner.expiry is not None and presigner.expiry < expires_at:
+            expires_at = int(presigner.expiry)
+            print(f"Temporary credentials expire at {format_utc(expires_at)}; new URLs stop working then",
+                  file=sys.stderr)
+        cache = PresignCache() if use_cache else None
+        reused = 0
+        try:
+            for start in range(0, len(keys), PRESIGN_BATCH):
+                batch = keys[start:start + PRESIGN_BATCH]
+                found = cache.lookup(bucket, signer, batch, now + margin) if cache else {}
+                reused += len(found)
+                missing = [key for key in dict.fromkeys(batch) if key not in found]
+                if missing:
+                    issued = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+                    urls = presigner.sign(bucket, missing, expires, issued)
+                    entries = [(key, url, expires_at) for key, url in zip(missing, urls)]
+                    found.update((key, (url, expires_at)) for key, url in zip(missing, urls))
+                    if cache:
+                        cache.store(bucket, signer, entries)
+                sys.stdout.write(''.join(
+                    json.dumps({'key': key, 'url': found[key][0], 'expires': format_utc(found[key][1])}) + '\n'
+                    for key in batch))
+            if cache:
+                cache.prune(now)
+        finally:
+            if cache:
+                cache.close()
+        print(f"Presigned {len(keys):,} URLs ({reused:,} reused from cache) "
+              f"in {time.monotonic() - started:.1f}s", file=sys.stderr)
+    
+    def queue_command(self, args) -> None:
+        """Execute the queue command."""
+        if args.queue_command == 'add':
+            self._queue_add(args.files, args.bucket, key=args.key, lane=args.lane,
+                            from_file=args.from_file)
+        elif args.queue_command == 'run':
+            self._queue_run(args.region, workers=args.workers, drain=args.drain,
+                            visibility=args.visibility_timeout, max_attempts=args.max_attempts,
+                            part_size=args.part_size, concurrency=args.concurrency,
+                            pool_size=args.pool_size)
+        elif args.queue_command == 'status':
+            self._queue_status()
+        else:
+            print("Please specify a queue subcommand: add, run, or status")
+    
+    def _queue_add(self, files: List[str], bucket: str, key: Optional[str] = None,
+                   lane: str = DEFAULT_QUEUE_LANE, from_file: Optional[str] = None) -> None:
+        """Queue files for upload."""
+        items = [{'file': file} for file in files]
+        items += self._read_batch_items(from_file, 'file')
+        if not items:
+            raise ValueError("No files to queue")
+        if key:
+            if len(items) != 1:
+                raise ValueError("--key can only be used when queueing a single file")
+            items[0]['key'] = key
+        for item in items:
+            if not os.path.isfile(item['file']):
+                raise FileNotFoundError(f"File not found: {item['file']}")
+            item.setdefault('key', os.path.basename(item['file']))
         
-        return parser
+        # Runners may start from another directory
+        upload_queue = UploadQueue()
+        try:
+            added = upload_queue.add([(os.path.abspath(item['file']), bucket, item['key'], lane)
+                                      for item in items])
+        finally:
+            upload_queue.close()
+        print(f"Queued {added:,} files for s3://{bucket}/ in the {lane} lane" +
+              (f" ({len(items) - added:,} already queued)" if added < len(items) else ''))
     
-    def hello_command(self, name: str) -> None:
-        """Execute the hello command."""
-        print(f"Hello, {name}!")
+    def _queue_run(self, region: str, workers: int = DEFAULT_BATCH_JOBS, drain: bool = False,
+                   visibility: float = DEFAULT_VISIBILITY_TIMEOUT,
+                   max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                   part_size: Optional[int] = None,
+                   concurrency: int = DEFAULT_CONCURRENCY,
+                   pool_size: Optional[int] = None) -> None:
+        """
+        Upload queued files with a fixed pool of workers sharing one S3 client.
+        
+        Each worker claims one job at a time, so a burst of new jobs only
+        grows the queue, never the number of uploads in flight. Leases of
+        held jobs are renewed in the background; a job that fails is retried
+        with exponential backoff until `max_attempts`.
+        """
+        if workers < 1:
+            raise ValueError("Workers must be at least 1")
+        if visibility <= 0:
+            raise ValueError("--visibility-timeout must be positive")
+        if max_attempts < 1:
+            raise ValueError("--max-attempts must be at least 1")
+        
+        s3_client = self._batch_client(region, workers, pool_size, concurrency)
+        upload_queue = UploadQueue()
+        stop = threading.Event()
+        lock = threading.Lock()
+        held = {}
+        totals = {'uploaded': 0, 'skipped': 0, 'bytes': 0, 'retried': 0, 'failed': 0}
+        fatal = []
+        
+        def work():
+            while not stop.is_set():
+                job = upload_queue.claim(visibility)
+                if job is None:
+                    next_visible = upload_queue.next_visible()
+                    if next_visible is None and drain:
+                        return
+                    stop.wait(QUEUE_POLL_INTERVAL if next_visible is None else
+                              min(QUEUE_POLL_INTERVAL, max(0.05, next_visible - time.time())))
+                    continue
+                
+                with lock:
+                    held[job['id']] = job
+                target = f"{job['file']} -> s3://{job['bucket']}/{job['key']}"
+                try:
+                    sent = self._upload_queued(s3_client, job, part_size, concurrency)
+                except NoCredentialsError:
+                    upload_queue.release(job)
+                    fatal.append("AWS credentials not found. Please configure your AWS credentials.")
+                    stop.set()
+                except Exception as e:
+                    if isinstance(e, ClientError):
+                        e = s3_error(e, job['bucket'], job['key'])
+                    # Retrying cannot bring back a file that is gone
+                    delay = upload_queue.fail(job, str(e), 0 if isinstance(e, FileNotFoundError)
+                                              else max_attempts)
+                    if delay is False:
+                        # Another runner took the job over after our lease lapsed; it reports the outcome
+                        continue
+                    with lock:
+                        totals['failed' if delay is None else 'retried'] += 1
+                    if delay is None:
+                        print(f"Failed to upload {target} after {job['attempts']} attempts: {e}",
+                              file=sys.stderr)
+                    else:
+                        print(f"Retrying {target} in {delay:.0f}s "
+                              f"(attempt {job['attempts']} of {max_attempts}): {e}", file=sys.stderr)
+                else:
+                    upload_queue.complete(job)
+                    with lock:
+                        if sent is None:
+                            totals['skipped'] += 1
+                        else:
+                            totals['uploaded'] += 1
+                            totals['bytes'] += sent
+                    print(f"{'skip (already uploaded)' if sent is None else 'upload'}: {target}")
+                finally:
+                    with lock:
+                        held.pop(job['id'], None)
+        
+        def renew():
+            while not stop.wait(visibility / 3):
+                with lock:
+                    jobs = list(held.values())
+                for job in jobs:
+                    upload_queue.extend(job, visibility)
+        
+        started = time.monotonic()
+        threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+        renewer = threading.Thread(target=renew, daemon=True)
+        print(f"Running upload queue with {workers} workers" +
+              (" until it is drained" if drain else " (Ctrl-C to stop)"))
+        for thread in threads:
+            thread.start()
+        renewer.start()
+        try:
+            for thread in threads:
+                # Joining in slices keeps Ctrl-C deliverable
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            # Hand held jobs straight back; their multipart journals let the next run resume them
+            stop.set()
+            with lock:
+                for job in held.values():
+                    upload_queue.release(job)
+            raise
+        finally:
+            stop.set()
+            renewer.join()
+        upload_queue.close()
+        
+        elapsed = time.monotonic() - started
+        print(f"Uploaded {totals['uploaded']:,} files ({totals['bytes']:,} bytes) in {elapsed:.1f}s "
+              f"({format_rate(totals['bytes'], elapsed)}); {totals['skipped']:,} already uploaded, "
+              f"{totals['retried']:,} retries, {totals['failed']:,} failed")
+        if fatal:
+            raise RuntimeError(fatal[0])
+        if totals['failed']:
+            raise RuntimeError(f"{totals['failed']} uploads failed for good; see `vib3 queue status`")
     
-    def list_command(self, items: List[str]) -> None:
-        """Execute the list command."""
-        print("Items:")
-        for i, item in enumerate(items, 1):
-            print(f"  {i}. {item}")
+    def _upload_queued(self, s3_client, job: dict, part_size: Optional[int],
+                       concurrency: int) -> Optional[int]:
+        """Upload one claimed job; return the bytes sent, or None if it was already uploaded."""
+        size = os.path.getsize(job['file'])
+        # A runner may have died after finishing the upload but before recording it
+        if job['attempts'] > 1:
+            try:
+                head = s3_client.head_object(Bucket=job['bucket'], Key=job['key'])
+                if (head['ContentLength'] == size and
+                        head.get('Metadata', {}).get('vib3-job') == job['token']):
+                    return None
+            except ClientError as e:
+                if not is_not_found(e):
+                    raise
+        self._put_file(s3_client, job['file'], job['bucket'], job['key'], size,
+                       part_size=part_size, concurrency=concurrency, resume=True,
+                       extra_args={'Metadata': {'vib3-job': job['token']}})
+        return size
     
-    def config_command(self, show: bool) -> None:
-        """Execute the config command."""
-        if show:
-            print("Configuration:")
-            print("  Version: 1.0.0")
-            print("  Project: VIB3")
-            print("  Type: Command Line Application")
-        else:
-            print("Use --show to display configuration")
+    def _queue_status(self) -> None:
+        """Show job counts per lane and recent failures."""
+        upload_queue = UploadQueue()
+        try:
+            stats = upload_queue.stats()
+            failures = upload_queue.failures()
+        finally:
+            upload_queue.close()
+        states = ('queued', 'running', 'done', 'failed')
+        print(f"{'Lane':<10}" + ''.join(f"{state.capitalize():>10}" for state in states))
+        for lane in sorted(set(QUEUE_LANES) | set(stats), key=lambda lane: QUEUE_LANES.get(lane, 0)):
+            print(f"{lane:<10}" + ''.join(f"{stats.get(lane, {}).get(state, 0):>10,}" for state in states))
+        if failures:
+            print("\nRecent failures:")
+            for file, bucket, key, attempts, error in failures:
+                print(f"  {file} -> s3://{bucket}/{key} ({attempts} attempts): {error}")
     
-    def upload_command(self, file: str, bucket: str, key: Optional[str], region: str) -> None:
-        """Execute the upload command."""
-        if not os.path.exists(file):
-            raise FileNotFoundError(f"File not found: {file}")
+    def watch_command(self, directory: str, destination: str, region: str,
+                      settle: float = DEFAULT_WATCH_SETTLE,
+                      poll: bool = False,
+                      idle_exit: Optional[float] = None,
+                      jobs: int = DEFAULT_BATCH_JOBS,
+                      part_size: Optional[int] = None,
+                      concurrency: int = DEFAULT_CONCURRENCY,
+                      pool_size: Optional[int] = None) -> None:
+        """
+        Execute the watch command: upload files as soon as they finish landing.
         
-        if not os.path.isfile(file):
-            raise ValueError(f"Not a file: {file}")
+        At most `jobs` files upload at once over one shared client; files
+        that become ready meanwhile wait their turn. Failed uploads are
+        retried with exponential backoff. Uploaded files are recorded in
+        the watch state, so a restart only sends what is new or changed.
+        """
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+        if not destination.startswith('s3://'):
+            raise ValueError("Watch destination must be an s3:// URL")
+        if settle < 0:
+            raise ValueError("--settle cannot be negative")
+        bucket, prefix = parse_s3_url(destination)
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
         
-        # Use filename as key if not specified
-        if key is None:
-            key = os.path.basename(file)
+        root = os.path.abspath(directory)
+        s3_client = self._batch_client(region, jobs, pool_size, concurrency)
+        state = WatchState()
+        # Temporary names (rsync, Finder, partial copies) are dotfiles; they are picked up once renamed
+        watcher = FolderWatcher(root, settle=settle, seen=state.load(root, bucket, prefix), poll=poll,
+                                ignore=lambda name: name.startswith('.') or self._is_vib3_file(name))
+        watcher.scan()
+        if watcher.fallback:
+            print(f"inotify unavailable ({watcher.fallback}); polling every {WATCH_POLL_INTERVAL:g}s",
+                  file=sys.stderr)
+        print(f"Watching {root} -> s3://{bucket}/{prefix} "
+              f"({'polling' if watcher.polling else 'inotify'}, {jobs} uploads at a time)")
         
-        # Initialize S3 client
-        s3_client = boto3.client('s3', region_name=region)
+        def upload(path, key, size):
+            self._put_file(s3_client, path, bucket, key, size, part_size=part_size,
+                           concurrency=concurrency, resume=True)
         
+        executor = ThreadPoolExecutor(max_workers=jobs)
+        inflight = {}
+        attempts = {}
+        uploaded = 0
+        total = 0
+        started = time.monotonic()
+        active = started
         try:
-            # Get file size for progress tracking
-            file_size = os.path.getsize(file)
-            print(f"Uploading {file} ({file_size:,} bytes) to s3://{bucket}/{key}")
-            
-            # Progress tracking variables
-            uploaded_bytes = 0
-            
-            def upload_callback(bytes_amount):
-                nonlocal uploaded_bytes
-                uploaded_bytes += bytes_amount
-                percentage = (uploaded_bytes / file_size) * 100
-                print(f"\rProgress: {percentage:.1f}% ({uploaded_bytes:,}/{file_size:,} bytes)", end='', flush=True)
-            
-            # Upload file with progress callback
-            s3_client.upload_file(
-                file, 
-                bucket, 
-                key,
-                Callback=upload_callback
-            )
-            
-            print(f"\nSuccessfully uploaded to s3://{bucket}/{key}")
+            while True:
+                for rel, path, identity in watcher.poll(WATCH_TICK):
+                    if len(inflight) >= jobs or rel in {item[0] for item in inflight.values()}:
+                        watcher.retry(rel, identity, WATCH_TICK)
+                        continue
+                    future = executor.submit(upload, path, prefix + rel, identity[0])
+                    inflight[future] = (rel, path, identity)
+                
+                for future in [future for future in inflight if future.done()]:
+                    rel, path, identity = inflight.pop(future)
+                    try:
+                        future.result()
+                    except NoCredentialsError:
+                        raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+                    except Exception as e:
+                        if isinstance(e, ClientError):
+                            e = s3_error(e, bucket, prefix + rel)
+                        attempts[rel] = attempts.get(rel, 0) + 1
+                        delay = min(QUEUE_RETRY_MAX, QUEUE_RETRY_BASE * 2 ** (attempts[rel] - 1))
+                        print(f"Failed to upload {path}; retrying in {delay:.0f}s: {e}", file=sys.stderr)
+                        watcher.retry(rel, identity, delay)
+                    else:
+                        attempts.pop(rel, None)
+                        state.record(root, bucket, prefix, rel, identity)
+                        uploaded += 1
+                        total += identity[0]
+                        print(f"upload: {path} -> s3://{bucket}/{prefix}{rel}")
+                
+                if inflight or watcher.pending:
+                    active = time.monotonic()
+                elif idle_exit is not None and time.monotonic() - active >= idle_exit:
+                    break
+        finally:
+            # Interrupted multipart uploads resume from their journals on the next run
+            for future in inflight:
+                future.cancel()
+            executor.shutdown(wait=False)
+            watcher.close()
+            state.close()
+        
+        elapsed = time.monotonic() - started
+        print(f"Uploaded {uploaded:,} files ({total:,} bytes) in {elapsed:.1f}s")
+    
+    def _batch_client(self, region: str, jobs: int, pool_size: Optional[int], concurrency: int):
+        """Create the client shared by every transfer of a batch."""
+        if jobs < 1:
+            raise ValueError("Jobs must be at least 1")
+        return self._s3_client(region, max_pool_connections=pool_size or jobs * concurrency)
+    
+    def _read_batch_items(self, from_file: Optional[str], field: str) -> List[dict]:
+        """Read batch items from a file or stdin: plain lines or NDJSON objects."""
+        if not from_file:
+            return []
+        
+        items = []
+        handle = sys.stdin if from_file == '-' else open(from_file, 'r')
+        try:
+            for number, line in enumerate(handle, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith('{'):
+                    item = json.loads(line)
+                    if field not in item:
+                        raise ValueError(f"{from_file}:{number}: missing \"{field}\"")
+                    items.append(item)
+                else:
+                    items.append({field: line})
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+        return items
+    
+    def _run_batch(self, items: List[dict], transfer: Callable[[dict], int],
+                   describe: Callable[[dict], str], jobs: int, verb: str, bucket: str,
+                   progress: ProgressReporter) -> None:
+        """Run transfers over a bounded thread pool and report a summary."""
+        started = time.monotonic()
+        total = 0
+        failures = 0
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(transfer, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    total += future.result()
+                    progress.log(f"{verb}: {describe(item)}")
+                except NoCredentialsError:
+                    raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+                except Exception as e:
+                    if isinstance(e, ClientError):
+                        e = s3_error(e, bucket, item.get('key'))
+                    failures += 1
+                    print(f"Failed to {verb} {describe(item)}: {e}", file=sys.stderr)
+        
+        progress.finish()
+        if progress.tty:
+            print()
+        elapsed = time.monotonic() - started
+        print(f"Transferred {len(items) - failures:,} files ({total:,} bytes) in {elapsed:.1f}s "
+              f"({format_rate(total, elapsed)})")
+        if failures:
+            raise RuntimeError(f"{failures} of {len(items)} "
+                               f"{'copies' if verb == 'copy' else verb + 's'} failed")
+    
+    def pack_command(self, source: str, destination: str, region: str,
+                     shard_size: int = DEFAULT_SHARD_SIZE,
+                     concurrency: int = DEFAULT_CONCURRENCY) -> None:
+        """Execute the pack command."""
+        if not os.path.isdir(source):
+            raise FileNotFoundError(f"Directory not found: {source}")
+        if not destination.startswith('s3://'):
+            raise ValueError("Pack destination must be an s3:// URL")
+        bucket, prefix = parse_s3_url(destination)
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        
+        s3_client = self._s3_client(region, max_pool_connections=concurrency * 2)
+        started = time.monotonic()
+        files = sorted(self._scan_directory(source))
+        progress = ProgressReporter(sum(stat.st_size for _, _, stat in files))
+        shards = []
+        members = {}
+        pending = deque()
+        
+        try:
+            # The next shard is written while the previous one uploads
+            with ThreadPoolExecutor(max_workers=2) as executor, \
+                    tempfile.TemporaryDirectory(prefix='vib3pack-') as workdir:
+                tar = None
+                for name, path, stat in files:
+                    if tar and tar.offset + stat.st_size > shard_size:
+                        tar.close()
+                        pending.append(executor.submit(self._upload_shard, s3_client, bucket,
+                                                       shards[-1], concurrency))
+                        tar = None
+                    if tar is None:
+                        if len(pending) > 1:
+                            pending.popleft().result()
+                        shard = {'key': f"{prefix}shard-{len(shards):05d}.tar",
+                                 'path': os.path.join(workdir, f"{len(shards):05d}.tar")}
+                        shards.append(shard)
+                        tar = tarfile.open(shard['path'], 'w', format=tarfile.PAX_FORMAT)
+                    info = tar.gettarinfo(path, arcname=name)
+                    with open(path, 'rb') as f:
+                        tar.addfile(info, f)
+                    # The data ends where the 512-byte padded member ends
+                    offset = tar.offset - -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                    members[name] = [len(shards) - 1, offset, info.size]
+                    progress.update(info.size)
+                if tar:
+                    tar.close()
+                    pending.append(executor.submit(self._upload_shard, s3_client, bucket,
+                                                   shards[-1], concurrency))
+                while pending:
+                    pending.popleft().result()
             
+            index = {
+                'version': 1,
+                'shards': [{'key': shard['key'], 'etag': shard['etag'], 'size': shard['size']}
+                           for shard in shards],
+                'members': members,
+            }
+            s3_client.put_object(Bucket=bucket, Key=prefix + PACK_INDEX,
+                                 Body=json.dumps(index, separators=(',', ':')).encode(),
+                                 ContentType='application/json')
         except NoCredentialsError:
             raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
         except ClientError as e:
-            error_code = e.response.get('Error', {}).get('Code', 'Unknown')
-            if error_code == 'NoSuchBucket':
-                raise RuntimeError(f"Bucket '{bucket}' does not exist")
-            elif error_code == 'AccessDenied':
-                raise RuntimeError(f"Access denied to bucket '{bucket}'")
-            else:
-                raise RuntimeError(f"S3 error: {str(e)}")
+            raise s3_error(e, bucket)
+        
+        progress.finish()
+        elapsed = time.monotonic() - started
+        print(f"\nPacked {len(members):,} files ({progress.done:,} bytes) into {len(shards)} "
+              f"shards in {elapsed:.1f}s; index at s3://{bucket}/{prefix}{PACK_INDEX}")
     
-    def download_command(self, bucket: str, key: str, output: Optional[str], region: str) -> None:
-        """Execute the download command."""
-        # Use key basename as output if not specified
+    def _upload_shard(self, s3_client, bucket: str, shard: dict, concurrency: int) -> None:
+        """Upload a finished shard and record its size and ETag for the index."""
+        shard['size'] = os.path.getsize(shard['path'])
+        shard['etag'] = self._put_file(s3_client, shard['path'], bucket, shard['key'],
+                                       shard['size'], concurrency=concurrency)
+        os.remove(shard['path'])
+    
+    def _download_member(self, bucket: str, key: str, member: str, output: Optional[str],
+                         region: str) -> None:
+        """Fetch one member of a pack with a single ranged GET."""
+        index_key = key if key.endswith(PACK_INDEX) else key.rstrip('/') + '/' + PACK_INDEX
         if output is None:
-            output = os.path.basename(key)
-        
-        # Check if output file already exists
+            output = os.path.basename(member)
         if os.path.exists(output):
             response = input(f"File '{output}' already exists. Overwrite? (y/N): ")
             if response.lower() != 'y':
                 print("Download cancelled.")
                 return
-        
-        # Initialize S3 client
         s3_client = boto3.client('s3', region_name=region)
+        try:
+            index = self._pack_index(s3_client, bucket, index_key)
+            try:
+                data = self._fetch_member(s3_client, bucket, index_key, index, member)
+            except FileNotFoundError:
+                # Members added by a repack are missing from an older cached index
+                index = self._pack_index(s3_client, bucket, index_key, refresh=True)
+                data = self._fetch_member(s3_client, bucket, index_key, index, member)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'PreconditionFailed':
+                    raise
+                # The pack was rewritten since the index was cached
+                index = self._pack_index(s3_client, bucket, index_key, refresh=True)
+                data = self._fetch_member(s3_client, bucket, index_key, index, member)
+        except NoCredentialsError:
+            raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
+        except ClientError as e:
+            raise s3_error(e, bucket, index_key)
+        
+        with open(output, 'wb') as f:
+            f.write(data)
+        print(f"Successfully downloaded {member} ({len(data):,} bytes) to {output}")
+    
+    @staticmethod
+    def _fetch_member(s3_client, bucket: str, index_key: str, index: dict, member: str) -> bytes:
+        entry = index['members'].get(member)
+        if entry is None:
+            raise FileNotFoundError(f"{member} is not in s3://{bucket}/{index_key}")
+        shard_number, offset, size = entry
+        if not size:
+            return b''
+        shard = index['shards'][shard_number]
+        response = s3_client.get_object(Bucket=bucket, Key=shard['key'],
+                                        Range=f'bytes={offset}-{offset + size - 1}',
+                                        IfMatch=shard['etag'])
+        return response['Body'].read()
+    
+    @staticmethod
+    def _pack_index(s3_client, bucket: str, index_key: str, refresh: bool = False) -> dict:
+        """
+        Return a pack index, cached locally.
+        
+        Member GETs carry If-Match on the shard ETag recorded in the index,
+        so a stale cached index is detected by the GET itself and the
+        cache needs no revalidation request; a member the cached index
+        does not list is looked up again in a fresh copy.
+        """
+        digest = hashlib.sha256(f"{bucket}/{index_key}".encode()).hexdigest()[:16]
+        path = state_path(f"pack-index-{digest}.json")
+        if not refresh and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        data = s3_client.get_object(Bucket=bucket, Key=index_key)['Body'].read()
+        index = json.loads(data)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return index
+    
+    def faststart_command(self, file: str, output: Optional[str]) -> None:
+        """Execute the faststart command."""
+        if not os.path.isfile(file):
+            raise FileNotFoundError(f"File not found: {file}")
         
+        destination = output or file + FASTSTART_SUFFIX
         try:
-            # Get object metadata to determine file size
-            response = s3_client.head_object(Bucket=bucket, Key=key)
-            file_size = response['ContentLength']
-            print(f"Downloading s3://{bucket}/{key} ({file_size:,} bytes) to {output}")
-            
-            # Progress tracking variables
-            downloaded_bytes = 0
-            
-            def download_callback(bytes_amount):
-                nonlocal downloaded_bytes
-                downloaded_bytes += bytes_amount
-                percentage = (downloaded_bytes / file_size) * 100
-                print(f"\rProgress: {percentage:.1f}% ({downloaded_bytes:,}/{file_size:,} bytes)", end='', flush=True)
-            
-            # Download file with progress callback
-            s3_client.download_file(
-                bucket,
-                key,
-                output,
-                Callback=download_callback
-            )
-            
-            print(f"\nSuccessfully downloaded to {output}")
-            
+            stats = faststart_mp4(file, destination)
+        except BaseException:
+            if os.path.exists(destination):
+                os.remove(destination)
+            raise
+        if stats is None:
+            print(f"{file} is already fast-start; nothing to do")
+            return
+        if not output:
+            shutil.copystat(file, destination)
+            os.replace(destination, file)
+        print(f"Moved {stats['moov_size']:,} bytes of metadata ahead of "
+              f"{stats['moved']:,} bytes of media in {output or file}")
+    
+    def _stage_faststart(self, file: str, resume: bool) -> Optional[str]:
+        """
+        Write a fast-start copy of an MP4 next to it for uploading.
+        
+        Returns None if the file is already fast-start. A copy left by an
+        interrupted upload is reused when resuming.
+        """
+        staged = file + FASTSTART_SUFFIX
+        if resume and os.path.exists(UploadJournal.path_for(staged)) and os.path.exists(staged):
+            return staged
+        try:
+            stats = faststart_mp4(file, staged)
+        except BaseException:
+            if os.path.exists(staged):
+                os.remove(staged)
+            raise
+        if stats is None:
+            print(f"{file} is already fast-start")
+            return None
+        print(f"Moved {stats['moov_size']:,} bytes of metadata to the front of {file}")
+        return staged
+    
+    def sync_command(self, source: str, destination: str, region: str,
+                     concurrency: int = 16, delete: bool = False,
+                     dry_run: bool = False) -> None:
+        """Execute the sync command."""
+        if source.startswith('s3://') == destination.startswith('s3://'):
+            raise ValueError("Sync needs one local directory and one s3:// URL")
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        
+        upload = destination.startswith('s3://')
+        directory, url = (source, destination) if upload else (destination, source)
+        bucket, prefix = parse_s3_url(url)
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        
+        if upload and not os.path.isdir(directory):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+        os.makedirs(directory, exist_ok=True)
+        
+        s3_client = self._s3_client(region, max_pool_connections=concurrency)
+        started = time.monotonic()
+        
+        try:
+            # One listing of the remote side drives the whole comparison
+            remote = {obj['Key'][len(prefix):]: obj for obj in list_objects(s3_client, bucket, prefix)
+                      if not obj['Key'].endswith('/')}
         except NoCredentialsError:
             raise RuntimeError("AWS credentials not found. Please configure your AWS credentials.")
         except ClientError as e:
-            error_code = e.response.get('Error', {}).get('Code', 'Unknown')
-            if error_code == 'NoSuchBucket':
-                raise RuntimeError(f"Bucket '{bucket}' does not exist")
-            elif error_code == 'NoSuchKey':
-                raise RuntimeError(f"Key '{key}' does not exist in bucket '{bucket}'")
-            elif error_code == 'AccessDenied':
-                raise RuntimeError(f"Access denied to s3://{bucket}/{key}")
+            raise s3_error(e, bucket)
+        local = {rel: (path, stat) for rel, path, stat in self._scan_directory(directory)}
+        
+        manifests = self._load_sync_manifest(directory)
+        manifest = manifests.setdefault(f"s3://{bucket}/{prefix}", {})
+        
+        if upload:
+            transfers = [rel for rel, (path, stat) in local.items()
+                         if not self._sync_unchanged(manifest.get(rel), stat, remote.get(rel))]
+            removals = [rel for rel in remote if rel not in local] if delete else []
+        else:
+            transfers = [rel for rel, obj in remote.items()
+                         if not self._sync_unchanged(manifest.get(rel),
+                                                     local.get(rel, (None, None))[1], obj)]
+            removals = [rel for rel in local if rel not in remote] if delete else []
+        
+        arrow = 'upload' if upload else 'download'
+        if dry_run:
+            for rel in transfers:
+                print(f"(dry run) {arrow}: {rel}")
+            for rel in removals:
+                print(f"(dry run) delete: {rel}")
+            print(f"{len(transfers)} to transfer, {len(removals)} to delete, "
+                  f"{len(local if upload else remote) - len(transfers)} unchanged")
+            return
+        
+        failures = []
+        progress = ProgressReporter(sum(local[rel][1].st_size if upload else remote[rel]['Size']
+                                        for rel in transfers))
+        
+        def transfer(rel):
+            if upload:
+                path, stat = local[rel]
+                etag = self._put_file(s3_client, path, bucket, prefix + rel, stat.st_size,
+                                      callback=progress.update)
             else:
-                raise RuntimeError(f"S3 error: {str(e)}")
+                obj = remote[rel]
+                path = local_path(directory, rel)
+                self._get_file(s3_client, bucket, obj['Key'], path, obj['Size'], obj['ETag'],
+                               callback=progress.update)
+                etag = obj['ETag']
+                stat = os.stat(path)
+            # On upload this is the scanned state that was sent, not whatever the file became since
+            return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'etag': etag}
+        
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = {executor.submit(transfer, rel): rel for rel in transfers}
+                for future in as_completed(futures):
+                    rel = futures[future]
+                    try:
+                        manifest[rel] = future.result()
+                        progress.log(f"{arrow}: {rel}")
+                    except Exception as e:
+                        failures.append(rel)
+                        print(f"Failed to {arrow} {rel}: {e}", file=sys.stderr)
+            if transfers:
+                progress.finish()
+                if progress.tty:
+                    print()
+            
+            if upload:
+                errors = self._delete_keys(s3_client, bucket, [prefix + rel for rel in removals],
+                                           jobs=concurrency)
+                for error in errors:
+                    rel = error['Key'][len(prefix):]
+                    removals.remove(rel)
+                    failures.append(rel)
+                    print(f"Failed to delete {rel}: {error['Message']}", file=sys.stderr)
+            for rel in removals:
+                manifest.pop(rel, None)
+            if not upload:
+                for rel in removals:
+                    os.remove(local[rel][0])
+            for rel in removals:
+                print(f"delete: {rel}")
+        finally:
+            # Keep whatever finished, even if the sync was interrupted
+            for rel in list(manifest):
+                if rel not in local and rel not in remote and rel not in transfers:
+                    del manifest[rel]
+            self._save_sync_manifest(directory, manifests)
+        
+        elapsed = time.monotonic() - started
+        unchanged = len(local if upload else remote) - len(transfers)
+        print(f"Synced {len(transfers) - len(failures)} files, deleted {len(removals)}, "
+              f"{unchanged} unchanged in {elapsed:.1f}s")
+        if failures:
+            raise RuntimeError(f"{len(failures)} of {len(transfers)} transfers failed")
+    
+    def _s3_client(self, region: str, max_pool_connections: Optional[int] = None):
+        """Create an S3 client whose connection pool fits the worker count."""
+        if max_pool_connections:
+            return boto3.client('s3', region_name=region,
+                                config=Config(max_pool_connections=max_pool_connections))
+        return boto3.client('s3', region_name=region)
+    
+    def _scan_directory(self, directory: str):
+        """Yield (relative key path, path, stat) for every file under a directory."""
+        stack = [(directory, '')]
+        while stack:
+            path, rel = stack.pop()
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    name = rel + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, name + '/'))
+                    elif entry.is_file() and not self._is_vib3_file(entry.name):
+                        yield name, entry.path, entry.stat()
+    
+    @staticmethod
+    def _is_vib3_file(name: str) -> bool:
+        """Check whether a file is VIB3 bookkeeping rather than content."""
+        return name == SYNC_MANIFEST or name.endswith((UploadJournal.SUFFIX, DownloadJournal.SUFFIX,
+                                                       CHECKSUM_SUFFIX, FASTSTART_SUFFIX))
+    
+    @staticmethod
+    def _sync_unchanged(entry: Optional[dict], stat: Optional[os.stat_result],
+                        remote: Optional[dict]) -> bool:
+        """Check a file against the manifest entry recorded at its last sync."""
+        return (entry is not None and stat is not None and remote is not None and
+                entry['size'] == stat.st_size and
+                entry['mtime_ns'] == stat.st_mtime_ns and
+                entry['etag'] == remote['ETag'])
+    
+    def _put_file(self, s3_client, path: str, bucket: str, key: str, size: int,
+                  part_size: Optional[int] = None,
+                  concurrency: int = DEFAULT_CONCURRENCY,
+                  limiter: Optional[BandwidthLimiter] = None,
+                  resume: bool = False,
+                  extra_args: Optional[dict] = None,
+                  callback: Optional[Callable[[int], None]] = None) -> str:
+        """Upload one file with a single PUT or the multipart engine; return its ETag."""
+        extra_args = extra_args or {}
+        if size >= MULTIPART_THRESHOLD or (part_size and size > part_size):
+            uploader = MultipartUploader(s3_client, bucket, key, part_size=part_size,
+                                         concurrency=concurrency, limiter=limiter,
+                                         extra_args=extra_args, callback=callback)
+            return uploader.upload(path, resume=resume)['etag']
+        if limiter:
+            limiter.consume(size)
+        with open(path, 'rb') as f:
+            etag = s3_client.put_object(Bucket=bucket, Key=key, Body=f, **extra_args)['ETag']
+        if callback:
+            callback(size)
+        return etag
+    
+    def _put_checksummed(self, s3_client, path: str, bucket: str, key: str, algorithm: str,
+                         extra_args: dict, max_bandwidth: Optional[int] = None,
+                         callback: Optional[Callable[[int], None]] = None) -> str:
+        """
+        Upload a file with a single PUT carrying its S3 checksum; return the checksum.
+        
+        The file is mapped once: the checksum is computed over the mapping
+        and the same pages are then sent, so the file is read from disk once.
+        A checksum cached for the unchanged file skips the hashing pass.
+        """
+        size = os.path.getsize(path)
+        limiter = BandwidthLimiter(max_bandwidth) if max_bandwidth else None
+        hashes = HashCache()
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        view = memoryview(mapped) if mapped else memoryview(b'')
+        try:
+            checksum = hashes.get(stat, f"checksum:{algorithm}")
+            if checksum is None:
+                hasher = new_checksum(algorithm)
+                hash_view(view, [hasher])
+                checksum = encode_checksum(hasher)
+                hashes.put(stat, f"checksum:{algorithm}", checksum)
+            s3_client.put_object(Bucket=bucket, Key=key, Body=_PartReader(view, limiter),
+                                 **{CHECKSUM_FIELDS[algorithm]: checksum}, **extra_args)
+        finally:
+            hashes.close()
+            view.release()
+            if mapped:
+                mapped.close()
+        if callback:
+            callback(size)
+        return checksum
+    
+    def _dedup_object(self, s3_client, index: DedupIndex, digest: str, size: int,
+                      bucket: str, key: str) -> Optional[str]:
+        """
+        Avoid uploading content the bucket already has.
+        
+        Returns a message if the destination already holds the content or it
+        was server-side copied from an identical object, or None if the file
+        still needs to be uploaded. Candidates come from the local index and
+        are only trusted when their sha256 metadata and size match.
+        """
+        candidates = [(bucket, key)]
+        candidates += sorted(set(index.lookup(digest)) - {(bucket, key)},
+                             key=lambda candidate: candidate[0] != bucket)
+        
+        for source_bucket, source_key in candidates:
+            try:
+                head = s3_client.head_object(Bucket=source_bucket, Key=source_key)
+            except ClientError as e:
+                if not is_not_found(e) and source_bucket == bucket:
+                    raise
+                index.discard(digest, source_bucket, source_key)
+                continue
+            if head.get('Metadata', {}).get('sha256') != digest or head['ContentLength'] != size:
+                index.discard(digest, source_bucket, source_key)
+                continue
+            
+            if (source_bucket, source_key) == (bucket, key):
+                index.add(digest, bucket, key)
+                return f"Skipped upload: s3://{bucket}/{key} already has this content"
+            MultipartCopier(s3_client).copy(source_bucket, source_key, bucket, key, head=head)
+            index.add(digest, bucket, key)
+            return (f"Copied s3://{source_bucket}/{source_key} to s3://{bucket}/{key} "
+                    f"server-side (identical content)")
+        return None
+    
+    def _get_file(self, s3_client, bucket: str, key: str, path: str, size: int,
+                  etag: Optional[str], part_size: Optional[int] = None,
+                  concurrency: int = DEFAULT_CONCURRENCY,
+                  callback: Optional[Callable[[int], None]] = None) -> None:
+        """Download one object with a single GET or ranged parallel GETs."""
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        if size >= MULTIPART_THRESHOLD or (part_size and size > part_size):
+            downloader = RangedDownloader(s3_client, bucket, key, part_size=part_size,
+                                          concurrency=concurrency, callback=callback)
+            downloader.download(path, size, etag, resume=True)
+            return
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        with open(path, 'wb') as f:
+            for chunk in response['Body'].iter_chunks(RangedDownloader.CHUNK_SIZE):
+                f.write(chunk)
+                if callback:
+                    callback(len(chunk))
+    
+    def _delete_keys(self, s3_client, bucket: str, keys: Iterable[str],
+                     jobs: int = DEFAULT_BATCH_JOBS,
+                     callback: Optional[Callable[[int, List[dict]], None]] = None) -> List[dict]:
+        """
+        Delete keys with 1000-key DeleteObjects requests, `jobs` requests at a time.
+        
+        `keys` may be any iterable, such as a listing, and is consumed only as
+        fast as batches are sent. Returns an {'Key', 'Code', 'Message'} error
+        for every key that was not deleted; `callback` receives the number of
+        deleted keys and the errors of each batch as it completes.
+        """
+        errors = []
+        lock = threading.Lock()
+        # Bound the batches read ahead of the requests in flight
+        slots = threading.BoundedSemaphore(jobs * 2)
+        
+        def delete(batch):
+            try:
+                try:
+                    response = s3_client.delete_objects(
+                        Bucket=bucket,
+                        Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                    )
+                    failed = response.get('Errors', [])
+                except ClientError as e:
+                    error = e.response.get('Error', {})
+                    failed = [{'Key': key, 'Code': error.get('Code', 'Unknown'),
+                               'Message': error.get('Message', str(e))} for key in batch]
+                with lock:
+                    errors.extend(failed)
+                    if callback:
+                        callback(len(batch) - len(failed), failed)
+            finally:
+                slots.release()
+        
+        keys = iter(keys)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = []
+            while True:
+                batch = list(itertools.islice(keys, DELETE_BATCH_SIZE))
+                if not batch:
+                    break
+                slots.acquire()
+                futures.append(executor.submit(delete, batch))
+            for future in futures:
+                future.result()
+        return errors
+    
+    def _load_sync_manifest(self, directory: str) -> dict:
+        """Load the per-destination sync manifests stored in a directory."""
+        path = os.path.join(directory, SYNC_MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+    
+    def _save_sync_manifest(self, directory: str, manifests: dict) -> None:
+        """Atomically save the sync manifests."""
+        path = os.path.join(directory, SYNC_MANIFEST)
+        temp = path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(manifests, f, separators=(',', ':'))
+        os.replace(temp, path)
     
     def deploy_command(self, args) -> None:
         """Execute the deploy command."""
@@ -752,20 +6568,197 @@ class VIB3CLI:
                 self.list_command(parsed_args.items)
             elif parsed_args.command == 'config':
                 self.config_command(parsed_args.show)
+            elif parsed_args.command == 'upload' and (len(parsed_args.files) != 1 or
+                                                       parsed_args.from_file):
+                if parsed_args.key:
+                    raise ValueError("--key can only be used when uploading a single file")
+                if parsed_args.checksum:
+                    raise ValueError("--checksum can only be used when uploading a single file")
+                if parsed_args.faststart:
+                    raise ValueError("--faststart can only be used when uploading a single file")
+                if parsed_args.follow:
+                    raise ValueError("--follow can only be used when uploading a single file")
+                if parsed_args.chunked:
+                    raise ValueError("--chunked can only be used when uploading a single file")
+                if parsed_args.replicate:
+                    raise ValueError("--replicate can only be used when uploading a single file")
+                if parsed_args.concurrency == AUTO_CONCURRENCY:
+                    raise ValueError("--concurrency auto can only be used when uploading a single file")
+                self.batch_upload_command(
+                    parsed_args.files,
+                    parsed_args.bucket,
+                    parsed_args.region,
+                    from_file=parsed_args.from_file,
+                    jobs=parsed_args.jobs,
+                    pool_size=parsed_args.pool_size,
+                    part_size=parsed_args.part_size,
+                    concurrency=parsed_args.concurrency,
+                    max_bandwidth=parsed_args.max_bandwidth,
+                    resume=parsed_args.resume,
+                    dedup=parsed_args.dedup
+                )
             elif parsed_args.command == 'upload':
                 self.upload_command(
-                    parsed_args.file,
+                    parsed_args.files[0],
                     parsed_args.bucket,
                     parsed_args.key,
-                    parsed_args.region
+                    parsed_args.region,
+                    part_size=parsed_args.part_size,
+                    concurrency=parsed_args.concurrency,
+                    max_bandwidth=parsed_args.max_bandwidth,
+                    resume=parsed_args.resume,
+                    dedup=parsed_args.dedup,
+                    checksum=parsed_args.checksum,
+                    faststart=parsed_args.faststart,
+                    follow=parsed_args.follow,
+                    follow_idle=parsed_args.follow_idle,
+                    chunked=parsed_args.chunked,
+                    replicate=parsed_args.replicate
+                )
+            elif parsed_args.command == 'download' and (len(parsed_args.keys) != 1 or
+                                                         parsed_args.from_file):
+                if parsed_args.verify:
+                    raise ValueError("--verify can only be used when downloading a single file")
+                if parsed_args.member:
+                    raise ValueError("--member takes a single pack key")
+                if parsed_args.cache:
+                    raise ValueError("--cache can only be used when downloading a single file")
+                if parsed_args.concurrency == AUTO_CONCURRENCY:
+                    raise ValueError("--concurrency auto can only be used when downloading a single file")
+                self.batch_download_command(
+                    parsed_args.bucket,
+                    parsed_args.keys,
+                    parsed_args.output,
+                    parsed_args.region,
+                    from_file=parsed_args.from_file,
+                    jobs=parsed_args.jobs,
+                    pool_size=parsed_args.pool_size,
+                    part_size=parsed_args.part_size,
+                    concurrency=parsed_args.concurrency,
+                    force=parsed_args.force
                 )
             elif parsed_args.command == 'download':
                 self.download_command(
+                    parsed_args.bucket,
+                    parsed_args.keys[0],
+                    parsed_args.output,
+                    parsed_args.region,
+                    part_size=parsed_args.part_size,
+                    concurrency=parsed_args.concurrency,
+                    resume=parsed_args.resume,
+                    verify=parsed_args.verify,
+                    member=parsed_args.member,
+                    cache=parsed_args.cache,
+                    cache_size=parsed_args.cache_size
+                )
+            elif parsed_args.command == 'sync':
+                self.sync_command(
+                    parsed_args.source,
+                    parsed_args.destination,
+                    parsed_args.region,
+                    concurrency=parsed_args.concurrency,
+                    delete=parsed_args.delete,
+                    dry_run=parsed_args.dry_run
+                )
+            elif parsed_args.command == 'get':
+                self.get_command(
                     parsed_args.bucket,
                     parsed_args.key,
                     parsed_args.output,
-                    parsed_args.region
+                    parsed_args.region,
+                    concurrency=parsed_args.concurrency
+                )
+            elif parsed_args.command == 'pack':
+                self.pack_command(
+                    parsed_args.source,
+                    parsed_args.destination,
+                    parsed_args.region,
+                    shard_size=parsed_args.shard_size,
+                    concurrency=parsed_args.concurrency
+                )
+            elif parsed_args.command == 'faststart':
+                self.faststart_command(parsed_args.file, parsed_args.output)
+            elif parsed_args.command == 'ls':
+                self.ls_command(
+                    parsed_args.target,
+                    parsed_args.region,
+                    parallel=parsed_args.parallel,
+                    alphabet=parsed_args.shards,
+                    depth=parsed_args.shard_depth
+                )
+            elif parsed_args.command == 'rm':
+                self.rm_command(
+                    parsed_args.bucket,
+                    parsed_args.keys,
+                    parsed_args.region,
+                    from_file=parsed_args.from_file,
+                    prefix=parsed_args.prefix,
+                    jobs=parsed_args.jobs,
+                    dry_run=parsed_args.dry_run
+                )
+            elif parsed_args.command in ('cp', 'mv'):
+                self.cp_command(
+                    parsed_args.source,
+                    parsed_args.destination,
+                    parsed_args.region,
+                    recursive=parsed_args.recursive,
+                    jobs=parsed_args.jobs,
+                    part_size=parsed_args.part_size,
+                    concurrency=parsed_args.concurrency,
+                    move=parsed_args.command == 'mv'
+                )
+            elif parsed_args.command == 'catalog':
+                self.catalog_command(
+                    parsed_args.action,
+                    parsed_args.target,
+                    parsed_args.region,
+                    parallel=parsed_args.parallel,
+                    alphabet=parsed_args.shards,
+                    depth=parsed_args.shard_depth,
+                    min_size=parsed_args.min_size,
+                    max_size=parsed_args.max_size,
+                    order=parsed_args.sort,
+                    limit=parsed_args.limit,
+                    group_by=parsed_args.group_by,
+                    sql=parsed_args.sql
+                )
+            elif parsed_args.command == 'audit':
+                self.audit_command(
+                    parsed_args.directory,
+                    parsed_args.url,
+                    parsed_args.region,
+                    part_size=parsed_args.part_size,
+                    jobs=parsed_args.jobs,
+                    use_catalog=parsed_args.catalog
+                )
+            elif parsed_args.command == 'presign':
+                self.presign_command(
+                    parsed_args.bucket,
+                    parsed_args.keys,
+                    parsed_args.region,
+                    from_file=parsed_args.from_file,
+                    expires=parsed_args.expires,
+                    margin=parsed_args.margin,
+                    endpoint_url=parsed_args.endpoint_url,
+                    use_cache=not parsed_args.no_cache
+                )
+            elif parsed_args.command == 'queue':
+                self.queue_command(parsed_args)
+            elif parsed_args.command == 'watch':
+                self.watch_command(
+                    parsed_args.directory,
+                    parsed_args.destination,
+                    parsed_args.region,
+                    settle=parsed_args.settle,
+                    poll=parsed_args.poll,
+                    idle_exit=parsed_args.idle_exit,
+                    jobs=parsed_args.jobs,
+                    part_size=parsed_args.part_size,
+                    concurrency=parsed_args.concurrency,
+                    pool_size=parsed_args.pool_size
                 )
+            elif parsed_args.command == 'cache':
+                self.cache_command(parsed_args.action, max_size=parsed_args.max_size)
             elif parsed_args.command == 'deploy':
                 self.deploy_command(parsed_args)
             else: